@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# Модули бота импортируются по имени из src, как при запуске python src/bot.py
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+# src/test_*.py - скрипты ручного прогона (read.md), не тесты pytest
+collect_ignore = ["src"]
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from pathlib import Path
+
+from playwright.async_api import async_playwright, Page
+from utils.logger import logger
+from config import BASE_DIR, SYSTEM_CONFIG
+from calendar_reader import read_calendar
+
+# Сохраненная разметка календаря WB на 30 дней
+CALENDAR_FIXTURE = BASE_DIR / "fixtures" / "calendar.html"
+ITERATIONS = 50
+
+
+async def read_calendar_by_handles(page: Page) -> tuple:
+    """Старый путь get_target_dates + process_target_dates (ANY_DATE)
+
+    Возвращает (количество дат, количество roundtrip-запросов к браузеру).
+    """
+    selectors = SYSTEM_CONFIG["selectors"]["calendar"]
+    roundtrips = 0
+
+    calendar_dates = []
+    date_cells = await page.query_selector_all(selectors["date_container"])
+    roundtrips += 1
+    for cell in date_cells:
+        date_element = await cell.query_selector(selectors["date_text"])
+        roundtrips += 1
+        if date_element:
+            date_text = await date_element.inner_text()
+            roundtrips += 1
+            calendar_dates.append(date_text.split(",")[0])
+
+    for target_date in calendar_dates:
+        date_cell = await page.query_selector(
+            f'{selectors["cell"]}:has(span:text("{target_date}"))'
+        )
+        roundtrips += 1
+        if not date_cell:
+            continue
+
+        cell_class = await date_cell.get_attribute("class")
+        roundtrips += 1
+        if cell_class and selectors["date_is_disabled"] in cell_class:
+            continue
+
+        coeff_element = await date_cell.query_selector(
+            selectors["coeff"]["coeff_value"]
+        )
+        roundtrips += 1
+        if coeff_element:
+            await coeff_element.inner_text()
+            roundtrips += 1
+
+    return len(calendar_dates), roundtrips
+
+
+async def measure(name: str, read) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await read()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / ITERATIONS
+    logger.info(f"{name}: {elapsed_ms:.2f} мс на скан")
+    return elapsed_ms
+
+
+async def bench_calendar():
+    """Сравнение чтения календаря: element handles против одного page.evaluate"""
+    html = Path(CALENDAR_FIXTURE).read_text(encoding="utf-8")
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.set_content(html)
+
+        dates_count, roundtrips = await read_calendar_by_handles(page)
+        slots = await read_calendar(page)
+        logger.info(f"Дат в календаре: {dates_count} / {len(slots)}")
+        logger.info(f"Roundtrip-запросов за скан: {roundtrips} -> 1")
+
+        legacy_ms = await measure(
+            "Element handles", lambda: read_calendar_by_handles(page)
+        )
+        evaluate_ms = await measure("page.evaluate", lambda: read_calendar(page))
+        logger.info(f"Ускорение: x{legacy_ms / evaluate_ms:.1f}")
+
+        await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_calendar())
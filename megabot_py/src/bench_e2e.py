@@ -0,0 +1,198 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import psutil
+from cryptography.fernet import Fernet
+
+from utils.logger import logger
+import config
+from config import (
+    BOOKING_MODES,
+    BOOKING_PRIORITIES,
+    COEFF_VALUES,
+    SYSTEM_CONFIG,
+    USER_TYPES,
+)
+from bot import MEGABOT
+from browser_pool import BrowserPool
+from metrics import metrics
+from mock_portal import MockPortal
+from monitor import CalendarMonitor
+from session_vault import SessionVault
+from slots import format_date
+
+SELLERS = 2
+SUPPLIES_PER_SELLER = 3
+WAREHOUSES = ["Коледино", "Электросталь"]
+RELEASE_AT = 60  # секунды от старта: открытие слотов
+DURATION = 240  # секунды прогона, если не все поставки забронированы
+WARM_START = False  # True - сессия свежая, вход и проверка ИНН пропускаются
+RSS_INTERVAL = 5  # секунды между замерами памяти
+
+
+def make_supply(preorder_id: str, warehouse: str, target_date: str) -> dict:
+    return {
+        "supply_id": None,
+        "user_type": USER_TYPES["USER_PAID"],
+        "preorder_id": preorder_id,
+        "warehouse_name": warehouse,
+        "warehouse_id": "",
+        "booking_settings": {
+            "mode": BOOKING_MODES["SPECIFIC_DATES"],
+            "target_dates": [target_date],
+            "priority": BOOKING_PRIORITIES["BY_LOWER_COEFF"],
+            "target_coeff": COEFF_VALUES["COEFF_FREE"],
+        },
+        "status": {"active": True, "booked": False, "attempts_count": 0},
+    }
+
+
+def process_rss() -> int:
+    """RSS процесса бота вместе с драйвером Playwright и Chromium"""
+    process = psutil.Process(os.getpid())
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def percentiles(values: list) -> str:
+    if not values:
+        return "нет данных"
+    values = sorted(values)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+    return f"p50 {statistics.median(values):.0f} мс, p99 {p99:.0f} мс, n={len(values)}"
+
+
+async def register_seller(portal: MockPortal, inn: str, warm_start: bool = WARM_START) -> None:
+    """Селлер мока и его сессия в хранилище: свежая (теплый старт) или требующая проверки ИНН"""
+    token = portal.add_seller(inn)
+    validated_at = time.time()
+    if not warm_start:
+        validated_at -= SYSTEM_CONFIG["timeouts"]["COOKIES_TTL"]
+    await SessionVault(inn).save(portal.login_state(inn, token), validated_at=validated_at)
+
+
+def use_temp_sessions() -> tempfile.TemporaryDirectory:
+    """Сессии бенча во временной папке со своим ключом, не в users_data"""
+    tmp_dir = tempfile.TemporaryDirectory()
+    config.COOKIES_DIR = Path(tmp_dir.name) / "cookies"
+    os.environ[SYSTEM_CONFIG["session_vault"]["key_env"]] = Fernet.generate_key().decode()
+    return tmp_dir
+
+
+async def prepare(portal: MockPortal) -> dict:
+    """Селлеры, заказы и расписание слотов мока: inn -> поставки"""
+    sellers = {}
+    day = portal.today + timedelta(days=7)
+    for seller_number in range(SELLERS):
+        inn = f"77{seller_number:010d}"
+        await register_seller(portal, inn)
+
+        supplies = []
+        for supply_number in range(SUPPLIES_PER_SELLER):
+            preorder_id = f"{seller_number + 1}{supply_number:06d}"
+            warehouse = WAREHOUSES[supply_number % len(WAREHOUSES)]
+            portal.add_supply(inn, preorder_id, warehouse)
+            supplies.append(make_supply(preorder_id, warehouse, format_date(day)))
+        sellers[inn] = supplies
+
+    for warehouse in WAREHOUSES:
+        capacity = sum(
+            supply["warehouse_name"] == warehouse
+            for supplies in sellers.values()
+            for supply in supplies
+        )
+        # Платная дата раньше бесплатной: поставки ее пропускают
+        portal.schedule(RELEASE_AT - 20, "release", warehouse, day - timedelta(days=1), coeff=5)
+        portal.schedule(RELEASE_AT, "release", warehouse, day, coeff=0, capacity=capacity)
+    return sellers
+
+
+async def bench_e2e():
+    """Полный цикл бота на моке портала: вход, скан, обнаружение, бронирование"""
+    tmp_dir = use_temp_sessions()
+    SYSTEM_CONFIG["browser"]["headless"] = True
+    SYSTEM_CONFIG["runner"]["booking_enabled"] = True
+
+    portal = MockPortal()
+    await portal.start()
+    portal.patch_config()
+    sellers = await prepare(portal)
+    supplies_count = sum(len(supplies) for supplies in sellers.values())
+
+    monitor = CalendarMonitor() if SYSTEM_CONFIG["monitor"]["enabled"] else None
+    pool = BrowserPool()
+    await pool.start()
+    bots = []
+    runners = []
+    rss_samples = []
+
+    try:
+        for inn, supplies in sellers.items():
+            bot = MEGABOT(inn, monitor=monitor)
+            if not await bot.init_browser(pool):
+                logger.error(f"{inn} - бот не запустился")
+                continue
+            bots.append(bot)
+            await bot.create_supply(inn, supplies)
+            runners.extend(bot.runners.values())
+
+        deadline = time.perf_counter() + DURATION
+        while time.perf_counter() < deadline:
+            rss_samples.append(process_rss())
+            if len(portal.bookings) >= supplies_count:
+                break
+            await asyncio.sleep(RSS_INTERVAL)
+    finally:
+        for bot in bots:
+            await bot.close()
+        if monitor:
+            await monitor.stop()
+        await pool.stop()
+        await portal.stop()
+        tmp_dir.cleanup()
+
+    detection_ms = []
+    booking_ms = []
+    for runner in runners:
+        booking = portal.bookings.get(runner.preorder_id)
+        if runner.detected_at is None or runner.best_block is None:
+            logger.warning(f"{runner.preorder_id} - слот не обнаружен ({runner.state})")
+            continue
+        released_at = portal.released_at.get(
+            (runner.supply["warehouse_name"], runner.best_block["date"])
+        )
+        if released_at is not None:
+            detection_ms.append((runner.detected_at - released_at) * 1000)
+        if booking:
+            booking_ms.append((booking["booked_at"] - runner.detected_at) * 1000)
+
+    logger.info(f"Поставок: {supplies_count}, забронировано: {len(portal.bookings)}")
+    logger.info(f"Открытие слота -> обнаружение: {percentiles(detection_ms)}")
+    logger.info(f"Обнаружение -> бронь на портале: {percentiles(booking_ms)}")
+    logger.info(f"Запросы к порталу: {portal.stats()}")
+    logger.info(
+        f"Запросов на поставку: {sum(portal.requests.values()) / supplies_count:.1f}"
+    )
+    if rss_samples:
+        logger.info(
+            f"RSS: пик {max(rss_samples) / 1024 ** 2:.0f} МБ, "
+            f"на поставку {max(rss_samples) / supplies_count / 1024 ** 2:.1f} МБ"
+        )
+    for bot in bots:
+        logger.info(f"{bot.user_id} - Бюджет запросов: {bot.governor.stats()}")
+        logger.info(f"{bot.user_id} - Пул вкладок: {bot.pages.stats()}")
+    logger.info(f"Метрики этапов: {metrics.snapshot()['histograms']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_e2e())
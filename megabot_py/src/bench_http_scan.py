@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from datetime import timedelta
+
+import psutil
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from bench_e2e import make_supply, percentiles, process_rss, register_seller, use_temp_sessions
+from bot import MEGABOT
+from browser_pool import BrowserPool
+from http_scanner import http_pool
+from mock_portal import MockPortal
+from slots import format_date
+
+INN = "780000000001"
+WAREHOUSES = ["Коледино", "Электросталь"]
+SUPPLIES = 20
+ROUNDS = 10  # сканов каждой поставки, поставки сканируются одновременно
+
+
+def cpu_seconds() -> float:
+    """Процессорное время бота вместе с драйвером Playwright и Chromium"""
+    process = psutil.Process(os.getpid())
+    total = sum(process.cpu_times()[:2])
+    for child in process.children(recursive=True):
+        try:
+            total += sum(child.cpu_times()[:2])
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def slot_key(slots: list) -> list:
+    return [(slot["date"], slot["coeff"], slot["disabled"]) for slot in slots]
+
+
+async def http_model(bot: MEGABOT, supplies: list) -> dict:
+    """Скан запросом к API календаря: вкладок на поставки нет"""
+    rss_before = process_rss()
+    cpu_before = cpu_seconds()
+    latency_ms = []
+
+    async def scan(supply: dict) -> None:
+        started_at = time.perf_counter()
+        if await bot.calendar_client.fetch(supply) is not None:
+            latency_ms.append((time.perf_counter() - started_at) * 1000)
+
+    for _ in range(ROUNDS):
+        await asyncio.gather(*(scan(supply) for supply in supplies))
+
+    return {
+        "latency_ms": latency_ms,
+        "cpu_ms": (cpu_seconds() - cpu_before) * 1000 / (ROUNDS * len(supplies)),
+        "rss_mb": (process_rss() - rss_before) / len(supplies) / 1024**2,
+    }
+
+
+async def dom_model(bot: MEGABOT, supplies: list) -> dict:
+    """Вкладка на поставку: открытие модалки календаря и ее закрытие на каждый скан"""
+    rss_before = process_rss()
+    pages = []
+    for supply in supplies:
+        page = await bot.new_page(supply["preorder_id"])
+        await bot.open_supply_by_id(supply, page)
+        await bot.validate_supply_data(page, supply)
+        pages.append(page)
+
+    cpu_before = cpu_seconds()
+    latency_ms = []
+
+    async def scan(page, supply: dict) -> None:
+        started_at = time.perf_counter()
+        if await bot.take_calendar_snapshot(page, supply) is not None:
+            latency_ms.append((time.perf_counter() - started_at) * 1000)
+            await bot.close_calendar(page, supply)
+
+    for _ in range(ROUNDS):
+        await asyncio.gather(*(scan(page, supply) for page, supply in zip(pages, supplies)))
+
+    result = {
+        "latency_ms": latency_ms,
+        "cpu_ms": (cpu_seconds() - cpu_before) * 1000 / (ROUNDS * len(supplies)),
+        "rss_mb": (process_rss() - rss_before) / len(supplies) / 1024**2,
+    }
+
+    # Те же записи слотов: ответ API против ячеек открытого календаря
+    page, supply = pages[0], supplies[0]
+    await bot.open_calendar_modal(page, supply)
+    dom_slots = await bot.read_calendar(page)
+    http_slots = await bot.calendar_client.fetch(supply)
+    result["same_records"] = slot_key(dom_slots) == slot_key(http_slots or [])
+
+    for page in pages:
+        await page.close()
+    return result
+
+
+async def bench_http_scan():
+    """Память на поставку и задержка скана: HTTP-запрос против вкладки"""
+    tmp_dir = use_temp_sessions()
+    SYSTEM_CONFIG["browser"]["headless"] = True
+    SYSTEM_CONFIG["http_scan"]["enabled"] = True
+    SYSTEM_CONFIG["page_pool"]["enabled"] = False
+
+    portal = MockPortal(popup_rate=0.0)
+    await portal.start()
+    portal.patch_config()
+    await register_seller(portal, INN, warm_start=True)
+    day = portal.today + timedelta(days=5)
+    for warehouse in WAREHOUSES:
+        portal.release(warehouse, day - timedelta(days=2), coeff=3)
+        portal.release(warehouse, day, coeff=0)
+
+    supplies = []
+    for number in range(SUPPLIES):
+        preorder_id = f"{8_000_000 + number}"
+        warehouse = WAREHOUSES[number % len(WAREHOUSES)]
+        portal.add_supply(INN, preorder_id, warehouse)
+        supplies.append(make_supply(preorder_id, warehouse, format_date(day)))
+
+    pool = BrowserPool()
+    await pool.start()
+    bot = MEGABOT(INN)
+    try:
+        if not await bot.init_browser(pool):
+            raise RuntimeError("бот не запустился")
+
+        for name, model in (("HTTP", http_model), ("вкладка", dom_model)):
+            result = await model(bot, supplies)
+            logger.info(
+                f"{name}: скан {percentiles(result['latency_ms'])}, "
+                f"CPU {result['cpu_ms']:.1f} мс на скан, "
+                f"RSS {result['rss_mb']:.1f} МБ на поставку ({SUPPLIES} поставок)"
+            )
+            if "same_records" in result:
+                logger.info(f"Записи слотов HTTP и DOM совпадают: {result['same_records']}")
+    finally:
+        await bot.close()
+        await pool.stop()
+        await http_pool.close()
+        await portal.stop()
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_http_scan())
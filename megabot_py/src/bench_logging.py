@@ -0,0 +1,62 @@
+import tempfile
+import time
+from pathlib import Path
+
+from utils.logger import LogSampler, json_format, logger
+
+CYCLES = 2_000
+DATES = 30  # строк по датам на цикл скана, как в process_target_dates
+
+
+def scan_cycle(scan_log, preorder_id: str) -> None:
+    """Логи одного цикла скана: по строке на каждую дату календаря"""
+    scan_log.info(f"Обрабатываем даты для {preorder_id}")
+    for day in range(DATES):
+        scan_log.warning(
+            f"{preorder_id} - Дата ({day} декабря) доступна, но коэффициент (5) не подходит (1)"
+        )
+    scan_log.error(f"{preorder_id} - Не найдено подходящих дат")
+
+
+def measure(name: str, sink_options: dict, sampled: bool) -> float:
+    """Время цикла скана в вызывающем коде (без ожидания записи на диск)"""
+    logger.remove()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        handler_id = logger.add(Path(tmp_dir) / "bench.log", level="DEBUG", **sink_options)
+        scan_log = logger.bind(sample="scan_dates") if sampled else logger
+
+        with logger.contextualize(seller="bench", preorder="1", warehouse="bench"):
+            start = time.perf_counter()
+            for _ in range(CYCLES):
+                scan_cycle(scan_log, "1")
+            elapsed_us = (time.perf_counter() - start) * 1_000_000 / CYCLES
+
+        logger.remove(handler_id)  # дожидается очереди enqueue
+        lines = sum(1 for _ in open(Path(tmp_dir) / "bench.log"))
+
+    print(f"{name}: {elapsed_us:.0f} мкс на цикл скана, строк в файле: {lines}")
+    return elapsed_us
+
+
+def bench_logging():
+    """Стоимость логов цикла скана: синхронный текстовый файл против нового sink"""
+    legacy_us = measure("Синхронный текстовый файл", {}, sampled=False)
+    enqueue_us = measure(
+        "enqueue + JSON", {"enqueue": True, "format": json_format}, sampled=False
+    )
+    sampled_us = measure(
+        "enqueue + JSON + выборка",
+        {
+            "enqueue": True,
+            "format": json_format,
+            "filter": LogSampler(limit=5, window=60),
+        },
+        sampled=True,
+    )
+    print(
+        f"Ускорение: enqueue x{legacy_us / enqueue_us:.1f}, с выборкой x{legacy_us / sampled_us:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    bench_logging()
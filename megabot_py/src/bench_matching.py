@@ -0,0 +1,116 @@
+import random
+import time
+from datetime import date, timedelta
+
+from utils.logger import logger
+from config import BOOKING_MODES, BOOKING_PRIORITIES, COEFF_VALUES
+import matching
+from matching import SupplyMatrix
+from slots import format_date, match_slots
+
+SUPPLIES_COUNT = 10_000
+DAYS = 30
+ITERATIONS = 20
+
+
+def make_snapshot(today: date) -> list:
+    """Снимок календаря склада на DAYS дней: часть дат закрыта"""
+    slots = []
+    for index in range(DAYS):
+        disabled = random.random() < 0.3
+        slots.append(
+            {
+                "index": index,
+                "date": format_date(today + timedelta(days=index)),
+                "coeff": None if disabled else random.choice([0, 1, 2, 5, 10, 20]),
+                "disabled": disabled,
+                "warehouse": "bench",
+            }
+        )
+    return slots
+
+
+def make_supplies(today: date) -> list:
+    supplies = []
+    for number in range(SUPPLIES_COUNT):
+        any_date = random.random() < 0.3
+        target_dates = sorted(
+            random.sample(range(DAYS), random.randint(1, 7))
+        )
+        supplies.append(
+            {
+                "preorder_id": str(number),
+                "warehouse_name": "bench",
+                "booking_settings": {
+                    "mode": BOOKING_MODES["ANY_DATE"]
+                    if any_date
+                    else BOOKING_MODES["SPECIFIC_DATES"],
+                    "target_dates": None
+                    if any_date
+                    else [format_date(today + timedelta(days=day)) for day in target_dates],
+                    "priority": random.choice(list(BOOKING_PRIORITIES.values())),
+                    "target_coeff": random.choice(
+                        [COEFF_VALUES["COEFF_FREE"], COEFF_VALUES["COEFF_ANY"]]
+                        + COEFF_VALUES["COEFF_VALUE"]
+                    ),
+                },
+            }
+        )
+    return supplies
+
+
+def match_one_by_one(supplies: list, slots: list) -> dict:
+    """Старый путь: match_slots для каждой поставки отдельно"""
+    result = {}
+    for supply in supplies:
+        matched = match_slots(slots, supply)
+        if matched:
+            result[supply["preorder_id"]] = matched[0]
+    return result
+
+
+def measure(name: str, run) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        run()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / ITERATIONS
+    logger.info(f"{name}: {elapsed_ms:.2f} мс на снимок")
+    return elapsed_ms
+
+
+def bench_matching():
+    """Сопоставление снимка календаря с 10k поставками склада"""
+    random.seed(1)
+    today = date.today()
+    supplies = make_supplies(today)
+    slots = make_snapshot(today)
+
+    start = time.perf_counter()
+    matrix = SupplyMatrix(supplies, today)
+    logger.info(
+        f"Сборка матрицы {len(matrix)} поставок: {(time.perf_counter() - start) * 1000:.1f} мс"
+    )
+
+    expected = match_one_by_one(supplies, slots)
+    assert matrix.match(slots) == expected, "NumPy расходится с match_slots"
+    logger.info(f"Поставок с подходящим слотом: {len(expected)} из {SUPPLIES_COUNT}")
+
+    legacy_ms = measure("match_slots по одной поставке", lambda: match_one_by_one(supplies, slots))
+    batched_ms = measure("SupplyMatrix (NumPy)", lambda: matrix.match(slots))
+
+    # Запасной путь без NumPy
+    numpy_module, matching.np = matching.np, None
+    try:
+        fallback_matrix = SupplyMatrix(supplies, today)
+        assert fallback_matrix.match(slots) == expected, "Битовые маски расходятся с match_slots"
+        fallback_ms = measure("SupplyMatrix (без NumPy)", lambda: fallback_matrix.match(slots))
+    finally:
+        matching.np = numpy_module
+
+    logger.info(
+        f"Ускорение: NumPy x{legacy_ms / batched_ms:.1f}, без NumPy x{legacy_ms / fallback_ms:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    bench_matching()
@@ -0,0 +1,90 @@
+import asyncio
+import os
+from pathlib import Path
+
+import psutil
+from playwright.async_api import async_playwright
+from utils.logger import logger
+from config import BASE_DIR, SYSTEM_CONFIG
+from browser_pool import BrowserPool
+
+SELLERS_COUNTS = [1, 10, 50]
+CALENDAR_FIXTURE = BASE_DIR / "fixtures" / "calendar.html"
+
+
+def total_rss_mb() -> float:
+    """RSS процесса Python + всех дочерних процессов (драйвер, Chromium)"""
+    process = psutil.Process(os.getpid())
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            continue
+    return rss / 1024 / 1024
+
+
+async def old_model(sellers: int, html: str) -> float:
+    """Свой драйвер и свой Chromium на каждого селлера (MEGABOT.init_browser)"""
+    drivers, browsers = [], []
+    try:
+        for _ in range(sellers):
+            playwright = await async_playwright().start()
+            browser = await playwright.chromium.launch(
+                **{**SYSTEM_CONFIG["browser"], "headless": True}
+            )
+            context = await browser.new_context(viewport={"width": 1920, "height": 1080})
+            page = await context.new_page()
+            await page.set_content(html)
+            drivers.append(playwright)
+            browsers.append(browser)
+
+        await asyncio.sleep(2)
+        return total_rss_mb()
+
+    finally:
+        for browser in browsers:
+            await browser.close()
+        for playwright in drivers:
+            await playwright.stop()
+
+
+async def pool_model(sellers: int, html: str) -> float:
+    """Контекст на селлера в общем пуле процессов Chromium"""
+    SYSTEM_CONFIG["browser"]["headless"] = True
+    pool = BrowserPool()
+    await pool.start()
+    try:
+        for seller in range(sellers):
+            context = await pool.new_context(
+                f"seller_{seller}", viewport={"width": 1920, "height": 1080}
+            )
+            page = await context.new_page()
+            await page.set_content(html)
+
+        await asyncio.sleep(2)
+        return total_rss_mb()
+
+    finally:
+        await pool.stop()
+
+
+async def bench_memory():
+    """RSS на селлера: браузер на селлера против пула контекстов"""
+    html = Path(CALENDAR_FIXTURE).read_text(encoding="utf-8")
+    SYSTEM_CONFIG["browser_pool"]["max_contexts_per_browser"] = max(SELLERS_COUNTS)
+    base_rss = total_rss_mb()
+    logger.info(f"Базовый RSS процесса: {base_rss:.1f} MB")
+
+    for sellers in SELLERS_COUNTS:
+        old_rss = await old_model(sellers, html) - base_rss
+        pool_rss = await pool_model(sellers, html) - base_rss
+        logger.info(
+            f"Селлеров: {sellers} | "
+            f"браузер на селлера: {old_rss:.1f} MB ({old_rss / sellers:.1f} MB/селлер) | "
+            f"пул: {pool_rss:.1f} MB ({pool_rss / sellers:.1f} MB/селлер)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_memory())
@@ -0,0 +1,62 @@
+import asyncio
+import random
+import time
+
+from utils.logger import logger
+from metrics import MetricsRegistry
+
+OBSERVATIONS = 200_000
+SELLERS = 100
+WAREHOUSES = 20
+STAGES = ["navigation", "validate_supply_data", "open_calendar", "scan"]
+
+
+def bench_observe(registry: MetricsRegistry) -> None:
+    """Стоимость одного observe + inc с метками селлера, склада и этапа"""
+    random.seed(1)
+    labels = [
+        {
+            "seller": str(random.randrange(SELLERS)),
+            "warehouse": str(random.randrange(WAREHOUSES)),
+            "stage": random.choice(STAGES),
+        }
+        for _ in range(1000)
+    ]
+    values = [random.lognormvariate(6, 1) for _ in range(1000)]
+
+    start = time.perf_counter()
+    for number in range(OBSERVATIONS):
+        registry.observe("megabot_stage_ms", values[number % 1000], **labels[number % 1000])
+        registry.inc("megabot_stage_total", **labels[number % 1000])
+    elapsed_us = (time.perf_counter() - start) * 1_000_000 / OBSERVATIONS
+    logger.info(f"observe + inc: {elapsed_us:.2f} мкс на наблюдение")
+
+    series = len(registry.histograms["megabot_stage_ms"])
+    start = time.perf_counter()
+    body = registry.render()
+    logger.info(
+        f"render: {series} рядов, {len(body) // 1024} КБ за "
+        f"{(time.perf_counter() - start) * 1000:.1f} мс"
+    )
+
+
+async def bench_scrape(registry: MetricsRegistry) -> None:
+    """Один запрос к эндпоинту /metrics.json на случайном порту"""
+    server = await asyncio.start_server(registry.handle_request, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics.json HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        status_line = response.split(b"\r\n")[0].decode()
+        logger.info(f"Ответ эндпоинта: {status_line}, {len(response)} байт")
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+if __name__ == "__main__":
+    registry = MetricsRegistry()
+    bench_observe(registry)
+    asyncio.run(bench_scrape(registry))
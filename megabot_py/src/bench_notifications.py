@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from notifications import MemorySink, NotificationHub, NotificationSink
+
+NOTIFICATIONS = 100_000
+SELLERS = 20
+SINK_DELAY = 0.5  # секунды на сообщение: медленный Telegram
+
+
+class FlakySink(NotificationSink):
+    """Канал, который первые failures отправок падает"""
+
+    name = "flaky"
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, chat: str, text: str) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("канал недоступен")
+        self.sent.append((chat, text))
+
+
+def bench_notify() -> None:
+    """Стоимость notify() на пути бронирования: без доставки, только очередь"""
+    hub = NotificationHub()
+    texts = [f"Поставка {number} не найдена" for number in range(50)]
+
+    start = time.perf_counter()
+    for number in range(NOTIFICATIONS):
+        hub.notify(str(number % SELLERS), texts[number % len(texts)])
+    elapsed_us = (time.perf_counter() - start) * 1_000_000 / NOTIFICATIONS
+    logger.info(
+        f"notify: {elapsed_us:.2f} мкс на уведомление, в очереди {hub.size} "
+        f"из {NOTIFICATIONS} (остальные слиты)"
+    )
+
+
+async def bench_delivery() -> None:
+    """Медленный канал не задерживает вызывающего, чаты чередуются"""
+    SYSTEM_CONFIG["notifications"]["chat_interval"] = 0.0
+    sink = MemorySink(delay=SINK_DELAY)
+    hub = NotificationHub()
+    await hub.start({"memory": sink})
+
+    start = time.perf_counter()
+    for number in range(SELLERS):
+        hub.notify(str(number), f"Поставка {number} успешно забронирована")
+    enqueue_ms = (time.perf_counter() - start) * 1000
+    while hub.size:
+        await asyncio.sleep(0.01)
+    logger.info(
+        f"{SELLERS} уведомлений: постановка {enqueue_ms:.2f} мс, доставка "
+        f"{time.perf_counter() - start:.1f} с при {SINK_DELAY} с на сообщение"
+    )
+    await hub.stop()
+
+
+async def bench_retry() -> None:
+    """Повтор с удвоением паузы после двух ошибок канала"""
+    SYSTEM_CONFIG["notifications"].update(retry_backoff=0.1, chat_interval=0.0)
+    sink = FlakySink(failures=2)
+    hub = NotificationHub()
+    await hub.start({"flaky": sink})
+
+    start = time.perf_counter()
+    hub.notify("1", "Требуется авторизация")
+    while hub.size:
+        await asyncio.sleep(0.01)
+    logger.info(
+        f"Доставлено после ошибок за {time.perf_counter() - start:.2f} с: {sink.sent}"
+    )
+    await hub.stop()
+
+
+if __name__ == "__main__":
+    bench_notify()
+    asyncio.run(bench_delivery())
+    asyncio.run(bench_retry())
@@ -0,0 +1,153 @@
+import asyncio
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from bench_e2e import make_supply, register_seller, use_temp_sessions
+from bot import MEGABOT
+from browser_pool import BrowserPool
+from calendar_standby import CalendarStandby
+from mock_portal import MockPortal
+from slots import format_date, match_slots
+
+INN = "790000000001"
+PREORDER_ID = "9000001"
+WAREHOUSE = "Коледино"
+POLLS = 30  # сканов для замера стоимости одного скана
+TRIALS = 20  # открытий слота на режим
+POLL_INTERVAL = 2.0  # секунды между сканами при ожидании слота
+
+
+async def wait_cell(page, date: str) -> None:
+    """Ячейка даты отрисована и доступна для клика "Выбрать" """
+    await page.wait_for_selector(
+        f'{SYSTEM_CONFIG["selectors"]["calendar"]["cell"]}:has(span:text("{date}"))',
+        timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
+    )
+
+
+async def poll_cost(bot: MEGABOT, page, supply: dict) -> dict:
+    """Стоимость одного скана: открытие и закрытие модалки против повтора запроса"""
+    cycle_ms = []
+    for _ in range(POLLS):
+        started_at = time.perf_counter()
+        await bot.scan_calendar(page, supply)
+        await bot.close_calendar(page, supply)
+        cycle_ms.append((time.perf_counter() - started_at) * 1000)
+
+    standby = CalendarStandby(bot, page, supply)
+    await bot.scan_calendar(page, supply)
+    standby.opened()
+    refresh_ms = []
+    for _ in range(POLLS):
+        started_at = time.perf_counter()
+        await standby.refresh()
+        refresh_ms.append((time.perf_counter() - started_at) * 1000)
+    await standby.close()
+
+    return {
+        "cycle_ms": round(statistics.median(cycle_ms), 1),
+        "refresh_ms": round(statistics.median(refresh_ms), 1),
+    }
+
+
+async def release_trial(
+    portal: MockPortal, bot: MEGABOT, page, supply: dict, use_standby: bool, offset: float
+) -> tuple:
+    """Открытие слота через offset секунд от начала ожидания: (обнаружение, готовность ячейки), мс"""
+    day = portal.today + timedelta(days=3)
+    date = format_date(day)
+    standby = CalendarStandby(bot, page, supply)
+    released = {}
+
+    def release() -> None:
+        portal.release(WAREHOUSE, day, coeff=0)
+        released["at"] = time.perf_counter()
+
+    # Слот открывается в случайный момент цикла скана, а не между сканами
+    asyncio.get_running_loop().call_later(offset, release)
+
+    while True:
+        slots = await standby.refresh() if use_standby else None
+        stale = slots is not None
+        if slots is None:
+            slots = await bot.scan_calendar(page, supply)
+            if use_standby:
+                standby.opened()
+
+        if "at" in released and match_slots(slots, supply):
+            detected_at = time.perf_counter()
+            if stale:
+                # Данные свежие, ячейки нет: переоткрываем модалку
+                await standby.close()
+                await bot.scan_calendar(page, supply)
+            await wait_cell(page, date)
+            ready_at = time.perf_counter()
+            break
+
+        if not use_standby:
+            await bot.close_calendar(page, supply)
+        await asyncio.sleep(POLL_INTERVAL)
+
+    await bot.close_calendar(page, supply)
+    portal.remove(WAREHOUSE, day)
+    return (detected_at - released["at"]) * 1000, (ready_at - released["at"]) * 1000
+
+
+async def bench_standby():
+    """Горячий резерв календаря против открытия и закрытия модалки на каждый скан"""
+    tmp_dir = use_temp_sessions()
+    SYSTEM_CONFIG["browser"]["headless"] = True
+    # Замеряется стоимость скана, а не ожидание токенов governor
+    SYSTEM_CONFIG["governor"]["requests_per_minute"] = 6000
+    random.seed(1)
+
+    portal = MockPortal(popup_rate=0.0)
+    await portal.start()
+    portal.patch_config()
+    await register_seller(portal, INN, warm_start=True)
+    portal.add_supply(INN, PREORDER_ID, WAREHOUSE)
+    supply = make_supply(
+        PREORDER_ID, WAREHOUSE, format_date(portal.today + timedelta(days=3))
+    )
+
+    pool = BrowserPool()
+    await pool.start()
+    bot = MEGABOT(INN)
+    try:
+        if not await bot.init_browser(pool):
+            raise RuntimeError("бот не запустился")
+        page = await bot.new_page("bench")
+        await bot.open_supply_by_id(supply, page)
+        await bot.validate_supply_data(page, supply)
+
+        logger.info(f"Скан календаря, медиана: {await poll_cost(bot, page, supply)}")
+
+        # Одинаковые моменты открытия для обоих режимов: сравнение попарное
+        offsets = [random.uniform(0, POLL_INTERVAL) for _ in range(TRIALS)]
+        for use_standby in (False, True):
+            detection, ready = [], []
+            for offset in offsets:
+                detected_ms, ready_ms = await release_trial(
+                    portal, bot, page, supply, use_standby, offset
+                )
+                detection.append(detected_ms)
+                ready.append(ready_ms)
+            logger.info(
+                f"{'standby' if use_standby else 'открытие/закрытие'}: "
+                f"обнаружение p50 {statistics.median(detection):.0f} мс, "
+                f"ячейка готова p50 {statistics.median(ready):.0f} мс "
+                f"(интервал скана {POLL_INTERVAL} с, n={TRIALS})"
+            )
+    finally:
+        await bot.close()
+        await pool.stop()
+        await portal.stop()
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_standby())
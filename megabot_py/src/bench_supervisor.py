@@ -0,0 +1,138 @@
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import psutil
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from bench_e2e import make_supply, register_seller, use_temp_sessions
+from mock_portal import MockPortal
+from slots import format_date
+from supervisor import Supervisor
+from supply_store import SQLiteSupplyStore
+
+SELLERS = 4
+WAREHOUSES = ["Коледино", "Электросталь"]  # у каждого селлера поставка на каждый склад
+RELEASE_AT = 90  # секунды от старта: воркеры успевают запустить ботов
+DURATION = 240  # секунды прогона, если не все поставки забронированы
+GRACE = 5  # секунды после последней брони: боты дожидаются страницы поставки
+REQUESTS_PER_MINUTE = 30  # бюджет селлера: сканов за прогон больше, чем при 5
+RUNS = [(1, True), (2, True), (2, False)]  # (воркеров, shared_scans)
+
+
+async def prepare(portal: MockPortal, store_path: str) -> int:
+    """Селлеры мока, их поставки в SQLite и расписание слотов; число поставок"""
+    store = SQLiteSupplyStore(store_path)
+    day = portal.today + timedelta(days=7)
+    for seller_number in range(SELLERS):
+        inn = f"78{seller_number:010d}"
+        await register_seller(portal, inn, warm_start=True)
+        for supply_number, warehouse in enumerate(WAREHOUSES):
+            preorder_id = f"{seller_number + 1}{supply_number:06d}"
+            portal.add_supply(inn, preorder_id, warehouse)
+            await store.upsert(inn, make_supply(preorder_id, warehouse, format_date(day)))
+    await store.close()
+
+    for warehouse in WAREHOUSES:
+        portal.schedule(RELEASE_AT, "release", warehouse, day, coeff=0, capacity=SELLERS)
+    return SELLERS * len(WAREHOUSES)
+
+
+def cpu_seconds(pid: int) -> float:
+    """CPU процесса воркера без Chromium и драйвера Playwright"""
+    try:
+        times = psutil.Process(pid).cpu_times()
+    except psutil.NoSuchProcess:
+        return 0.0
+    return times.user + times.system
+
+
+async def run(workers: int, shared_scans: bool) -> dict:
+    tmp_dir = tempfile.TemporaryDirectory()
+    sessions_dir = use_temp_sessions()
+    SYSTEM_CONFIG["store"]["backend"] = "sqlite"
+    SYSTEM_CONFIG["store"]["sqlite_path"] = str(Path(tmp_dir.name) / "supplies.db")
+    SYSTEM_CONFIG["slot_history"]["dir"] = str(Path(tmp_dir.name) / "slot_history")
+    SYSTEM_CONFIG["supervisor"]["shared_scans"] = shared_scans
+
+    portal = MockPortal()
+    await portal.start()
+    portal.patch_config()
+    supplies_count = await prepare(portal, SYSTEM_CONFIG["store"]["sqlite_path"])
+
+    supervisor = Supervisor(workers)
+    task = asyncio.create_task(supervisor.run())
+    started_at = time.perf_counter()
+    cpu = {}
+    scans = {}
+    scanners = {}
+    try:
+        while time.perf_counter() - started_at < DURATION:
+            await asyncio.sleep(1)
+            cpu = {
+                index: cpu_seconds(worker["process"].pid)
+                for index, worker in supervisor.workers.items()
+            }
+            if time.perf_counter() - portal.started_at < RELEASE_AT:
+                # Сканы до открытия слотов: после брони поставки уходят со складов
+                scans = dict(portal.calendar_scans)
+                scanners = dict(supervisor.scanners)
+            if len(portal.bookings) >= supplies_count:
+                await asyncio.sleep(GRACE)
+                break
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await portal.stop()
+        sessions_dir.cleanup()
+        tmp_dir.cleanup()
+
+    booking_ms = [
+        (booking["booked_at"] - portal.released_at[(supply["warehouse"], booking["date"])])
+        * 1000
+        for preorder_id, booking in portal.bookings.items()
+        for supply in [portal.supplies[preorder_id]]
+    ]
+    return {
+        "workers": workers,
+        "shared_scans": shared_scans,
+        "booked": f"{len(portal.bookings)}/{supplies_count}",
+        "release_to_booking_p50_ms": round(statistics.median(booking_ms)) if booking_ms else None,
+        "release_to_booking_max_ms": round(max(booking_ms)) if booking_ms else None,
+        # Склад -> селлеры, сканировавшие его календарь (без общего скана - по одному на воркер)
+        "scanning_sellers": {
+            warehouse: sum(key[0] == warehouse for key in scans) for warehouse in WAREHOUSES
+        },
+        "calendar_scans": {
+            warehouse: sum(count for key, count in scans.items() if key[0] == warehouse)
+            for warehouse in WAREHOUSES
+        },
+        "scanners": scanners,
+        "worker_cpu_s": {index: round(seconds, 1) for index, seconds in cpu.items()},
+        "seconds": round(time.perf_counter() - started_at),
+    }
+
+
+async def bench_supervisor():
+    """Супервизор на моке портала: 1 и 2 воркера, общий скан склада и без него"""
+    SYSTEM_CONFIG["browser"]["headless"] = True
+    SYSTEM_CONFIG["runner"]["booking_enabled"] = True
+    SYSTEM_CONFIG["metrics"]["enabled"] = False
+    SYSTEM_CONFIG["governor"]["requests_per_minute"] = REQUESTS_PER_MINUTE
+
+    results = []
+    for workers, shared_scans in RUNS:
+        results.append(await run(workers, shared_scans))
+        logger.info(f"Супервизор: {results[-1]}")
+
+    logger.info(f"Ядер: {psutil.cpu_count()}")
+    for result in results:
+        logger.info(f"Итог: {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_supervisor())
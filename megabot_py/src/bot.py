@@ -1,10 +1,8 @@
 import asyncio
-import re
-from playwright.async_api import async_playwright, Page, ElementHandle
+from playwright.async_api import async_playwright, Page
 from utils.logger import logger
 from config import (
     COOKIES_DIR,
-    USER_SUPPLIES,
     COEFF_VALUES,
     SYSTEM_CONFIG,
     BOOKING_MODES,
@@ -13,59 +11,158 @@ from config import (
     USER_LIMITS,
     get_user_cookies_dir,
 )
-
-import json
+from browser_pool import BrowserPool
+from governor import get_governor
+from monitor import CalendarMonitor
+from popup_guard import PopupGuard
+from request_filter import RequestFilter
+from calendar_reader import read_calendar
+from slot_feed import SlotFeed
+from slot_history import SlotHistory
+from poll_scheduler import PollScheduler
+from session_vault import SessionVault
+from session_probe import (
+    PROBE_AUTH_LOST,
+    PROBE_ERROR,
+    PROBE_INN_MISMATCH,
+    PROBE_OK,
+    SessionProbe,
+)
+from supply_runner import SupplyRunner
+from supply_store import SupplyStore, SupplySync, create_store
+from leases import Lease, LeaseManager, create_lease_store
+from slots import clean_date, coeff_fits
+from timings import StepTimer
+from metrics import metrics
+from notifications import notifications
+from page_pool import PagePool
+from http_scanner import AuthLost, CalendarClient, http_pool
+
+from collections import Counter
 from pathlib import Path
 import time
-from dataclasses import dataclass
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict
+
+# Шаги StepTimer бронирования -> этап в гистограмме megabot_stage_ms
+BOOKING_STAGES = {
+    "token": "book_token",  # ожидание токена бронирования в governor
+    "selected": "select_date",
+    "book_clicked": "book_date",
+    "booked": "validate_book_date",  # до получения номера поставки
+    "confirmed": "confirm_page",  # заголовок и статус страницы поставки
+}
 
 
 class MEGABOT:
-    def __init__(self, user_id: str):
+    def __init__(
+        self,
+        user_id: str,
+        monitor: Optional[CalendarMonitor] = None,
+        store: Optional[SupplyStore] = None,
+        history: Optional[SlotHistory] = None,
+        scheduler: Optional[PollScheduler] = None,
+        lease: Optional[Lease] = None,
+    ):
         self.browser = None
         self.page = None
         self.playwright = None
         self.context = None
+        self.pool = None
         self.redis_client = None
         self.supply_status = None
         self.auth_status = False
         self.user_id = user_id
         self.user_id_validated = False
+        # Общий Monitor Bot: календарь склада сканируется один раз для всех поставок
+        self.monitor = monitor
+        # Закрытие попапов по событию на всех вкладках бота
+        self.popup_guard = PopupGuard(user_id)
+        # Блокировка лишних запросов и счетчики трафика по вкладкам
+        self.request_filter = RequestFilter()
+        self.network_report = None
+        # Прогретые вкладки для поставок
+        self.pages = PagePool(self)
+        # Слоты календаря из XHR-ответов по вкладкам
+        self.slot_feeds: Dict[Page, SlotFeed] = {}
+        # Скан календаря HTTP-запросом с cookies сессии, вкладка - только под бронь
+        self.calendar_client = (
+            CalendarClient(user_id) if SYSTEM_CONFIG["http_scan"]["enabled"] else None
+        )
+        # Задачи-автоматы поставок: preorder_id -> SupplyRunner
+        self.runners: Dict[str, SupplyRunner] = {}
+        self.user_id_task = None
+        # Бюджет запросов селлера к WB, общий для всех вкладок
+        self.governor = get_governor(user_id)
+        # Хранилище поставок: сюда пишется статус, чтобы он пережил перезапуск
+        self.store = store
+        # История изменений слотов по складам (общая для всех ботов)
+        self.history = history
+        # Интервалы сканов по выученным окнам появления слотов
+        self.scheduler = scheduler
+        # Аренда селлера узлом (несколько серверов): бронь и статус только с живой арендой
+        self.lease = lease
 
         # Создаем базовые директории при инициализации
         COOKIES_DIR.mkdir(parents=True, exist_ok=True)
         user_cookies_dir = get_user_cookies_dir(user_id)
         user_cookies_dir.mkdir(parents=True, exist_ok=True)
 
-        self.cookies_file = user_cookies_dir / "wb_cookies.json"
+        # Зашифрованная сессия (storage state) с временем проверки ИНН
+        self.vault = SessionVault(user_id)
         self.auth_notification_sent = False
+        # Замер времени от запуска до первого скана календаря
+        self.started_at = None
+        self.first_scan_ms = None
+        self.warm_start = False
 
-    async def init_browser(self):
+    async def init_browser(self, pool: Optional[BrowserPool] = None):
         logger.info("Начинаем запуск браузера...")
+        self.started_at = time.perf_counter()
         try:
-            # Запускаем Playwright
-            self.playwright = await async_playwright().start()
-            logger.info("Playwright запущен")
+            # Сессия из хранилища: контекст создается сразу авторизованным
+            session = await self.vault.load()
+            context_options = {"viewport": {"width": 1920, "height": 1080}}
+            if session:
+                context_options["storage_state"] = session["storage_state"]
+                if self.calendar_client:
+                    self.calendar_client.set_cookies(session["storage_state"]["cookies"])
+
+            if pool:
+                # Контекст селлера в общем пуле процессов Chromium
+                self.pool = pool
+                self.context = await pool.new_context(
+                    self.user_id,
+                    on_recycle=self.on_context_recycled,
+                    **context_options,
+                )
+                logger.info("Контекст получен из пула браузеров")
+            else:
+                # Запускаем Playwright
+                self.playwright = await async_playwright().start()
+                logger.info("Playwright запущен")
 
-            # Запускаем браузер с настройками из конфига
-            self.browser = await self.playwright.chromium.launch(
-                **SYSTEM_CONFIG["browser"]
-            )
-            logger.info("Браузер запущен")
+                # Запускаем браузер с настройками из конфига
+                self.browser = await self.playwright.chromium.launch(
+                    **SYSTEM_CONFIG["browser"]
+                )
+                logger.info("Браузер запущен")
 
-            # Создаем контекст и страницу
-            self.context = await self.browser.new_context(
-                viewport={"width": 1920, "height": 1080}
-            )
+                # Создаем контекст и страницу
+                self.context = await self.browser.new_context(**context_options)
 
-            self.page = await self.context.new_page()
+            self.page = await self.new_page("main")
             logger.info("Страница создана")
+            self.network_report = asyncio.create_task(self.request_filter.report())
 
-            # Пробуем загрузить cookies
-            await self.load_cookies()
+            if self.vault.is_fresh(session):
+                # ИНН проверялся недавно: без входа на сайт и карточки поставщика
+                logger.info("Сессия из хранилища свежая, проверка входа пропущена")
+                self.user_id_validated = True
+                self.warm_start = True
+                return True
 
             # Используем URL из нового конфига
+            await self.governor.acquire("navigate")
             await self.page.goto(
                 SYSTEM_CONFIG["urls"]["seller"],
                 timeout=SYSTEM_CONFIG["timeouts"]["AUTH_TIMEOUT"] * 1000,
@@ -88,7 +185,23 @@ class MEGABOT:
 
     async def close(self):
         """Закрытие всех ресурсов"""
+        if self.monitor:
+            # Склады, которые сканировал этот бот, переходят к другим селлерам
+            self.monitor.detach(self)
+        await self.stop_supplies()
+        self.pages.reset()
+        if self.user_id_task:
+            self.user_id_task.cancel()
+        logger.info(f"Закрыто попапов: {self.popup_guard.metrics()}")
+        logger.info(f"Трафик вкладок: {self.request_filter.totals()}")
+        if self.network_report:
+            self.network_report.cancel()
         try:
+            if self.pool:
+                # Процесс браузера общий - закрываем только контекст селлера
+                await self.pool.release_context(self.user_id)
+                logger.info("Все ресурсы закрыты")
+                return
             if self.page:
                 await self.page.close()
             if self.context:
@@ -101,129 +214,97 @@ class MEGABOT:
         except Exception as e:
             logger.error(f"Ошибка при закрытии ресурсов: {str(e)}")
 
+    async def new_page(self, name: str) -> Page:
+        """Новая вкладка в контексте бота с фильтром запросов"""
+        page = await self.context.new_page()
+        await self.request_filter.attach(page, f"{self.user_id}:{name}")
+        await self.popup_guard.attach(page, name)
+
+        # Слоты календаря из ответа сети для этой вкладки
+        feed = SlotFeed(
+            page, name, self.calendar_client.learn if self.calendar_client else None
+        )
+        feed.attach()
+        self.slot_feeds[page] = feed
+        page.on("close", lambda closed_page: self.slot_feeds.pop(closed_page, None))
+        return page
+
+    async def on_context_recycled(self, context) -> None:
+        """Пул пересоздал упавший контекст: восстанавливаем сессию и поставки"""
+        logger.warning(f"Контекст пользователя {self.user_id} пересоздан пулом")
+        supplies = [
+            runner.supply for runner in self.runners.values() if not runner.finished
+        ]
+        await self.stop_supplies()
+        self.pages.reset()
+        self.context = context
+
+        session = await self.vault.load()
+        if session:
+            await context.add_cookies(session["storage_state"]["cookies"])
+        self.page = await self.new_page("main")
+        asyncio.create_task(self.create_supply(self.user_id, supplies))
+
     async def notification_sender(self, message):
-        """Отправка уведомлений
-        - В Redis для Monitor Bot
-        - В Telegram
+        """Уведомление селлеру: только постановка в очередь
+
+        Доставка в Telegram и Redis для Monitor Bot идет в фоне
+        (notifications.py), бронирование ее не ждет.
         """
-        pass
+        notifications.notify(self.user_id, message)
 
-    async def save_cookies(self):
-        """Сохранение cookies"""
+    async def save_session(self) -> bool:
+        """Сохранение storage state контекста с отметкой проверки ИНН"""
         try:
-            cookies = await self.context.cookies()
-            if not cookies:
+            storage_state = await self.context.storage_state()
+            if not storage_state.get("cookies"):
                 logger.error("Нет cookies для сохранения")
                 return False
 
-            # Создаем директорию для cookies если её нет
-            self.cookies_file.parent.mkdir(parents=True, exist_ok=True)
-
-            with open(self.cookies_file, "w") as f:
-                json.dump(cookies, f)
-            logger.info(f"Cookies сохранены в {self.cookies_file}")
-            return True
-
-        except Exception as e:
-            logger.error(f"Ошибка сохранения cookies: {str(e)}")
-            return False
-
-    async def load_cookies(self):
-        """Загрузка cookies"""
-        try:
-            if self.cookies_file.exists():
-                # Загружаем cookies
-                with open(self.cookies_file, "r") as f:
-                    cookies = json.load(f)
-
-                if not cookies:
-                    logger.error("Файл cookies пустой")
-                    return False
-
-                await self.context.add_cookies(cookies)
-                logger.info(f"Cookies загружены из {self.cookies_file}")
+            if await self.vault.save(storage_state):
+                logger.info(f"Сессия сохранена в {self.vault.path}")
+                if self.calendar_client:
+                    self.calendar_client.set_cookies(storage_state["cookies"])
                 return True
-
-            logger.warning(f"Файл cookies не найден: {self.cookies_file}")
             return False
 
         except Exception as e:
-            logger.error(f"Ошибка загрузки cookies: {str(e)}")
+            logger.error(f"Ошибка сохранения сессии: {str(e)}")
             return False
 
-    async def create_supply(self, user_id: str) -> bool:
+    async def create_supply(self, user_id: str, supplies: List[dict]) -> bool:
+        """Запуск задач для активных поставок селлера из хранилища"""
         logger.info(f"Начинаем создание поставок для пользователя {user_id}")
-        await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_DEBUG"])
 
         if not self.user_id_validated:
             logger.error("ID поставщика не валиден")
             return False
 
         # Запускаем мониторинг ID в фоновом режиме
-        asyncio.create_task(self.monitor_user_id(self.page))
+        if self.user_id_task is None or self.user_id_task.done():
+            self.user_id_task = asyncio.create_task(self.monitor_user_id())
 
         try:
-            # Находим данные пользователя в USER_SUPPLIES
-            user_data = next(
-                (user for user in USER_SUPPLIES if user["user_id"] == user_id), None
-            )
-            if not user_data:
-                logger.error(f"Пользователь {user_id} не найден")
-                return False
-
-            user_supplies = user_data["supplies"]
-
             # Проверяем права доступа для каждой поставки
-            filtered_supplies = []
-            for supply in user_supplies:
-                if supply["status"]["active"]:
-                    user_type = supply.get("user_type", USER_TYPES["USER_FREE"])
-                    booking_mode = supply["booking_settings"]["mode"]
-                    target_coeff = supply["booking_settings"]["target_coeff"]
-
-                    # Проверяем доступ к ANY_DATE
-                    if (
-                        booking_mode == BOOKING_MODES["ANY_DATE"]
-                        and not USER_LIMITS[user_type]["features"]["any_date"]
-                    ):
-                        logger.error(
-                            f"Режим ANY_DATE недоступен для пользователя типа {user_type}"
-                        )
-                        continue
-
-                    # Проверяем доступ к ANY коэффициенту
-                    if (
-                        target_coeff == COEFF_VALUES["COEFF_ANY"]
-                        and not USER_LIMITS[user_type]["features"]["any_coeff"]
-                    ):
-                        logger.error(
-                            f"Режим ANY коэффициент недоступен для пользователя типа {user_type}"
-                        )
-                        continue
-
-                    filtered_supplies.append(supply)
+            filtered_supplies = [
+                supply
+                for supply in supplies
+                if supply["status"]["active"]
+                and not supply["status"].get("booked")
+                and self.check_supply_access(supply)
+            ]
 
             # Проверяем лимит на количество поставок для FREE пользователей
-            if (
-                user_type == USER_TYPES["USER_FREE"]
-                and len(filtered_supplies) > USER_LIMITS[user_type]["max_supplies"]
-            ):
-                logger.warning(
-                    f"Превышен лимит активных поставок для пользователя {user_id}"
-                )
+            if not self.check_supplies_limit(filtered_supplies):
                 return False
 
-            # Создаем задачи только для отфильтрованных поставок
-            tasks = []
+            # Одна задача-автомат на каждую отфильтрованную поставку
+            await self.stop_supplies()
+            if self.calendar_client:
+                # Сканы идут без вкладок: вкладка под бронь греется заранее
+                self.pages.schedule_fill()
             for supply in filtered_supplies:
-                page = await self.context.new_page()
-                task = asyncio.create_task(
-                    self.open_supply_by_id(supply=supply, page=page)
-                )
-                tasks.append(task)
-                # await asyncio.sleep(3)  # 2 секунды между поставками
-
-            await asyncio.gather(*tasks)
+                self.start_runner(supply)
             return True
 
         except Exception as e:
@@ -232,90 +313,148 @@ class MEGABOT:
             )
             return False
 
-    async def open_supply_by_id(self, supply: dict, page: Page) -> bool:
-        preorder_id = supply["preorder_id"]
-        max_attempts = 2  # В конфиг
-        attempt = 0
-
-        while attempt < max_attempts:
-            try:
-                supply_url = (
-                    f"{SYSTEM_CONFIG['urls']['supply']}?preorderId={preorder_id}"
-                )
-                await page.goto(supply_url)
-
-                popup_monitor = asyncio.create_task(self.monitor_popups(page, supply))
-                validate_result = await self.validate_supply_data(page, supply)
+    def check_supply_access(self, supply: dict) -> bool:
+        """Доступ типа пользователя к режимам поставки"""
+        user_type = supply.get("user_type", USER_TYPES["USER_FREE"])
+        booking_mode = supply["booking_settings"]["mode"]
+        target_coeff = supply["booking_settings"]["target_coeff"]
+
+        # Проверяем доступ к ANY_DATE
+        if (
+            booking_mode == BOOKING_MODES["ANY_DATE"]
+            and not USER_LIMITS[user_type]["features"]["any_date"]
+        ):
+            logger.error(f"Режим ANY_DATE недоступен для пользователя типа {user_type}")
+            return False
 
-                if validate_result:
-                    popup_monitor.cancel()
-                    return True
+        # Проверяем доступ к ANY коэффициенту
+        if (
+            target_coeff == COEFF_VALUES["COEFF_ANY"]
+            and not USER_LIMITS[user_type]["features"]["any_coeff"]
+        ):
+            logger.error(
+                f"Режим ANY коэффициент недоступен для пользователя типа {user_type}"
+            )
+            return False
 
-                # Если validate_supply_data вернул False:
-                logger.info(
-                    f"Попытка {attempt + 1}: Перезапуск вкладки для {preorder_id}"
-                )
-                popup_monitor.cancel()
+        return True
 
-                # Если это последняя попытка
-                if attempt == max_attempts - 1:
-                    await page.close()
-                    logger.error(
-                        f"Отправляем сообщение о недоступности поставки {preorder_id}"
-                    )
-                    await self.notification_sender(
-                        f"Поставка {preorder_id} недоступна после {max_attempts} попыток"
-                    )
-                    return False
+    def check_supplies_limit(self, supplies: List[dict]) -> bool:
+        """Лимит активных поставок для FREE пользователей"""
+        user_types = {
+            supply.get("user_type", USER_TYPES["USER_FREE"]) for supply in supplies
+        }
+        if (
+            USER_TYPES["USER_FREE"] in user_types
+            and len(supplies) > USER_LIMITS[USER_TYPES["USER_FREE"]]["max_supplies"]
+        ):
+            logger.warning(
+                f"Превышен лимит активных поставок для пользователя {self.user_id}"
+            )
+            return False
+        return True
 
-                # Если есть ещё попытки - создаём новую вкладку
-                await page.close()
-                page = await self.context.new_page()
-                attempt += 1
-                await asyncio.sleep(2)
+    def start_runner(self, supply: dict) -> SupplyRunner:
+        runner = SupplyRunner(self, supply)
+        self.runners[supply["preorder_id"]] = runner
+        runner.start()
+        return runner
 
-            except Exception as e:
-                logger.error(f"Ошибка при открытии поставки {preorder_id}: {str(e)}")
-                return False
+    async def apply_supply(self, supply: dict) -> None:
+        """Изменение поставки из хранилища: новая, правка или отмена
 
-        return False
+        Правка настроек бронирования применяется к работающей задаче на месте,
+        смена склада перезапускает задачу, снятие active - останавливает.
+        """
+        preorder_id = supply["preorder_id"]
+        runner = self.runners.get(preorder_id)
 
-    async def monitor_popups(self, page: Page, supply: dict = None) -> None:
-        """Постоянный мониторинг и закрытие попапов"""
-        preorder_id = supply["preorder_id"] if supply else None
-        logger.info(f"{preorder_id} - Запущен мониторинг попапов для ")
+        if not supply["status"]["active"] or supply["status"].get("booked"):
+            if runner:
+                logger.info(f"{preorder_id} - Поставка отключена в хранилище")
+                self.runners.pop(preorder_id, None)
+                await runner.cancel()
+            return
 
-        while True:  # Бесконечный цикл
-            try:
-                await self.check_popups(page, supply)
-                # Пауза между проверками
-                await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["CHECK_POPUPS_INTERVAL"])
+        if not self.check_supply_access(supply):
+            return
 
-            except Exception as e:
-                logger.error(f"{preorder_id} - Ошибка мониторинга попапов: {str(e)}")
-                await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["CHECK_POPUPS_INTERVAL"])
+        if runner and not runner.finished:
+            current = runner.supply
+            if (
+                current["warehouse_name"] == supply["warehouse_name"]
+                and current.get("warehouse_id") == supply.get("warehouse_id")
+            ):
+                if current["booking_settings"] != supply["booking_settings"]:
+                    current["booking_settings"] = supply["booking_settings"]
+                    logger.info(f"{preorder_id} - Настройки бронирования обновлены")
+                return
+
+            logger.info(f"{preorder_id} - Склад изменен, перезапуск задачи")
+            self.runners.pop(preorder_id, None)
+            await runner.cancel()
+            # Статус ведет бот: переносим счетчики из старой задачи
+            supply["status"] = {**current["status"], "active": True}
+
+        active_supplies = [
+            runner.supply for runner in self.runners.values() if not runner.finished
+        ]
+        if not self.check_supplies_limit(active_supplies + [supply]):
+            return
+
+        logger.info(f"{preorder_id} - Новая поставка из хранилища")
+        self.start_runner(supply)
+
+    async def save_supply(self, supply: dict) -> None:
+        """Сохранение статуса поставки в хранилище"""
+        if self.store is None:
+            return
+        # Ограждение прямо перед записью: узел без аренды статус не пишет
+        if self.lease and not await self.lease.valid(SYSTEM_CONFIG["leases"]["fence_margin"]):
+            logger.warning(
+                f"{supply['preorder_id']} - Аренда селлера потеряна, статус не сохранен"
+            )
+            return
+        try:
+            await self.store.save_status(self.user_id, supply)
+        except Exception as e:
+            logger.error(
+                f"{supply['preorder_id']} - Ошибка сохранения статуса: {str(e)}"
+            )
 
-    async def check_popups(self, page: Page, supply: dict = None) -> None:
-        """Проверка и закрытие попапов"""
-        preorder_id = supply["preorder_id"] if supply else None
-        logger.info(f"{preorder_id} - Проверяем наличие попапов")
+    async def stop_supplies(self) -> None:
+        """Остановка всех задач поставок бота"""
+        runners = list(self.runners.values())
+        self.runners.clear()
+        for runner in runners:
+            await runner.cancel()
+
+    def runner_stats(self) -> Dict[str, int]:
+        """Количество живых задач поставок по состояниям"""
+        return dict(
+            Counter(
+                runner.state for runner in self.runners.values() if not runner.finished
+            )
+        )
 
-        for popup_name, selectors in SYSTEM_CONFIG["popups"].items():
-            try:
-                # Ищем кнопку закрытия
-                close_button = await page.wait_for_selector(
-                    selectors["close"], timeout=1000, state="visible"
-                )
+    async def open_supply_by_id(self, supply: dict, page: Page) -> bool:
+        """Переход на страницу поставки"""
+        preorder_id = supply["preorder_id"]
 
-                if close_button:
-                    logger.info(
-                        f"{preorder_id} - Обнаружен активный попап: {popup_name}"
-                    )
-                    await close_button.click()
-                    logger.info(f"{preorder_id} - Попап {popup_name} закрыт")
+        try:
+            supply_url = f"{SYSTEM_CONFIG['urls']['supply']}?preorderId={preorder_id}"
+            await self.governor.acquire("navigate")
+            await self.pages.open(
+                page,
+                supply_url,
+                SYSTEM_CONFIG["selectors"]["supply"]["preorder_id_selector"],
+                preorder_id,
+            )
+            return True
 
-            except Exception:
-                continue  # Если попап не найден или ошибка закрытия - продолжаем проверку других
+        except Exception as e:
+            logger.error(f"Ошибка при открытии поставки {preorder_id}: {str(e)}")
+            return False
 
     async def check_auth_status(self, page: Page) -> bool:
         logger.info("Проверяем статус авторизации...")
@@ -335,11 +474,8 @@ class MEGABOT:
                         logger.info("Авторизация успешна")
                         # Добавляем проверку user_id после успешной авторизации
                         if await self.validate_user_id(page):
-                            # Сохраняем cookies после успешной авторизации
-                            if await self.save_cookies():
-                                logger.info(
-                                    "Cookies успешно сохранены после авторизации"
-                                )
+                            # Сохраняем сессию после успешной авторизации
+                            await self.save_session()
                             return True
                         else:
                             logger.error("Ошибка валидации ID поставщика")
@@ -366,8 +502,14 @@ class MEGABOT:
 
     async def validate_user_id(self, page: Page) -> bool:
         """Проверка ИНН поставщика"""
+        return await self.supplier_card_status(page) == PROBE_OK
+
+    async def supplier_card_status(self, page: Page) -> str:
+        """ИНН с карточки поставщика: PROBE_OK, PROBE_INN_MISMATCH или
+        PROBE_ERROR, если карточка не открылась или ИНН на ней не прочитан"""
         try:
             # Переходим на страницу карточки поставщика
+            await self.governor.acquire("navigate")
             await page.goto(
                 SYSTEM_CONFIG["urls"]["supplier_card"],
                 timeout=SYSTEM_CONFIG["timeouts"]["WAIT_NETWORK"] * 1000,
@@ -381,50 +523,106 @@ class MEGABOT:
 
             if not inn_input:
                 logger.error("Поле с ИНН не найдено")
-                return False
+                return PROBE_ERROR
 
             # Получаем значение из input
             wb_inn = await inn_input.get_attribute("value")
             if not wb_inn:
                 logger.error("ИНН не найден в поле")
-                return False
+                return PROBE_ERROR
 
             # Сравниваем с сохраненным ИНН (user_id)
             if wb_inn != self.user_id:
                 logger.error(f"ИНН не совпадает: {wb_inn} != {self.user_id}")
-                return False
+                return PROBE_INN_MISMATCH
 
             logger.info(f"ИНН подтвержден: {wb_inn}")
             self.user_id_validated = True
-            return True
+            return PROBE_OK
 
         except Exception as e:
             logger.error(f"Ошибка проверки ИНН: {str(e)}")
-            return False
+            return PROBE_ERROR
 
-    async def monitor_user_id(self, page: Page) -> None:
-        """Периодическая проверка ИНН поставщика"""
+    async def check_supplier_card(self) -> str:
+        """Карточка поставщика в новой вкладке текущего контекста
+
+        Вкладка, с которой бот стартовал, к этому моменту могла быть
+        закрыта или пересоздана пулом вместе с контекстом.
+        """
+        page = await self.new_page("supplier_card")
+        try:
+            return await self.supplier_card_status(page)
+        finally:
+            await page.close()
+
+    async def monitor_user_id(self) -> None:
+        """Периодическая проверка сессии и ИНН поставщика без отрисовки страниц
+
+        Карточка поставщика открывается только если API проверки
+        не отвечает max_errors раз подряд. Поставки выключаются только при
+        подтвержденной потере сессии или другом ИНН; если не ответили ни
+        API, ни карточка, сессия считается неизвестной и проверка
+        повторяется с растущей паузой.
+        """
+        probe = SessionProbe(self.context, self.user_id, self.governor)
+        # ИНН только что проверен при запуске (или сессия свежая)
+        delay = SYSTEM_CONFIG["timeouts"]["CHECK_USER_ID_INTERVAL"]
+        # Проверок подряд без ответа
+        unknown = 0
         while True:
+            await asyncio.sleep(delay)
             try:
-                if not await self.validate_user_id(page):
-                    logger.error("ИНН поставщика больше не валиден")
-                    # Останавливаем все активные поставки
-                    for supply in USER_SUPPLIES:
-                        if supply["user_id"] == self.user_id:
-                            for s in supply["supplies"]:
-                                s["status"]["active"] = False
+                probe.context = self.context  # контекст мог пересоздать пул
+                result = await probe.check()
+                delay = await probe.next_interval(result)
+
+                if probe.errors >= probe.config["max_errors"]:
+                    logger.warning("API проверки сессии недоступен, проверяем карточку поставщика")
+                    probe.errors = 0
+                    result = await self.check_supplier_card()
+
+                if result in (PROBE_AUTH_LOST, PROBE_INN_MISMATCH):
+                    logger.error(f"ИНН поставщика больше не валиден: {result}")
+                    await self.on_session_lost()
                     break
-                await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["CHECK_USER_ID_INTERVAL"])
+
+                if result == PROBE_OK:
+                    unknown = 0
+                    await self.save_session()
+                    logger.debug(f"{self.user_id} - Сессия в порядке, следующая проверка через {delay:.0f} с")
+                    continue
+
             except Exception as e:
                 logger.error(f"Ошибка мониторинга ИНН поставщика: {str(e)}")
-                await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["CHECK_USER_ID_INTERVAL"])
+
+            unknown += 1
+            delay = min(
+                probe.config["min_interval"] * 2 ** (unknown - 1),
+                probe.config["max_interval"],
+            )
+            logger.warning(
+                f"{self.user_id} - Состояние сессии неизвестно, повтор через {delay:.0f} с"
+            )
+
+    async def on_session_lost(self) -> None:
+        """Сессия потеряна: поставки селлера останавливаются и выключаются"""
+        self.user_id_validated = False
+        if self.monitor:
+            self.monitor.detach(self)
+        # Список заранее: пока идет запись статуса, задачи могут завершаться
+        for runner in list(self.runners.values()):
+            runner.supply["status"]["active"] = False
+            await self.save_supply(runner.supply)
+        await self.stop_supplies()
+        await self.auth_false()
 
     async def auth_false(self) -> bool:
         if self.auth_notification_sent:
             return True
 
         self.auth_notification_sent = True
-        asyncio.create_task(self.notification_sender("Требуется авторизация"))
+        await self.notification_sender("Требуется авторизация")
         return True
 
     async def validate_supply_data(self, page: Page, supply: dict) -> bool:
@@ -455,7 +653,7 @@ class MEGABOT:
 
                 if page_id == preorder_id:
                     logger.info(f"ID заказа {preorder_id} подтвержден")
-                    return await self.open_calendar(page, supply)
+                    return True
 
                 logger.error(
                     f"Неверный номер заказа. На странице: {page_id}, ожидался: {preorder_id}"
@@ -478,221 +676,383 @@ class MEGABOT:
         )
         return False
 
-    async def open_calendar(self, page: Page, supply: dict) -> bool:
+    async def open_calendar(self, page: Page, supply: dict) -> Optional[List[dict]]:
+        """Открытие календаря с повторами, возвращает слоты или None"""
         preorder_id = supply["preorder_id"]
-        logger.info(f"Открываем календарь для заказа {preorder_id}")
+        logger.bind(sample="calendar").info(f"Открываем календарь для заказа {preorder_id}")
 
         max_attempts = 3
         attempt = 0
 
         while attempt < max_attempts:
-            try:
-                # Ждем кнопку планирования
-                plan_button = await page.wait_for_selector(
-                    SYSTEM_CONFIG["selectors"]["supply"]["plan_button"],
-                    timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
-                    state="visible",
-                )
+            calendar_slots = await self.scan_calendar(page, supply, attempt)
+            if calendar_slots is not None:
+                return calendar_slots
 
-                if not plan_button:
-                    logger.error(
-                        f"Попытка {attempt + 1}: Кнопка планирования не найдена - {preorder_id}"
-                    )
-                    attempt += 1
-                    continue
+            attempt += 1
+            await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_ANIMATION"])
 
-                # Кликаем по кнопке
-                await plan_button.click()
-                logger.info(f"Кликнули по кнопке планирования - {preorder_id}")
+        logger.error(
+            f"Не удалось открыть календарь после {max_attempts} попыток - {preorder_id}"
+        )
+        return None
+
+    async def scan_calendar(
+        self, page: Page, supply: dict, attempt: int = 0
+    ) -> Optional[List[dict]]:
+        """Снимок календаря с записью в историю слотов склада"""
+        # Каждое открытие календаря - запрос к WB в бюджете селлера
+        await self.governor.acquire("scan")
+
+        # Время снимка без ожидания токена: растет только от нагрузки на браузер
+        started_at = time.perf_counter()
+        calendar_slots = await self.take_calendar_snapshot(page, supply, attempt)
+        if calendar_slots is not None:
+            metrics.observe(
+                "megabot_calendar_snapshot_ms",
+                (time.perf_counter() - started_at) * 1000,
+                seller=self.user_id,
+                warehouse=CalendarMonitor.warehouse_key(supply),
+            )
+            self.record_calendar(supply, calendar_slots)
+        return calendar_slots
 
-                # Ждем появления календаря
-                calendar = await page.wait_for_selector(
-                    SYSTEM_CONFIG["selectors"]["calendar"]["cell"],
-                    timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
-                    state="visible",
-                )
+    async def refresh_calendar(self, page: Page, supply: dict) -> Optional[List[dict]]:
+        """Горячий резерв: повтор запроса календаря SPA на открытой модалке
 
-                if calendar:
-                    logger.info(f"Календарь открыт - {preorder_id}")
-                    # Даем время на полную загрузку календаря
-                    await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_ANIMATION"])
+        Модалка не закрывается и не открывается заново, обновляются только
+        данные слотов. Ячейки в DOM при этом старые - перед бронированием
+        календарь переоткрывается. None - повторить запрос не удалось.
+        """
+        feed = self.slot_feeds.get(page)
+        if feed is None or feed.request is None:
+            return None
+
+        await self.governor.acquire("scan")
+        started_at = time.perf_counter()
+        calendar_slots = await feed.replay()
+        if calendar_slots is not None:
+            metrics.observe(
+                "megabot_calendar_refresh_ms",
+                (time.perf_counter() - started_at) * 1000,
+                seller=self.user_id,
+                warehouse=CalendarMonitor.warehouse_key(supply),
+            )
+            self.record_calendar(supply, calendar_slots)
+        return calendar_slots
 
-                    return await self.get_target_dates(page, supply)
+    async def fetch_calendar(self, supply: dict) -> Optional[List[dict]]:
+        """Скан календаря без вкладки: запрос к API портала с cookies сессии
 
-                logger.error(
-                    f"Попытка {attempt + 1}: Календарь не появился после клика - {preorder_id}"
-                )
+        Записи слотов те же, что у скана во вкладке, но ячеек для клика
+        нет - под бронирование календарь открывается во вкладке
+        (SupplyRunner). None - запрос не удался.
+        """
+        labels = {
+            "seller": self.user_id,
+            "warehouse": CalendarMonitor.warehouse_key(supply),
+        }
+        if not self.calendar_client.cookies:
+            # Сессии в хранилище не было: cookies после входа в браузере
+            self.calendar_client.set_cookies(await self.context.cookies())
+
+        await self.governor.acquire("scan")
+        started_at = time.perf_counter()
+        try:
+            calendar_slots = await self.calendar_client.fetch(supply)
+        except AuthLost as e:
+            # Браузер мог обновить токен сессии - берем cookies контекста.
+            # Потерю сессии целиком замечает проверка в monitor_user_id
+            logger.bind(sample="http_scan").warning(
+                f"{self.user_id} - Портал не принял cookies скана: {str(e)}"
+            )
+            self.calendar_client.set_cookies(await self.context.cookies())
+            metrics.inc("megabot_http_scan_total", result="auth_lost", **labels)
+            return None
 
-            except Exception as e:
+        if calendar_slots is None:
+            metrics.inc("megabot_http_scan_total", result="error", **labels)
+            return None
+
+        metrics.observe(
+            "megabot_calendar_http_ms", (time.perf_counter() - started_at) * 1000, **labels
+        )
+        metrics.inc("megabot_http_scan_total", result="ok", **labels)
+        self.record_calendar(supply, calendar_slots)
+        return calendar_slots
+
+    def record_calendar(self, supply: dict, calendar_slots: List[dict]) -> None:
+        """Первый скан после старта и запись снимка в историю слотов склада"""
+        if self.first_scan_ms is None:
+            self.first_scan_ms = (time.perf_counter() - self.started_at) * 1000
+            logger.info(
+                f"{self.user_id} - Первый скан календаря через {self.first_scan_ms:.0f} ms "
+                f"({'теплый' if self.warm_start else 'холодный'} старт)"
+            )
+        if self.history is not None:
+            warehouse = CalendarMonitor.warehouse_key(supply)
+            changes = self.history.record(warehouse, calendar_slots)
+            if self.scheduler is not None:
+                self.scheduler.observe(warehouse, changes)
+
+    def poll_delay(self, supply: dict) -> float:
+        """Пауза до следующего скана календаря склада поставки"""
+        if self.scheduler is None:
+            return SYSTEM_CONFIG["timeouts"]["CHECK_DATE_INTERVAL"]
+        warehouse = CalendarMonitor.warehouse_key(supply)
+        return self.scheduler.interval(warehouse, self.scan_loads() or [warehouse])
+
+    def scan_loads(self) -> List[str]:
+        """Склады, которые селлер сканирует сам: каждый цикл - токен его governor
+
+        С Monitor Bot - склады, где бот владелец скана (кроме сканируемых
+        другим воркером), без него - склад каждой работающей поставки.
+        """
+        if self.monitor:
+            return [
+                key
+                for key, warehouse in self.monitor.warehouses.items()
+                if warehouse["bot"] is self and warehouse["task"] is not None
+            ]
+        return [
+            CalendarMonitor.warehouse_key(runner.supply)
+            for runner in self.runners.values()
+            if not runner.finished
+        ]
+
+    async def take_calendar_snapshot(
+        self, page: Page, supply: dict, attempt: int = 0
+    ) -> Optional[List[dict]]:
+        """Открытие календаря и снимок слотов, None - календарь не открылся
+
+        Если на вкладке есть SlotFeed, слоты берутся из ответа сети сразу
+        после клика, без ожидания отрисовки ячеек и WAIT_ANIMATION.
+        При отсутствии ответа - запасной путь через DOM.
+        """
+        preorder_id = supply["preorder_id"]
+        feed = self.slot_feeds.get(page)
+
+        if feed is None:
+            if not await self.open_calendar_modal(page, supply, attempt):
+                return None
+            return await self.read_calendar(page)
+
+        feed.arm()
+        if not await self.open_calendar_modal(
+            page, supply, attempt, wait_render=False
+        ):
+            return None
+
+        calendar_slots = await feed.wait_slots()
+        if calendar_slots is not None:
+            return calendar_slots
+
+        logger.warning(f"{preorder_id} - Нет ответа календаря из сети, читаем DOM")
+        if not await self.wait_calendar_render(page, supply, attempt):
+            return None
+        return await self.read_calendar(page)
+
+    async def open_calendar_modal(
+        self, page: Page, supply: dict, attempt: int = 0, wait_render: bool = True
+    ) -> bool:
+        """Одна попытка открыть модалку календаря"""
+        preorder_id = supply["preorder_id"]
+
+        try:
+            # Ждем кнопку планирования
+            plan_button = await page.wait_for_selector(
+                SYSTEM_CONFIG["selectors"]["supply"]["plan_button"],
+                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
+                state="visible",
+            )
+
+            if not plan_button:
                 logger.error(
-                    f"Попытка {attempt + 1}: Ошибка открытия календаря - {preorder_id}: {str(e)}"
+                    f"Попытка {attempt + 1}: Кнопка планирования не найдена - {preorder_id}"
                 )
+                return False
 
-            attempt += 1
-            await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_ANIMATION"])
+            # Кликаем по кнопке
+            await plan_button.click()
+            logger.bind(sample="calendar").info(f"Кликнули по кнопке планирования - {preorder_id}")
 
-        logger.error(
-            f"Не удалось открыть календарь после {max_attempts} попыток - {preorder_id}"
-        )
-        await page.close()
-        return await self.open_supply_by_id(
-            supply=supply, page=await self.context.new_page()
-        )
+        except Exception as e:
+            logger.error(
+                f"Попытка {attempt + 1}: Ошибка открытия календаря - {preorder_id}: {str(e)}"
+            )
+            return False
 
-    async def get_target_dates(self, page: Page, supply: dict) -> bool:
+        if not wait_render:
+            return True
+        return await self.wait_calendar_render(page, supply, attempt)
+
+    async def wait_calendar_render(
+        self, page: Page, supply: dict, attempt: int = 0
+    ) -> bool:
+        """Ожидание отрисовки ячеек календаря"""
         preorder_id = supply["preorder_id"]
-        booking_settings = supply["booking_settings"]
 
         try:
-            logger.info(f"Получаем целевые даты для поставки {preorder_id}")
+            # Ждем появления календаря
+            calendar = await page.wait_for_selector(
+                SYSTEM_CONFIG["selectors"]["calendar"]["cell"],
+                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
+                state="visible",
+            )
 
-            # Сначала всегда получаем все даты из календаря в правильном порядке
-            calendar_dates = []
-            date_cells = await page.query_selector_all(
-                SYSTEM_CONFIG["selectors"]["calendar"]["date_container"]
+            if calendar:
+                logger.bind(sample="calendar").info(f"Календарь открыт - {preorder_id}")
+                # Даем время на полную загрузку календаря
+                await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_ANIMATION"])
+                return True
+
+            logger.error(
+                f"Попытка {attempt + 1}: Календарь не появился после клика - {preorder_id}"
             )
 
-            for cell in date_cells:
-                date_element = await cell.query_selector(
-                    SYSTEM_CONFIG["selectors"]["calendar"]["date_text"]
-                )
-                if date_element:
-                    date_text = await date_element.inner_text()
-                    # Убираем день недели из даты календаря
-                    clean_date = date_text.split(",")[0]
-                    calendar_dates.append(clean_date)
+        except Exception as e:
+            logger.error(
+                f"Попытка {attempt + 1}: Ошибка открытия календаря - {preorder_id}: {str(e)}"
+            )
+
+        return False
+
+    async def read_calendar(self, page: Page) -> List[dict]:
+        """Снимок открытого календаря: дата, коэффициент, недоступность"""
+        return await read_calendar(page)
 
-            logger.info(f"Даты из календаря WB: {calendar_dates}")
+    async def wait_monitor_slot(self, supply: dict) -> List[dict]:
+        """Ожидание подходящего слота из снимков Monitor Bot
+
+        Вкладка поставки не сканирует календарь сама: календарь открывается
+        только когда в снимке склада появился подходящий слот.
+        """
+        preorder_id = supply["preorder_id"]
+        self.monitor.register(self, supply)
+        logger.info(f"{preorder_id} - Ожидаем слот от Monitor Bot")
+
+        matched = await self.monitor.wait_for_slot(supply)
+        best_slot = matched[0]
+        logger.info(
+            f"{preorder_id} - Monitor Bot нашел слот: дата ({best_slot['date']}), коэффициент = {best_slot['coeff']}"
+        )
+        return matched
+
+    async def get_target_dates(
+        self, page: Page, supply: dict, calendar_slots: List[dict]
+    ) -> List[dict]:
+        preorder_id = supply["preorder_id"]
+        booking_settings = supply["booking_settings"]
+        # Сообщения повторяются каждый цикл скана - пишутся с ограничением частоты
+        scan_log = logger.bind(sample="target_dates")
+
+        try:
+            scan_log.info(f"Получаем целевые даты для поставки {preorder_id}")
+
+            # Слоты календаря в порядке дат WB (из ответа сети или из DOM)
+            calendar_dates = [slot["date"] for slot in calendar_slots]
+            scan_log.info(f"Даты из календаря WB: {calendar_dates}")
 
             if booking_settings["mode"] == BOOKING_MODES["SPECIFIC_DATES"]:
                 # Фильтруем даты календаря, оставляя только те, что указаны в настройках
-                target_dates = [
-                    date
-                    for date in calendar_dates
-                    if date in booking_settings["target_dates"]
+                target_slots = [
+                    slot
+                    for slot in calendar_slots
+                    if slot["date"] in booking_settings["target_dates"]
                 ]
-                logger.info(f"Отфильтрованные даты для {preorder_id}: {target_dates}")
+                scan_log.info(
+                    f"Отфильтрованные даты для {preorder_id}: {[slot['date'] for slot in target_slots]}"
+                )
             else:  # ANY_DATE
                 # Используем все даты из календаря
-                target_dates = calendar_dates
-                logger.info(
-                    f"Используем все даты из календаря для {preorder_id}: {target_dates}"
+                target_slots = calendar_slots
+                scan_log.info(
+                    f"Используем все даты из календаря для {preorder_id}: {calendar_dates}"
                 )
 
-            if not target_dates:
-                logger.error(f"Не найдены даты для обработки - {preorder_id}")
-                return False
+            if not target_slots:
+                scan_log.error(f"Не найдены даты для обработки - {preorder_id}")
 
-            # Передаем даты в process_target_dates
-            return await self.process_target_dates(page, target_dates, supply)
+            return target_slots
 
         except Exception as e:
             logger.error(
                 f"Ошибка при получении целевых дат для {preorder_id}: {str(e)}"
             )
-            return False
+            return []
 
     async def process_target_dates(
-        self, page: Page, target_dates: List[str], supply: dict
-    ) -> bool:
+        self, page: Page, target_slots: List[dict], supply: dict
+    ) -> Optional[dict]:
+        """Выбор лучшего слота для бронирования, None - подходящих нет"""
         preorder_id = supply["preorder_id"]
         booking_settings = supply["booking_settings"]
         target_coeff = booking_settings["target_coeff"]
+        # Строки по каждой дате повторяются каждый цикл скана
+        scan_log = logger.bind(sample="scan_dates")
 
-        logger.info(
+        scan_log.info(
             f"{preorder_id} - Режим: {booking_settings['mode']}, Приоритет: {booking_settings['priority']}"
         )
 
         try:
-            logger.info(f"Обрабатываем даты для {preorder_id}")
+            scan_log.info(f"Обрабатываем даты для {preorder_id}")
             suitable_blocks = []
 
             # Проходим по датам в том порядке, как они идут в календаре
-            for target_date in target_dates:
-                logger.info(f"{preorder_id} - Найдена активная дата: {target_date}")
-
-                # Находим ячейку с датой
-                date_cell = await page.query_selector(
-                    f'{SYSTEM_CONFIG["selectors"]["calendar"]["cell"]}:has(span:text("{target_date}"))'
-                )
-
-                if not date_cell:
-                    logger.warning(
-                        f"{preorder_id} - Ячейка для даты {target_date} не найдена"
-                    )
-                    continue
+            for slot in target_slots:
+                target_date = slot["date"]
+                scan_log.info(f"{preorder_id} - Найдена активная дата: {target_date}")
 
                 # Сначала проверяем доступность даты
-                is_disabled = await date_cell.get_attribute("class")
-                if (
-                    is_disabled
-                    and SYSTEM_CONFIG["selectors"]["calendar"]["date_is_disabled"]
-                    in is_disabled
-                ):
-                    logger.warning(
+                if slot["disabled"]:
+                    scan_log.warning(
                         f"{preorder_id} - Дата {target_date} недоступна для бронирования"
                     )
                     continue
 
                 # Потом проверяем коэффициент
-                coeff_element = await date_cell.query_selector(
-                    SYSTEM_CONFIG["selectors"]["calendar"]["coeff"]["coeff_value"]
-                )
-
-                if not coeff_element:
-                    logger.warning(
+                coeff = slot["coeff"]
+                if coeff is None:
+                    scan_log.warning(
                         f"{preorder_id} - Коэффициент для даты {target_date} не найден"
                     )
                     continue
 
-                coeff_text = await coeff_element.inner_text()
-
-                # Проверяем коэффициент
-                if target_coeff == COEFF_VALUES["COEFF_FREE"]:
-                    # Для COEFF_FREE ищем "Бесплатно"
-                    if coeff_text.strip() != "Бесплатно":
-                        logger.warning(
-                            f"{preorder_id} - Дата ({target_date}) доступна, но коэффициент не бесплатный"
-                        )
-                        continue
-                    coeff = "Бесплатно"
-                else:
-                    # Для обычных коэффициентов
-                    coeff = int(coeff_text.replace("×", "").strip())
-                    if coeff > int(target_coeff):
-                        logger.warning(
-                            f"{preorder_id} - Дата ({target_date}) доступна, но коэффициент ({coeff}) больше требуемого ({target_coeff})"
-                        )
-                        continue
-
-                logger.info(
+                if not coeff_fits(coeff, target_coeff):
+                    scan_log.warning(
+                        f"{preorder_id} - Дата ({target_date}) доступна, но коэффициент ({coeff}) не подходит ({target_coeff})"
+                    )
+                    continue
+
+                scan_log.info(
                     f"{preorder_id} - Найден подходящий слот: дата {target_date}, коэффициент {coeff}"
                 )
                 suitable_blocks.append(
-                    {"date": target_date, "cell": date_cell, "coeff": coeff}
+                    {"date": target_date, "index": slot["index"], "coeff": coeff}
                 )
 
             if not suitable_blocks:
-                logger.error(f"{preorder_id} - Не найдено подходящих дат")
-                return await self.close_calendar(page, supply)
+                scan_log.error(f"{preorder_id} - Не найдено подходящих дат")
+                return None
 
-            logger.info(f"Все подходящие даты для {preorder_id}:")
+            scan_log.info(f"Все подходящие даты для {preorder_id}:")
             for block in suitable_blocks:
-                logger.info(
+                scan_log.info(
                     f"{preorder_id} - Дата: {block['date']}, Коэффициент: {block['coeff']}"
                 )
 
             # Сортировка только если нужен приоритет по коэффициенту
             if booking_settings["priority"] == BOOKING_PRIORITIES["BY_LOWER_COEFF"]:
-                logger.info("Сортируем по коэффициенту")
+                scan_log.info("Сортируем по коэффициенту")
                 sorted_blocks = sorted(suitable_blocks, key=lambda x: x["coeff"])
             else:
-                logger.info("Используем порядок дат из календаря WB")
+                scan_log.info("Используем порядок дат из календаря WB")
                 sorted_blocks = suitable_blocks  # Оставляем порядок как есть
 
-            logger.info(f"Отсортированные даты для {preorder_id}:")
+            scan_log.info(f"Отсортированные даты для {preorder_id}:")
             for block in sorted_blocks:
-                logger.info(
+                scan_log.info(
                     f"{preorder_id} - Дата: {block['date']}, Коэффициент: {block['coeff']}"
                 )
 
@@ -701,23 +1061,17 @@ class MEGABOT:
                 f"{preorder_id} - Выбран лучший вариант: дата ({best_block['date']}), коэффициент = {best_block['coeff']}"
             )
 
-            logger.info(
-                f"{preorder_id} - Запускаем бронирование: дата ({best_block['date']}), коэффициент = {best_block['coeff']}"
-            )
-
-            # Запускаем бронирование
-            # return await self.select_date(
-            #     page, best_block["cell"], best_block["date"], supply
-            # )
+            return best_block
 
         except Exception as e:
             logger.error(f"Ошибка при обработке дат для {preorder_id}: {str(e)}")
-            return False
+            return None
 
     async def close_calendar(self, page: Page, supply: dict) -> bool:
         preorder_id = supply["preorder_id"]
-        logger.info(f"{preorder_id} - Закрываем календарь")
+        logger.bind(sample="calendar").info(f"{preorder_id} - Закрываем календарь")
         await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_DEBUG"])
+
         try:
             # Ждем кнопку закрытия
             close_button = await page.wait_for_selector(
@@ -732,188 +1086,392 @@ class MEGABOT:
 
             # Кликаем по кнопке
             await close_button.click()
-            logger.info(f"{preorder_id} - Календарь закрыт")
-
-            # Запускаем повторное открытие календаря через интервал
-            await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["CHECK_DATE_INTERVAL"])
-            asyncio.create_task(self.open_calendar(page, supply))
+            logger.bind(sample="calendar").info(f"{preorder_id} - Календарь закрыт")
             return True
 
         except Exception as e:
             logger.error(f"Ошибка при закрытии календаря {preorder_id}: {str(e)}")
             return False
 
-    async def select_date(self, page: Page, target_date_block, supply: dict) -> bool:
+    async def book_slot(
+        self,
+        page: Page,
+        supply: dict,
+        best_block: dict,
+        detected_at: Optional[float] = None,
+    ) -> bool:
+        """Быстрое бронирование найденного слота на уже открытом календаре
+
+        Выбор даты, "Запланировать" и ожидание номера поставки идут одной
+        последовательностью с короткими таймаутами. Каждый шаг отмечается
+        в StepTimer, итоговая задержка от обнаружения слота логируется.
+        """
         preorder_id = supply["preorder_id"]
-        booking_settings = supply["booking_settings"]
-        target_date = (
-            booking_settings["target_dates"][0]
-            if booking_settings["target_dates"]
-            else "ближайшая"
+        timer = StepTimer("detected", started_at=detected_at)
+
+        # Токен на бронирование берем заранее, до кликов
+        await self.governor.acquire("book")
+        timer.mark("token")
+
+        booked = False
+        if await self.select_date(page, best_block, supply):
+            timer.mark("selected")
+            # Ограждение прямо перед кликом "Запланировать": аренда должна
+            # быть у узла и прожить до конца клика
+            if self.lease and not await self.lease.valid(
+                SYSTEM_CONFIG["leases"]["fence_margin"]
+            ):
+                logger.error(f"{preorder_id} - Аренда селлера потеряна, бронь отменена")
+            elif await self.book_date(page, supply):
+                timer.mark("book_clicked")
+                booked = await self.validate_book_date(page, supply, timer)
+
+        supply["status"]["booking_timings"] = timer.steps()
+        self.observe_booking(supply, timer, booked)
+        if booked:
+            logger.info(f"{preorder_id} - Время бронирования: {timer.summary()}")
+        else:
+            logger.error(
+                f"{preorder_id} - Бронирование прервано после шага {timer.last_step}: {timer.summary()}"
+            )
+        return booked
+
+    def observe_booking(self, supply: dict, timer: StepTimer, booked: bool) -> None:
+        """Шаги бронирования и задержка обнаружение -> номер поставки в метрики"""
+        labels = {
+            "seller": self.user_id,
+            "warehouse": CalendarMonitor.warehouse_key(supply),
+        }
+        for step, ms in timer.durations().items():
+            metrics.observe("megabot_stage_ms", ms, stage=BOOKING_STAGES[step], **labels)
+        metrics.inc(
+            "megabot_booking_total",
+            result="booked" if booked else f"failed_after_{timer.last_step}",
+            **labels,
         )
+        detection_ms = timer.elapsed_ms("booked")
+        if detection_ms is not None:
+            metrics.observe("megabot_detection_to_booking_ms", detection_ms, **labels)
 
-        logger.info(f"Выбираем дату ({target_date}) для поставки {preorder_id}")
-        await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_DEBUG"])
+    async def select_date(self, page: Page, slot: dict, supply: dict) -> bool:
+        """Клик по кнопке "Выбрать" в ячейке слота без отдельного hover
 
-        try:
-            # Наводим курсор на ячейку
-            await target_date_block.hover()
-            logger.info(f"{preorder_id}: Курсор наведен на ячейку")
+        Ячейка берется по index из снимка календаря, дата в ней сверяется
+        со слотом. Если календарь перерисовался или index пришел из ленты
+        API, ячейка ищется по тексту даты.
+        """
+        preorder_id = supply["preorder_id"]
+        date = slot["date"]
+        step_timeout = SYSTEM_CONFIG["timeouts"]["WAIT_BOOK_STEP"] * 1000
+        selectors = SYSTEM_CONFIG["selectors"]["calendar"]
 
-            # Ждем появления кнопки после hover эффекта
-            select_button = await target_date_block.wait_for_selector(
-                SYSTEM_CONFIG["selectors"]["calendar"]["select_button"],
-                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
-                state="visible",
+        logger.info(f"Выбираем дату ({date}) для поставки {preorder_id}")
+
+        cell = page.locator(selectors["cell"]).nth(slot["index"])
+        try:
+            cell_date = await cell.locator(
+                f'{selectors["date_container"]} {selectors["date_text"]}'
+            ).first.inner_text(timeout=step_timeout)
+        except Exception:
+            cell_date = None
+
+        if cell_date is None or clean_date(cell_date) != date:
+            logger.warning(
+                f"{preorder_id} - В ячейке {slot['index']} дата {cell_date}, а не {date}: ищем ячейку по дате"
             )
+            cell = page.locator(
+                f'{selectors["cell"]}:has(span:text("{date}"))'
+            ).first
+        select_button = cell.locator(selectors["select_button"]).first
 
-            if not select_button:
-                logger.error(f"{preorder_id}: Кнопка выбора даты не появилась")
+        try:
+            # Кнопка уже есть в DOM ячейки - кликаем событием, без наведения
+            await select_button.dispatch_event("click", timeout=step_timeout)
+        except Exception:
+            try:
+                # Кнопка рендерится только по hover: click сам наводит курсор
+                await cell.hover(timeout=step_timeout)
+                await select_button.click(timeout=step_timeout)
+            except Exception as e:
+                logger.error(f"{preorder_id}: Ошибка при выборе даты {date}: {str(e)}")
                 return False
 
-            # Кликаем по кнопке
-            await select_button.click()
-            logger.info(f"Дата {target_date} выбрана для поставки {preorder_id}")
-
-            # Вызываем бронирование
-            asyncio.create_task(self.book_date(page, supply))
-            return True
-
-        except Exception as e:
-            logger.error(f"{preorder_id}: Ошибка при выборе даты: {str(e)}")
-            return False
+        logger.info(f"Дата {date} выбрана для поставки {preorder_id}")
+        return True
 
     async def book_date(self, page: Page, supply: dict) -> bool:
         preorder_id = supply["preorder_id"]
 
-        logger.info(f"Бронируем дату для поставки {preorder_id}...")
-        await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_DEBUG"])
-
         try:
-            # Ждем появления кнопки "Запланировать"
-            book_button = await page.wait_for_selector(
-                SYSTEM_CONFIG["selectors"]["calendar"]["book_button"],
-                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
-                state="visible",
-            )
-
-            if not book_button:
-                logger.error(f"{preorder_id}: Кнопка 'Запланировать' не найдена")
-                return False
-
-            # Кликаем по кнопке
-            await book_button.click()
+            # Кнопка "Запланировать": click ждет видимости не дольше WAIT_BOOK_STEP
+            await page.locator(
+                SYSTEM_CONFIG["selectors"]["calendar"]["book_button"]
+            ).first.click(timeout=SYSTEM_CONFIG["timeouts"]["WAIT_BOOK_STEP"] * 1000)
             logger.info(f"Запрос на бронирование отправлен для поставки {preorder_id}")
-
-            # Проверяем результат бронирования
-            asyncio.create_task(self.validate_book_date(page, supply))
             return True
 
         except Exception as e:
             logger.error(f"{preorder_id}: Ошибка при бронировании даты: {str(e)}")
             return False
 
-    async def validate_book_date(self, page: Page, supply: dict) -> bool:
+    async def validate_book_date(
+        self, page: Page, supply: dict, timer: Optional[StepTimer] = None
+    ) -> bool:
         preorder_id = supply["preorder_id"]
         logger.info(f"Проверяем результат бронирования для поставки {preorder_id}...")
-        await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_DEBUG"])
 
         try:
-            # Ждем изменения URL
-            start_time = time.time()
-            while (
-                time.time() - start_time < SYSTEM_CONFIG["timeouts"]["WAIT_BOOK_DATE"]
+            # Ждем перехода на страницу поставки по событию навигации
+            await page.wait_for_url(
+                lambda url: "supplyId=" in url,
+                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_BOOK_DATE"] * 1000,
+                wait_until="commit",
+            )
+        except Exception:
+            logger.error(
+                f"Поставка {preorder_id}: URL не изменился за {SYSTEM_CONFIG['timeouts']['WAIT_BOOK_DATE']} секунд"
+            )
+            return False
+
+        supply_id = page.url.split("supplyId=")[-1].split("&")[0]
+        logger.info(f"Поставка {preorder_id} получила номер {supply_id}")
+
+        # Обновляем статус поставки: номер уже выдан, слот наш
+        supply["status"]["supply_id"] = supply_id
+        supply["status"]["booked"] = True
+        if timer:
+            timer.mark("booked")
+
+        try:
+            # Проверяем заголовок и статус поставки
+            for selector in (
+                SYSTEM_CONFIG["selectors"]["booking"]["supply_title"],
+                SYSTEM_CONFIG["selectors"]["booking"]["status_badge"],
             ):
-                current_url = page.url
-                if "supplyId" in current_url:
-                    supply_id = current_url.split("supplyId=")[-1]
-                    logger.info(f"Поставка {preorder_id} получила номер {supply_id}")
-
-                    # Обновляем статус поставки
-                    supply["status"]["supply_id"] = supply_id
-                    supply["status"]["booked"] = True
-                    break
-                await asyncio.sleep(1)
-            else:
-                logger.error(
-                    f"Поставка {preorder_id}: URL не изменился за {SYSTEM_CONFIG['timeouts']['WAIT_BOOK_DATE']} секунд"
+                await page.locator(selector).first.wait_for(
+                    state="visible",
+                    timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
                 )
-                return False
+            if timer:
+                timer.mark("confirmed")
 
-            # Проверяем заголовок поставки
-            supply_title = await page.wait_for_selector(
-                SYSTEM_CONFIG["selectors"]["booking"]["supply_title"],
-                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
-                state="visible",
+        except Exception as e:
+            # Номер поставки уже получен - бронирование состоялось
+            logger.warning(
+                f"Поставка {preorder_id}: страница поставки не подтвердила статус: {str(e)}"
             )
 
-            if not supply_title:
-                logger.error(
-                    f"Поставка {preorder_id}: Не найден заголовок с номером поставки"
-                )
-                return False
+        logger.info(
+            f"Поставка {preorder_id} успешно забронирована и получила номер {supply_id}"
+        )
 
-            # Проверяем статус
-            status_badge = await page.wait_for_selector(
-                SYSTEM_CONFIG["selectors"]["booking"]["status_badge"],
-                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SELECTOR"] * 1000,
-                state="visible",
-            )
+        # Отправляем уведомление об успешном бронировании
+        await self.notification_sender(
+            f"Поставка {preorder_id} успешно забронирована\nНомер поставки: {supply_id}"
+        )
+        return True
 
-            if not status_badge:
-                logger.error(
-                    f"Поставка {preorder_id}: Не найден статус 'Запланировано'"
-                )
-                return False
 
-            logger.info(
-                f"Поставка {preorder_id} успешно забронирована и получила номер {supply_id}"
-            )
+class BotFleet:
+    """Боты всех селлеров процесса и общие для них сервисы
+
+    owns(user_id) - селлеры этого процесса: все (один процесс) или
+    шард воркера супервизора. Смена owns применяется через rebalance().
+    Воркер передает свой monitor (сканы складов делятся между воркерами)
+    и seed_store=False: тестовые поставки в базу переносит супервизор.
+    С арендами (leases.enabled) процесс ведет только арендованных
+    селлеров, остальные достаются другим узлам.
+    """
+
+    def __init__(
+        self,
+        owns: Optional[Callable[[str], bool]] = None,
+        history_dir: Optional[Path] = None,
+        node_id: Optional[str] = None,
+        monitor: Optional[CalendarMonitor] = None,
+        seed_store: bool = True,
+    ):
+        self.owns = owns or (lambda user_id: True)
+        self.bots: Dict[str, MEGABOT] = {}  # Активные боты по селлерам
+        # Один Monitor Bot на все поставки: скан календаря раз на склад
+        self.monitor = monitor or (
+            CalendarMonitor() if SYSTEM_CONFIG["monitor"]["enabled"] else None
+        )
+        self.seed_store = seed_store
+        # Общие процессы Chromium: изолированный контекст на каждого селлера
+        self.pool = BrowserPool() if SYSTEM_CONFIG["browser_pool"]["enabled"] else None
+        # История слотов всех складов: пишется при каждом скане календаря
+        self.history = (
+            SlotHistory(history_dir) if SYSTEM_CONFIG["slot_history"]["enabled"] else None
+        )
+        # Планировщик учится на истории слотов, без нее интервал ровный
+        self.scheduler = (
+            PollScheduler()
+            if self.history and SYSTEM_CONFIG["scheduler"]["enabled"]
+            else None
+        )
+        if self.scheduler:
+            self.scheduler.learn(self.history)
+        self.store: Optional[SupplyStore] = None
+        self.sync_task = None
+        self.leases = (
+            LeaseManager(create_lease_store(), node_id)
+            if SYSTEM_CONFIG["leases"]["enabled"]
+            else None
+        )
+        self.lease_task = None
+
+    async def start(self) -> None:
+        # Поставки и их статус: память, SQLite или MongoDB сайта
+        self.store = await create_store(seed=self.seed_store)
+        if self.history:
+            self.history.start()  # запись сегментов на диск - фоновой задачей
+        if self.pool:
+            await self.pool.start()
+        if SYSTEM_CONFIG["metrics"]["enabled"]:
+            await metrics.start()
+        await notifications.start()
+
+        # Активные поставки загружаются один раз, дальше - только изменения
+        users, cursor, boundary = await self.store.load_active()
+        if self.leases:
+            self.leases.offer(users, replace=True)
+            await self.leases.tick()
+            self.lease_task = asyncio.create_task(self.leases.run(self.rebalance))
+        await self.start_bots(users)
+        self.sync_task = asyncio.create_task(
+            SupplySync(self.store, cursor, boundary).run(self.apply_change)
+        )
 
-            # Отправляем уведомление об успешном бронировании
-            asyncio.create_task(
-                self.notification_sender(
-                    f"Поставка {preorder_id} успешно забронирована\nНомер поставки: {supply_id}"
-                )
-            )
-            return True
+    def serves(self, user_id: str) -> bool:
+        """Селлер ведется этим процессом: свой шард и, с арендами, своя аренда"""
+        return self.owns(user_id) and (self.leases is None or self.leases.holds(user_id))
+
+    async def start_bots(self, users: Dict[str, List[dict]]) -> None:
+        """Отдельный бот для каждого своего селлера, который еще не запущен"""
+        users = {
+            user_id: supplies
+            for user_id, supplies in users.items()
+            if self.serves(user_id) and user_id not in self.bots
+        }
+        logger.info(
+            f"Загружено активных поставок: {sum(len(supplies) for supplies in users.values())}"
+        )
+        await asyncio.gather(
+            *(self.start_bot(user_id, supplies) for user_id, supplies in users.items())
+        )
 
-        except Exception as e:
-            logger.error(
-                f"Ошибка при проверке бронирования поставки {preorder_id}: {str(e)}"
-            )
-            return False
+    async def start_bot(self, user_id: str, supplies: List[dict]) -> None:
+        logger.info(f"Инициализация бота для пользователя {user_id}")
+
+        bot = MEGABOT(
+            user_id,
+            monitor=self.monitor,
+            store=self.store,
+            history=self.history,
+            scheduler=self.scheduler,
+            lease=self.leases.lease(user_id) if self.leases else None,
+        )
+        if await bot.init_browser(self.pool):  # Контекст в пуле или свой браузер
+            self.bots[user_id] = bot
+            await bot.create_supply(user_id, supplies)
+        else:
+            logger.error(f"❌ Ошибка инициализации браузера для {user_id}")
+
+    async def apply_change(self, change: dict) -> None:
+        user_id = change["user_id"]
+        supply = change["supply"]
+        if self.leases and supply["status"]["active"]:
+            # Селлера возьмет узел с арендой, возможно этот - на следующем продлении
+            self.leases.offer([user_id])
+        if not self.serves(user_id):
+            return
+        if user_id in self.bots:
+            await self.bots[user_id].apply_supply(supply)
+        elif supply["status"]["active"]:
+            # Первая активная поставка нового селлера
+            await self.start_bot(user_id, [supply])
+
+    async def rebalance(self) -> None:
+        """Применение нового owns или аренд: чужие селлеры закрываются, свои - запускаются"""
+        for user_id in [user_id for user_id in self.bots if not self.serves(user_id)]:
+            logger.info(f"{user_id} - Селлер передан другому воркеру или узлу")
+            await self.bots.pop(user_id).close()
+        users, _, _ = await self.store.load_active()
+        if self.leases:
+            self.leases.offer(users, replace=True)
+        await self.start_bots(users)
+
+    def health(self) -> dict:
+        """Состояние процесса для супервизора и логов"""
+        return {
+            "sellers": len(self.bots),
+            "runners": sum(
+                sum(bot.runner_stats().values()) for bot in self.bots.values()
+            ),
+            "pool": self.pool.stats() if self.pool else None,
+            "leases": self.leases.stats() if self.leases else None,
+            "notifications": notifications.stats(),
+        }
+
+    def log_stats(self) -> None:
+        if self.history:
+            logger.info(f"История слотов: {self.history.stats()}")
+        for bot in self.bots.values():
+            logger.info(f"{bot.user_id} - Задачи поставок: {bot.runner_stats()}")
+            logger.info(f"{bot.user_id} - Бюджет запросов: {bot.governor.stats()}")
+            logger.info(f"{bot.user_id} - Пул вкладок: {bot.pages.stats()}")
+            if self.scheduler:
+                for preorder_id, runner in bot.runners.items():
+                    report = self.scheduler.report(
+                        CalendarMonitor.warehouse_key(runner.supply), bot.scan_loads()
+                    )
+                    logger.info(f"{preorder_id} - Расписание сканов: {report}")
+
+    async def stop(self) -> None:
+        if self.sync_task:
+            self.sync_task.cancel()
+        if self.lease_task:
+            self.lease_task.cancel()
+        if self.monitor:
+            await self.monitor.stop()
+        # Закрываем все браузеры
+        for bot in self.bots.values():
+            await bot.close()
+        # Аренды отпускаются после закрытия ботов: селлер не работает на двух узлах
+        if self.leases:
+            await self.leases.stop()
+        if self.pool:
+            await self.pool.stop()
+        await http_pool.close()
+        if self.store:
+            await self.store.close()
+        # Последние уведомления (например, о брони) досылаются до остановки
+        await notifications.stop()
+        if SYSTEM_CONFIG["metrics"]["enabled"]:
+            await metrics.stop()
+        if self.history:
+            await self.history.close()
 
 
 async def main():
     logger.info("СТАРТ РАБОТЫ БОТА")
-    bots = []  # Список активных ботов
+    fleet = BotFleet()
 
     try:
-        # Создаем отдельного бота для каждого пользователя
-        for user_data in USER_SUPPLIES:
-            user_id = user_data["user_id"]
-            logger.info(f"Инициализация бота для пользователя {user_id}")
-
-            bot = MEGABOT(user_id)
-            if await bot.init_browser():  # Свой браузер для каждого бота
-                bots.append(bot)
-                # Запускаем обработку поставок в отдельной корутине
-                asyncio.create_task(bot.create_supply(user_id))
-            else:
-                logger.error(f"❌ Ошибка инициализации браузера для {user_id}")
+        await fleet.start()
 
         # Держим главный поток активным
         while True:
             await asyncio.sleep(60)
+            fleet.log_stats()
 
     except KeyboardInterrupt:
         logger.info("Получен сигнал остановки")
     finally:
-        # Закрываем все браузеры
-        for bot in bots:
-            await bot.close()
+        await fleet.stop()
         logger.info("ЗАВЕРШЕНИЕ РАБОТЫ БОТА")
+        await logger.complete()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from playwright.async_api import async_playwright, Browser, BrowserContext
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+
+
+class BrowserPool:
+    """Общий пул процессов Chromium для всех селлеров
+
+    Каждый селлер получает изолированный BrowserContext (свои cookies и
+    storage) внутри одного из небольшого числа процессов браузера.
+    Пул следит за здоровьем браузеров и контекстов и пересоздает упавшие.
+    """
+
+    def __init__(
+        self,
+        browsers_count: Optional[int] = None,
+        max_contexts_per_browser: Optional[int] = None,
+    ):
+        pool_config = SYSTEM_CONFIG["browser_pool"]
+        self.browsers_count = browsers_count or pool_config["browsers"]
+        self.max_contexts_per_browser = (
+            max_contexts_per_browser or pool_config["max_contexts_per_browser"]
+        )
+
+        self.playwright = None
+        self.browsers: List[Optional[Browser]] = []
+        # user_id -> {"context", "browser_index", "options", "on_recycle"}
+        self.contexts: Dict[str, dict] = {}
+        self.health_task = None
+        self.lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Один драйвер Playwright на весь пул, браузеры запускаются по требованию"""
+        self.playwright = await async_playwright().start()
+        self.browsers = [None] * self.browsers_count
+        self.health_task = asyncio.create_task(self.monitor_health())
+        logger.info(f"Пул браузеров запущен: до {self.browsers_count} процессов Chromium")
+
+    async def _launch_browser(self, index: int) -> Browser:
+        browser = await self.playwright.chromium.launch(**SYSTEM_CONFIG["browser"])
+        self.browsers[index] = browser
+        logger.info(f"Пул браузеров: запущен браузер #{index}")
+        return browser
+
+    def _browser_load(self, index: int) -> int:
+        return sum(1 for item in self.contexts.values() if item["browser_index"] == index)
+
+    def _pick_browser_index(self) -> int:
+        """Наименее загруженный браузер со свободными слотами"""
+        loads = [self._browser_load(index) for index in range(self.browsers_count)]
+        index = min(range(self.browsers_count), key=lambda i: loads[i])
+        if loads[index] >= self.max_contexts_per_browser:
+            raise RuntimeError(
+                f"Пул браузеров заполнен: {self.browsers_count} x {self.max_contexts_per_browser} контекстов"
+            )
+        return index
+
+    async def new_context(
+        self,
+        user_id: str,
+        on_recycle: Optional[Callable[[BrowserContext], Awaitable[None]]] = None,
+        **options,
+    ) -> BrowserContext:
+        """Изолированный контекст селлера
+
+        on_recycle вызывается с новым контекстом, если старый пришлось
+        пересоздать после падения.
+        """
+        async with self.lock:
+            if user_id in self.contexts:
+                return self.contexts[user_id]["context"]
+
+            index = self._pick_browser_index()
+            browser = self.browsers[index]
+            if browser is None or not browser.is_connected():
+                browser = await self._launch_browser(index)
+
+            context = await browser.new_context(**options)
+            self.contexts[user_id] = {
+                "context": context,
+                "browser_index": index,
+                "options": options,
+                "on_recycle": on_recycle,
+            }
+            logger.info(f"Пул браузеров: контекст {user_id} создан в браузере #{index}")
+            return context
+
+    async def release_context(self, user_id: str) -> None:
+        """Закрытие контекста селлера, процесс браузера остается в пуле"""
+        async with self.lock:
+            item = self.contexts.pop(user_id, None)
+        if item is None:
+            return
+
+        try:
+            await item["context"].close()
+        except Exception as e:
+            logger.error(f"Пул браузеров: ошибка закрытия контекста {user_id}: {str(e)}")
+        logger.info(f"Пул браузеров: контекст {user_id} закрыт")
+
+    async def recycle_context(self, user_id: str) -> None:
+        """Пересоздание упавшего контекста селлера"""
+        async with self.lock:
+            item = self.contexts.get(user_id)
+            if item is None:
+                return
+
+            try:
+                await item["context"].close()
+            except Exception:
+                pass  # Контекст уже мертв
+
+            browser = self.browsers[item["browser_index"]]
+            if browser is None or not browser.is_connected():
+                browser = await self._launch_browser(item["browser_index"])
+
+            item["context"] = await browser.new_context(**item["options"])
+
+        logger.warning(f"Пул браузеров: контекст {user_id} пересоздан")
+        if item["on_recycle"]:
+            await item["on_recycle"](item["context"])
+
+    async def check_context(self, context: BrowserContext) -> bool:
+        """Дешевая проверка, что контекст отвечает"""
+        try:
+            await asyncio.wait_for(
+                context.cookies(),
+                timeout=SYSTEM_CONFIG["timeouts"]["BROWSER_HEALTH_CHECK_TIMEOUT"],
+            )
+            return True
+        except Exception:
+            return False
+
+    async def monitor_health(self) -> None:
+        """Периодическая проверка браузеров и контекстов"""
+        while True:
+            await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["BROWSER_HEALTH_CHECK_INTERVAL"])
+            try:
+                for user_id, item in list(self.contexts.items()):
+                    browser = self.browsers[item["browser_index"]]
+                    if browser is None or not browser.is_connected():
+                        logger.error(
+                            f"Пул браузеров: браузер #{item['browser_index']} недоступен"
+                        )
+                        await self.recycle_context(user_id)
+                    elif not await self.check_context(item["context"]):
+                        logger.error(f"Пул браузеров: контекст {user_id} не отвечает")
+                        await self.recycle_context(user_id)
+            except Exception as e:
+                logger.error(f"Пул браузеров: ошибка проверки здоровья: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "browsers": sum(
+                1 for browser in self.browsers if browser and browser.is_connected()
+            ),
+            "contexts": len(self.contexts),
+            "per_browser": [
+                self._browser_load(index) for index in range(self.browsers_count)
+            ],
+        }
+
+    async def stop(self) -> None:
+        """Закрытие всех контекстов, браузеров и драйвера"""
+        if self.health_task:
+            self.health_task.cancel()
+
+        for user_id in list(self.contexts):
+            await self.release_context(user_id)
+
+        for browser in self.browsers:
+            if browser and browser.is_connected():
+                await browser.close()
+
+        if self.playwright:
+            await self.playwright.stop()
+        logger.info("Пул браузеров остановлен")
@@ -0,0 +1,52 @@
+from typing import List
+
+from playwright.async_api import Page
+
+from config import SYSTEM_CONFIG
+from slots import make_slot
+
+# Вся таблица календаря читается внутри страницы за один page.evaluate:
+# дата, класс недоступности и текст коэффициента по каждой ячейке
+READ_CALENDAR_JS = """
+({ cell, date, coeff, disabled }) =>
+    Array.from(document.querySelectorAll(cell)).map((td, index) => {
+        const dateElement = td.querySelector(date);
+        const coeffElement = td.querySelector(coeff);
+        return {
+            index,
+            date_text: dateElement ? dateElement.innerText : null,
+            coeff_text: coeffElement ? coeffElement.innerText : null,
+            disabled: (td.getAttribute("class") || "").includes(disabled),
+        };
+    })
+"""
+
+
+def calendar_selectors() -> dict:
+    """Селекторы календаря для передачи в page.evaluate"""
+    selectors = SYSTEM_CONFIG["selectors"]["calendar"]
+    return {
+        "cell": selectors["cell"],
+        "date": f'{selectors["date_container"]} {selectors["date_text"]}',
+        "coeff": selectors["coeff"]["coeff_value"],
+        "disabled": selectors["date_is_disabled"],
+    }
+
+
+def parse_calendar(cells: List[dict]) -> List[dict]:
+    """Сырые данные ячеек -> нормализованные записи слотов"""
+    return [
+        make_slot(cell["index"], cell["date_text"], cell["coeff_text"], cell["disabled"])
+        for cell in cells
+        if cell["date_text"]
+    ]
+
+
+async def read_calendar(page: Page) -> List[dict]:
+    """Снимок открытого календаря за один roundtrip к браузеру
+
+    index - порядковый номер ячейки среди SYSTEM_CONFIG["selectors"]["calendar"]["cell"],
+    по нему берется ячейка для бронирования.
+    """
+    cells = await page.evaluate(READ_CALENDAR_JS, calendar_selectors())
+    return parse_calendar(cells)
@@ -0,0 +1,53 @@
+import time
+from typing import List, Optional
+
+from playwright.async_api import Page
+from config import SYSTEM_CONFIG
+
+
+class CalendarStandby:
+    """Горячий резерв календаря на вкладке
+
+    После открытия модалки (opened) следующие снимки берутся повтором
+    запроса календаря SPA (refresh) - без закрытия, клика "Запланировать
+    поставку", ожидания ячеек и WAIT_ANIMATION. Раз в max_age секунд, а
+    также если повтор не удался, модалка закрывается и открывается заново.
+    """
+
+    def __init__(self, bot, page: Page, supply: dict):
+        self.bot = bot
+        self.page = page
+        self.supply = supply
+        self.opened_at: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return SYSTEM_CONFIG["standby"]["enabled"]
+
+    @property
+    def active(self) -> bool:
+        return self.opened_at is not None
+
+    def opened(self) -> None:
+        """Модалка открыта: дальше - обновление на месте"""
+        if self.enabled:
+            self.opened_at = time.time()
+
+    async def refresh(self) -> Optional[List[dict]]:
+        """Слоты без переоткрытия модалки, None - нужно открыть календарь заново"""
+        if self.opened_at is None:
+            return None
+        if time.time() - self.opened_at < SYSTEM_CONFIG["standby"]["max_age"]:
+            calendar_slots = await self.bot.refresh_calendar(self.page, self.supply)
+            if calendar_slots is not None:
+                return calendar_slots
+        await self.close()
+        return None
+
+    async def close(self) -> bool:
+        self.opened_at = None
+        return await self.bot.close_calendar(self.page, self.supply)
+
+    def reset(self) -> None:
+        """Вкладка закрыта вместе с модалкой"""
+        self.opened_at = None
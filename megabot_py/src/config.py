@@ -41,11 +41,11 @@ WB_SELECTORS = {
 
 POPUPS = {
     "other_modal": {
-        # "container": 'div[id="Portal-modal"]',
+        "container": 'div[id="Portal-modal"]',
         "close": 'div[id="Portal-modal"] button:has(span:text("Понятно"))',
     },
     "cookies": {
-        # "container": 'div[id="Portal-warning-cookies-modal"]',
+        "container": 'div[id="Portal-warning-cookies-modal"]',
         "close": 'div[id="Portal-warning-cookies-modal"] button:has(span:text("Принимаю"))',
     },
     # "help_center": {
@@ -53,7 +53,7 @@ POPUPS = {
     #     "close": '[class^="Help-center-absolute-button__"]',
     # },
     "quiz": {
-        # "container": "",
+        "container": "#Portal-quiz-modal",
         "close": '#Portal-quiz-modal button:has(span:text("Отменить"))',
     },
     # "tutorial_portal": {
@@ -61,7 +61,8 @@ POPUPS = {
     #     "close": '[data-testid="tutorial-skip-button"]',
     # },
     "tutorial_step": {
-        # "container": 'div[id^="react-joyride"]',
+        # Обертка подсказки, а не ее кнопка: кнопка лежит внутри
+        "container": 'div[class^="Tooltip-hint-view"]:has(> div[class^="Tooltip-hint-view__close-button"])',
         "close": 'div[class^="Tooltip-hint-view__close-button"][data-action="close"][aria-label="Close"]',
     },
     # "tutorial_overlay": {
@@ -70,6 +71,27 @@ POPUPS = {
     # },
 }
 
+# Перехват запросов вкладок: все, что не нужно для бронирования, отсекается
+NETWORK_FILTER = {
+    "enabled": True,
+    "block_resource_types": ["image", "media", "font"],
+    # Пропускаются всегда, даже если подходят под правила блокировки
+    "allow_url_patterns": [
+        "*seller.wildberries.ru/ns/*",
+        "*seller-supply.wildberries.ru/*",
+    ],
+    "block_url_patterns": [
+        "*google-analytics.com/*",
+        "*googletagmanager.com/*",
+        "*mc.yandex.ru/*",
+        "*top-fwz1.mail.ru/*",
+        "*sentry*",
+        "*help-center*",
+        "*quiz*",
+        "*tutorial*",
+    ],
+}
+
 # Системные настройки
 SYSTEM_CONFIG = {
     "timeouts": {
@@ -87,20 +109,196 @@ SYSTEM_CONFIG = {
         "WAIT_SELECTOR_AUTH": 30,  # секунды для ожидания селекторов
         "AUTH_TIMEOUT": 60,  # секунды на авторизацию
         "CHECK_POPUPS_INTERVAL": 5,  # секунды между попытками очистки попапов
+        "WAIT_POPUP_CLOSE": 2,  # секунды на клик по кнопке закрытия попапа
         "MAX_CLOSE_POPUP_ATTEMPTS": 25,  # максимум попыток очистки попапов
         "CHECK_DATE_INTERVAL": 5,  # секунды между проверками даты
         "WAIT_BOOK_DATE": 60,
+        "WAIT_BOOK_STEP": 3,  # секунды на клик "Выбрать"/"Запланировать" при бронировании
         "COOKIES_TTL": 3600,  # секунды для ожидания результата бронирования
         "CHECK_USER_ID_INTERVAL": 300,  # секунды между проверками ID поставщика
+        "BROWSER_HEALTH_CHECK_INTERVAL": 30,  # секунды между проверками пула браузеров
+        "BROWSER_HEALTH_CHECK_TIMEOUT": 5,  # секунды на ответ контекста
+        "NETWORK_STATS_INTERVAL": 60,  # секунды между логами трафика вкладок
+        "WAIT_SLOT_FEED": 10,  # секунды ожидания ответа календаря из сети
+        "SUPPLY_SYNC_INTERVAL": 10,  # секунды между проверками изменений поставок
     },
     "browser": {"headless": False, "args": ["--no-sandbox"]},
+    "browser_pool": {
+        "enabled": True,  # общие процессы Chromium вместо браузера на каждого селлера
+        "browsers": 2,  # процессов Chromium в пуле
+        "max_contexts_per_browser": 25,  # контекстов селлеров на один процесс
+    },
     "urls": {
         "seller": "https://seller.wildberries.ru/",
         "supply": "https://seller.wildberries.ru/supplies-management/all-supplies/supply-detail/uploaded-goods",
         "supplier_card": "https://seller.wildberries.ru/supplier-settings/supplier-card",
+        # API календаря, который SPA вызывает при открытии модалки (скан без браузера)
+        "calendar_api": "https://seller-supply.wildberries.ru/ns/sm-supply/supply-manager/api/v1/supply/getAcceptanceCosts",
     },
     "selectors": WB_SELECTORS,
     "popups": POPUPS,
+    "network": NETWORK_FILTER,
+    "slot_feed": {
+        "enabled": True,  # слоты из XHR-ответа календаря, DOM - запасной вариант
+        "url_patterns": [
+            "*getAcceptanceCosts*",
+            "*acceptance/coefficients*",
+        ],
+        # Поля ответа календаря
+        "fields": {
+            "items": "costs",
+            "date": "date",
+            "coeff": "coefficient",
+            "warehouse_name": "warehouseName",
+            "warehouse_id": "warehouseID",
+        },
+    },
+    "governor": {
+        "requests_per_minute": 5,  # лимит WB на аккаунт (раз в 12 секунд)
+        "burst": 2,  # емкость корзины, должна быть больше booking_reserve
+        "booking_reserve": 1,  # токены, которые сканы оставляют для бронирования
+        "ip": None,  # адрес выхода, если несколько селлеров работают через один IP
+        "ip_requests_per_minute": None,  # лимит на IP, None - без ограничения
+        "ip_burst": 2,
+    },
+    "slot_history": {
+        "enabled": True,
+        "window_days": 30,  # календарь WB на 30 дней вперед
+        "retention_days": 120,  # дней хранения истории изменений
+        "flush_rows": 500,  # текущий день пишется на диск каждые N изменений
+        "flush_interval": 60,  # ... или не реже раза в N секунд при изменениях
+        "dir": str(DATA_DIR / "slot_history"),
+    },
+    "scheduler": {
+        "enabled": True,  # интервал сканов по выученным окнам появления слотов
+        "bin_minutes": 5,  # корзина времени суток
+        "floor_share": 0.2,  # доля бюджета, равномерно размазанная по суткам
+        "half_life_days": 14,  # затухание старых наблюдений
+        "lifetime_samples": 200,  # последних времен жизни слота на склад
+        "min_releases": 20,  # до этого числа появлений интервал ровный
+        "min_interval": 2,  # секунды
+        "max_interval": 60,  # секунды
+    },
+    "session_vault": {
+        # Ключ Fernet для шифрования сессий; без него создается users_data/vault.key
+        "key_env": "MEGABOT_VAULT_KEY",
+    },
+    "session_probe": {
+        # Фоновый запрос к API портала с cookies сессии: ответ содержит ИНН поставщиков
+        "url": "https://seller.wildberries.ru/ns/suppliers/suppliers-portal-core/suppliers",
+        "payload": [
+            {"method": "getUserSuppliers", "params": {}, "id": "json-rpc_1", "jsonrpc": "2.0"}
+        ],
+        "inn_field": "inn",
+        "auth_cookies": ["WBTokenV3"],  # без этих cookies сессия считается потерянной
+        "min_interval": 30,  # секунды, повтор после ошибки сети
+        "max_interval": 1800,  # секунды, предел роста интервала
+        "backoff": 1.5,  # рост интервала после успешной проверки
+        "expiry_margin": 120,  # секунды до истечения auth-cookies
+        "max_errors": 3,  # ошибок подряд до проверки через карточку поставщика
+    },
+    "logging": {
+        "json": True,  # файловый лог в JSON Lines с полями seller/preorder/warehouse
+        "enqueue": True,  # запись в sink в фоновом потоке, не в цикле событий
+        "sample_limit": 5,  # повторяющихся сообщений скана на поставку за окно
+        "sample_window": 60,  # секунды
+        "console_level": "INFO",
+        "file_level": "DEBUG",
+    },
+    "metrics": {
+        "enabled": True,
+        "host": "127.0.0.1",  # эндпоинт только для локального скрапа
+        "port": 9108,  # /metrics (Prometheus) и /metrics.json, 0 - без эндпоинта
+        "snapshot_interval": 60,  # секунды, 0 - без снимков
+        "snapshot_path": "logs/metrics.jsonl",
+        # Границы корзин гистограмм задержек, мс
+        "buckets_ms": [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000],
+    },
+    "store": {
+        "backend": "memory",  # memory (USER_SUPPLIES) | sqlite | mongo (нужен pymongo)
+        "sqlite_path": str(DATA_DIR / "supplies.db"),
+        "mongo_uri": "mongodb://localhost:27017",
+        "mongo_db": "megabot",
+    },
+    "supervisor": {
+        "workers": None,  # процессов-воркеров, None - по числу ядер
+        "heartbeat_interval": 5,  # секунды между отчетами воркера
+        "heartbeat_timeout": 60,  # секунды без отчета - воркер завис, перезапуск
+        "restart_backoff": 1,  # секунды до первого перезапуска упавшего воркера
+        "restart_backoff_max": 60,  # предел роста паузы перезапуска
+        "stable_uptime": 300,  # секунды работы, после которых счетчик падений сбрасывается
+        "rebalance_timeout": 120,  # секунды ожидания передачи селлеров при масштабировании
+        "shared_scans": True,  # склад сканирует один воркер, снимки пересылаются остальным
+    },
+    "notifications": {
+        "sinks": ["log"],  # log | telegram | redis | memory (тесты)
+        "max_queue": 1000,  # уведомлений в очереди, сверх - отбрасываются
+        "chat_interval": 1.0,  # секунды между сообщениями в один чат (лимит Telegram)
+        "concurrency": 8,  # одновременных отправок в разные чаты
+        "coalesce_window": 600,  # секунды: повтор того же текста в чат - только счетчик
+        "max_attempts": 5,  # попыток доставки
+        "retry_backoff": 2,  # секунды до повтора, удваивается с каждой попыткой
+        "retry_backoff_max": 300,
+        "send_timeout": 15,  # секунды на отправку в один канал
+        "flush_timeout": 5,  # секунды дослать очередь при остановке
+        "chats": {},  # seller_id -> чат Telegram, иначе чат из telegram_chat_env
+        "telegram_token_env": "MEGABOT_TELEGRAM_TOKEN",
+        "telegram_chat_env": "MEGABOT_TELEGRAM_CHAT",
+        "redis_url": "redis://localhost:6379/0",  # канал для Monitor Bot (нужен redis)
+        "redis_channel": "megabot:notifications",
+    },
+    "leases": {
+        "enabled": False,  # аренда селлеров в общем хранилище: несколько серверов на одни поставки
+        "backend": "sqlite",  # memory (один процесс) | sqlite (общий файл) | mongo (store.mongo_uri)
+        "sqlite_path": str(DATA_DIR / "leases.db"),
+        "node_id": None,  # имя узла, None - hostname-pid
+        "ttl": 15,  # секунды жизни аренды без продления: время переезда селлера с упавшего узла
+        "renew_interval": 5,  # секунды между продлениями и захватом свободных селлеров
+        "node_ttl": 30,  # секунды без отметки - узел считается выбывшим
+        "capacity": 50,  # максимум селлеров на узел
+        "fence_margin": 2,  # секунды жизни аренды, нужные для клика брони или записи статуса
+    },
+    "standby": {
+        # Календарь остается открытым, слоты обновляются повтором запроса SPA
+        # (Monitor Bot и поставки без Monitor Bot); False - открытие и закрытие модалки на каждый скан
+        "enabled": True,
+        "max_age": 900,  # секунды: потом модалка переоткрывается заново
+    },
+    "http_scan": {
+        # Скан календаря HTTP-запросом с cookies сессии, без вкладки на поставку;
+        # вкладка из page_pool открывается только под бронирование. Нужен aiohttp
+        "enabled": False,
+        # Запрос SPA при открытии календаря; пойманный во вкладке (SlotFeed) заменяет этот шаблон
+        "payload": {"jsonrpc": "2.0", "id": "json-rpc_1", "method": "getAcceptanceCosts"},
+        "preorder_param": "preorderID",  # поле номера заказа в params запроса
+        "days": 30,  # диапазон дат запроса: с полуночи UTC сегодня на N дней вперед
+        "headers": {"Content-Type": "application/json", "Accept": "application/json"},
+        "connections": 100,  # соединений в общем пуле процесса
+        "connections_per_host": 20,
+        "keepalive": 30,  # секунды жизни простаивающего соединения
+        "timeout": 10,  # секунды на запрос
+    },
+    "page_pool": {
+        "enabled": True,  # прогретые вкладки для поставок вместо холодной загрузки
+        "spare": 1,  # запасных вкладок на селлера (каждая - процесс рендерера)
+        "max_uses": 20,  # переходов, после которых вкладка пересоздается
+        "heap_mb": 150,  # JS heap вкладки, после которого она пересоздается
+        "route_change": True,  # переход сменой маршрута SPA, иначе всегда goto
+        "route_timeout": 3,  # секунды на отрисовку маршрута, потом goto
+    },
+    "runner": {
+        "booking_enabled": False,  # False - слот только находится, без бронирования
+        # Бюджет неудач подряд по состояниям, после него поставка останавливается
+        "retries": {
+            "NAVIGATE": 2,
+            "VALIDATE": 2,
+            "OPEN_CALENDAR": 3,
+            "BOOK": 2,
+        },
+    },
+    "monitor": {
+        "enabled": True,  # общий скан календаря склада для всех поставок
+    },
 }
 
 # Константы для настроек бронирования
@@ -111,6 +309,19 @@ BOOKING_PRIORITIES = {
     "BY_CLOSEST_DATE": "BY_CLOSEST_DATE",
 }
 
+# Состояния обработки поставки (SupplyRunner)
+SUPPLY_STATES = {
+    "NAVIGATE": "NAVIGATE",  # открытие страницы поставки
+    "VALIDATE": "VALIDATE",  # проверка номера заказа
+    "OPEN_CALENDAR": "OPEN_CALENDAR",  # открытие календаря и снимок слотов
+    "SCAN": "SCAN",  # поиск подходящего слота
+    "BOOK": "BOOK",  # бронирование
+    "WAIT": "WAIT",  # ожидание следующей проверки
+    "DONE": "DONE",
+    "FAILED": "FAILED",
+    "CANCELLED": "CANCELLED",
+}
+
 COEFF_VALUES = {
     "COEFF_FREE": "COEFF_FREE",
     "COEFF_ANY": "COEFF_ANY",
@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+
+# Типы запросов к WB в порядке приоритета: бронирование идет вне очереди,
+# прогрев запасных вкладок - последним
+REQUEST_PRIORITIES = {"book": 0, "navigate": 1, "scan": 2, "warm": 3}
+
+
+class TokenBucket:
+    """Корзина токенов: rate_per_minute токенов в минуту, не больше capacity"""
+
+    def __init__(self, rate_per_minute: float, capacity: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, need: float) -> float:
+        """Секунды до момента, когда в корзине будет need токенов"""
+        self.refill()
+        if self.tokens >= need:
+            return 0
+        return (need - self.tokens) / self.rate
+
+
+# Корзины на IP общие для всех селлеров, работающих через один адрес
+_ip_buckets: Dict[str, TokenBucket] = {}
+_governors: Dict[str, "RequestGovernor"] = {}
+
+
+class RequestGovernor:
+    """Общий бюджет запросов селлера к WB для всех его вкладок
+
+    Каждая навигация и обновление календаря берет токен через acquire().
+    Сканы оставляют в корзине booking_reserve токенов, поэтому
+    бронирование почти всегда получает токен сразу, а средняя скорость
+    сканов при этом остается равной разрешенной. Прогрев ("warm") стоит
+    за всеми в очереди и берет токен только из полной корзины - тот,
+    что иначе пропал бы на переполнении, пока сканы его не тратят.
+    """
+
+    def __init__(self, name: str, buckets: List[TokenBucket]):
+        self.name = name
+        self.buckets = buckets
+        self.booking_reserve = SYSTEM_CONFIG["governor"]["booking_reserve"]
+        self.waiters: list = []
+        self.counter = itertools.count()
+        self.changed = asyncio.Condition()
+
+        self.spent: Dict[str, int] = defaultdict(int)
+        self.wait_seconds: Dict[str, float] = defaultdict(float)
+
+    async def acquire(self, kind: str = "scan") -> float:
+        """Ожидание токена, возвращает время ожидания в секундах"""
+        started_at = time.monotonic()
+        entry = [REQUEST_PRIORITIES[kind], next(self.counter)]
+        heapq.heappush(self.waiters, entry)
+
+        try:
+            async with self.changed:
+                while True:
+                    delay = None
+                    if self.waiters[0] is entry:
+                        need = 1 if kind == "book" else 1 + self.booking_reserve
+                        delay = max(
+                            bucket.wait_time(bucket.capacity if kind == "warm" else need)
+                            for bucket in self.buckets
+                        )
+                        if delay <= 0:
+                            heapq.heappop(self.waiters)
+                            for bucket in self.buckets:
+                                bucket.tokens -= 1
+                            self.changed.notify_all()
+                            break
+
+                    try:
+                        await asyncio.wait_for(self.changed.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+
+        except asyncio.CancelledError:
+            if entry in self.waiters:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                # Следующий в очереди должен пересчитать свое ожидание
+                asyncio.create_task(self._notify())
+            raise
+
+        waited = time.monotonic() - started_at
+        self.spent[kind] += 1
+        self.wait_seconds[kind] += waited
+        if waited > 1:
+            logger.debug(f"{self.name} - Запрос {kind} ждал токен {waited:.1f} с")
+        return waited
+
+    async def _notify(self) -> None:
+        async with self.changed:
+            self.changed.notify_all()
+
+    def stats(self) -> dict:
+        """Потраченные токены и суммарное ожидание по типам запросов"""
+        return {
+            "spent": dict(self.spent),
+            "wait_seconds": {
+                kind: round(seconds, 1) for kind, seconds in self.wait_seconds.items()
+            },
+            "queue": len(self.waiters),
+        }
+
+
+def get_governor(user_id: str, ip: Optional[str] = None) -> RequestGovernor:
+    """Governor селлера (один на аккаунт), с общей корзиной IP при наличии"""
+    if user_id in _governors:
+        return _governors[user_id]
+
+    config = SYSTEM_CONFIG["governor"]
+    buckets = [TokenBucket(config["requests_per_minute"], config["burst"])]
+
+    ip = ip or config["ip"]
+    if ip and config["ip_requests_per_minute"]:
+        if ip not in _ip_buckets:
+            _ip_buckets[ip] = TokenBucket(
+                config["ip_requests_per_minute"], config["ip_burst"]
+            )
+        buckets.append(_ip_buckets[ip])
+
+    _governors[user_id] = RequestGovernor(user_id, buckets)
+    return _governors[user_id]
@@ -0,0 +1,181 @@
+import json
+import time
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from slot_feed import parse_feed
+
+
+class AuthLost(Exception):
+    """Портал не принял cookies сессии: 401/403 или страница входа вместо JSON"""
+
+
+def cookie_matches(cookie: dict, host: str, path: str, now: float) -> bool:
+    """Cookie из storage state отправляется на host и path запроса"""
+    domain = (cookie.get("domain") or "").lstrip(".")
+    if host != domain and not host.endswith("." + domain):
+        return False
+    if not path.startswith(cookie.get("path") or "/"):
+        return False
+    expires = cookie.get("expires", -1)
+    return expires is None or expires <= 0 or expires > now
+
+
+class HttpPool:
+    """Общий HTTP-клиент процесса для сканов календаря без браузера
+
+    Одна сессия aiohttp с пулом keep-alive соединений на всех селлеров:
+    соединение с порталом переиспользуется между сканами и поставками.
+    Cookies в сессии не хранятся - каждый запрос несет заголовок Cookie
+    своего селлера (CalendarClient).
+    """
+
+    def __init__(self):
+        self.session = None
+
+    def get(self):
+        """Сессия aiohttp, создается в цикле событий при первом скане"""
+        if self.session is None or self.session.closed:
+            try:
+                import aiohttp
+            except ImportError as e:
+                raise RuntimeError(
+                    "Для скана календаря без браузера нужен пакет aiohttp: pip install aiohttp"
+                ) from e
+
+            config = SYSTEM_CONFIG["http_scan"]
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=config["connections"],
+                    limit_per_host=config["connections_per_host"],
+                    keepalive_timeout=config["keepalive"],
+                ),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                headers=config["headers"],
+                timeout=aiohttp.ClientTimeout(total=config["timeout"]),
+            )
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+# Общий пул соединений процесса
+http_pool = HttpPool()
+
+
+def date_range(days: int) -> tuple:
+    """dateFrom и dateTo запроса календаря: полночь UTC сегодня и через days дней"""
+    start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=days)
+    return start.strftime("%Y-%m-%dT%H:%M:%SZ"), end.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class CalendarClient:
+    """Календарь поставки запросом к API портала с cookies сессии селлера
+
+    Тот же запрос, что SPA делает при открытии модалки; ответ разбирается
+    parse_feed в те же записи слотов, что дает скан во вкладке. Пока
+    вкладка не открывала календарь, запрос собирается по шаблону из
+    SYSTEM_CONFIG["http_scan"]; после learn() - по URL и телу запроса SPA,
+    пойманного SlotFeed. Cookies берутся из сохраненной сессии
+    (SessionVault) и обновляются при ее пересохранении.
+    """
+
+    def __init__(self, user_id: str, pool: HttpPool = http_pool):
+        self.user_id = user_id
+        self.pool = pool
+        self.cookies: List[dict] = []
+        # Запрос календаря SPA: {"url", "body"}, None - шаблон из конфига
+        self.template: Optional[dict] = None
+
+    def set_cookies(self, cookies: List[dict]) -> None:
+        self.cookies = list(cookies)
+
+    def cookie_header(self, url: str) -> str:
+        parsed = urlparse(url)
+        now = time.time()
+        return "; ".join(
+            f"{cookie['name']}={cookie['value']}"
+            for cookie in self.cookies
+            if cookie_matches(cookie, parsed.hostname or "", parsed.path or "/", now)
+        )
+
+    def learn(self, request: dict) -> None:
+        """Запрос календаря, пойманный во вкладке: дальше сканы повторяют его"""
+        if request["method"] != "POST":
+            return
+        try:
+            body = json.loads(request["body"] or "")
+        except ValueError:
+            return
+        if not isinstance(body, dict) or not isinstance(body.get("params"), dict):
+            return
+        if self.template is None:
+            logger.info(f"{self.user_id} - Запрос календаря SPA взят шаблоном скана без браузера")
+        self.template = {"url": request["url"], "body": body}
+
+    def url(self) -> str:
+        if self.template is not None:
+            return self.template["url"]
+        return SYSTEM_CONFIG["urls"]["calendar_api"]
+
+    def payload(self, supply: dict) -> dict:
+        """Тело запроса: номер заказа поставки и диапазон дат от сегодняшнего дня"""
+        config = SYSTEM_CONFIG["http_scan"]
+        if self.template is not None:
+            payload = deepcopy(self.template["body"])
+        else:
+            payload = {**config["payload"], "params": {}}
+
+        preorder_id = supply["preorder_id"]
+        date_from, date_to = date_range(config["days"])
+        payload["params"].update(
+            {
+                # SPA передает номер заказа числом
+                config["preorder_param"]: int(preorder_id)
+                if str(preorder_id).isdigit()
+                else preorder_id,
+                "dateFrom": date_from,
+                "dateTo": date_to,
+            }
+        )
+        return payload
+
+    async def fetch(self, supply: dict) -> Optional[List[dict]]:
+        """Слоты календаря, None - ошибка сети или ответа, AuthLost - сессия не принята"""
+        url = self.url()
+        session = self.pool.get()
+        try:
+            async with session.post(
+                url,
+                data=json.dumps(self.payload(supply)),
+                headers={"Cookie": self.cookie_header(url)},
+            ) as response:
+                if response.status in (401, 403):
+                    raise AuthLost(f"HTTP {response.status}")
+                if response.status != 200:
+                    logger.bind(sample="http_scan").warning(
+                        f"{supply['preorder_id']} - Календарь без браузера: HTTP {response.status}"
+                    )
+                    return None
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError as e:
+                    # Вместо JSON отдана страница входа
+                    raise AuthLost("ответ не JSON") from e
+            return parse_feed(data)
+
+        except AuthLost:
+            raise
+        except Exception as e:
+            logger.bind(sample="http_scan").warning(
+                f"{supply['preorder_id']} - Ошибка запроса календаря: {str(e)}"
+            )
+            return None
@@ -0,0 +1,457 @@
+import asyncio
+import hashlib
+import math
+import os
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+
+
+class LeaseStore(ABC):
+    """Аренды селлеров в общем для узлов хранилище
+
+    Аренда - строка {key, node, token, expires_at}. token растет на
+    каждом новом захвате и не меняется при продлении: это токен
+    ограждения (fencing) - запись или бронь со старым токеном
+    отклоняется, даже если узел еще не узнал о потере аренды.
+    Время - часы узлов, ttl должен быть много больше их расхождения.
+    """
+
+    @abstractmethod
+    async def acquire(self, key: str, node: str, ttl: float) -> Optional[int]:
+        """Захват свободной или истекшей аренды: новый токен или None"""
+
+    @abstractmethod
+    async def renew(self, key: str, node: str, token: int, ttl: float) -> bool:
+        """Продление: False - аренда истекла или перехвачена"""
+
+    @abstractmethod
+    async def release(self, key: str, node: str, token: int) -> None:
+        ...
+
+    @abstractmethod
+    async def check(self, key: str, node: str, token: int) -> bool:
+        """Аренда с этим токеном все еще у узла и не истекла"""
+
+    @abstractmethod
+    async def heartbeat(self, node: str) -> None:
+        ...
+
+    @abstractmethod
+    async def alive_nodes(self, node_ttl: float) -> int:
+        ...
+
+    @abstractmethod
+    async def leave(self, node: str) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryLeaseStore(LeaseStore):
+    """Аренды в памяти: узлы - экземпляры LeaseManager одного процесса (тесты)"""
+
+    def __init__(self):
+        self.leases: Dict[str, dict] = {}
+        self.nodes: Dict[str, float] = {}
+
+    async def acquire(self, key: str, node: str, ttl: float) -> Optional[int]:
+        now = time.time()
+        lease = self.leases.setdefault(key, {"node": "", "token": 0, "expires_at": 0.0})
+        if lease["expires_at"] >= now:
+            return None
+        lease.update(node=node, token=lease["token"] + 1, expires_at=now + ttl)
+        return lease["token"]
+
+    async def renew(self, key: str, node: str, token: int, ttl: float) -> bool:
+        if not await self.check(key, node, token):
+            return False
+        self.leases[key]["expires_at"] = time.time() + ttl
+        return True
+
+    async def release(self, key: str, node: str, token: int) -> None:
+        if await self.check(key, node, token):
+            self.leases[key]["expires_at"] = 0.0
+
+    async def check(self, key: str, node: str, token: int) -> bool:
+        lease = self.leases.get(key)
+        return bool(
+            lease
+            and lease["node"] == node
+            and lease["token"] == token
+            and lease["expires_at"] > time.time()
+        )
+
+    async def heartbeat(self, node: str) -> None:
+        self.nodes[node] = time.time()
+
+    async def alive_nodes(self, node_ttl: float) -> int:
+        since = time.time() - node_ttl
+        return sum(seen_at > since for seen_at in self.nodes.values())
+
+    async def leave(self, node: str) -> None:
+        self.nodes.pop(node, None)
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """Аренды в файле SQLite, общем для процессов и узлов (WAL, общий диск)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS leases (
+            key TEXT PRIMARY KEY,
+            node TEXT NOT NULL,
+            token INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS lease_nodes (
+            node TEXT PRIMARY KEY,
+            seen_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(self.SCHEMA)
+        self.lock = asyncio.Lock()
+
+    async def _run(self, run: Callable[[sqlite3.Connection], object]):
+        def transaction():
+            with self.connection:
+                return run(self.connection)
+
+        async with self.lock:
+            return await asyncio.to_thread(transaction)
+
+    async def acquire(self, key: str, node: str, ttl: float) -> Optional[int]:
+        def run(connection: sqlite3.Connection) -> Optional[int]:
+            now = time.time()
+            # Первая запись берет блокировку на запись до конца транзакции
+            connection.execute(
+                "INSERT OR IGNORE INTO leases (key, node, token, expires_at) VALUES (?, '', 0, 0)",
+                (key,),
+            )
+            updated = connection.execute(
+                """
+                UPDATE leases SET node = ?, token = token + 1, expires_at = ?
+                WHERE key = ? AND expires_at < ?
+                """,
+                (node, now + ttl, key, now),
+            ).rowcount
+            if not updated:
+                return None
+            return connection.execute(
+                "SELECT token FROM leases WHERE key = ?", (key,)
+            ).fetchone()[0]
+
+        return await self._run(run)
+
+    async def renew(self, key: str, node: str, token: int, ttl: float) -> bool:
+        def run(connection: sqlite3.Connection) -> bool:
+            now = time.time()
+            return bool(
+                connection.execute(
+                    """
+                    UPDATE leases SET expires_at = ?
+                    WHERE key = ? AND node = ? AND token = ? AND expires_at > ?
+                    """,
+                    (now + ttl, key, node, token, now),
+                ).rowcount
+            )
+
+        return await self._run(run)
+
+    async def release(self, key: str, node: str, token: int) -> None:
+        await self._run(
+            lambda connection: connection.execute(
+                "UPDATE leases SET expires_at = 0 WHERE key = ? AND node = ? AND token = ?",
+                (key, node, token),
+            )
+        )
+
+    async def check(self, key: str, node: str, token: int) -> bool:
+        row = await self._run(
+            lambda connection: connection.execute(
+                """
+                SELECT 1 FROM leases
+                WHERE key = ? AND node = ? AND token = ? AND expires_at > ?
+                """,
+                (key, node, token, time.time()),
+            ).fetchone()
+        )
+        return row is not None
+
+    async def heartbeat(self, node: str) -> None:
+        await self._run(
+            lambda connection: connection.execute(
+                """
+                INSERT INTO lease_nodes (node, seen_at) VALUES (?, ?)
+                ON CONFLICT (node) DO UPDATE SET seen_at = excluded.seen_at
+                """,
+                (node, time.time()),
+            )
+        )
+
+    async def alive_nodes(self, node_ttl: float) -> int:
+        row = await self._run(
+            lambda connection: connection.execute(
+                "SELECT COUNT(*) FROM lease_nodes WHERE seen_at > ?",
+                (time.time() - node_ttl,),
+            ).fetchone()
+        )
+        return row[0]
+
+    async def leave(self, node: str) -> None:
+        await self._run(
+            lambda connection: connection.execute(
+                "DELETE FROM lease_nodes WHERE node = ?", (node,)
+            )
+        )
+
+    async def close(self) -> None:
+        self.connection.close()
+
+
+class MongoLeaseStore(LeaseStore):
+    """Аренды в MongoDB сайта: коллекции leases и lease_nodes"""
+
+    def __init__(self, uri: str, db_name: str):
+        try:
+            from pymongo import MongoClient, ReturnDocument
+            from pymongo.errors import DuplicateKeyError
+        except ImportError as e:
+            raise RuntimeError(
+                "Для аренд в mongo нужен пакет pymongo: pip install pymongo"
+            ) from e
+
+        self.return_after = ReturnDocument.AFTER
+        self.duplicate_key_error = DuplicateKeyError
+        self.client = MongoClient(uri)
+        self.leases = self.client[db_name]["leases"]
+        self.nodes = self.client[db_name]["lease_nodes"]
+
+    def _acquire(self, key: str, node: str, ttl: float) -> Optional[int]:
+        now = time.time()
+        try:
+            lease = self.leases.find_one_and_update(
+                {"_id": key, "expires_at": {"$lt": now}},
+                {"$set": {"node": node, "expires_at": now + ttl}, "$inc": {"token": 1}},
+                upsert=True,
+                return_document=self.return_after,
+            )
+        except self.duplicate_key_error:
+            # Аренда есть и не истекла: upsert пытался вставить второй документ
+            return None
+        return lease["token"]
+
+    async def acquire(self, key: str, node: str, ttl: float) -> Optional[int]:
+        return await asyncio.to_thread(self._acquire, key, node, ttl)
+
+    async def renew(self, key: str, node: str, token: int, ttl: float) -> bool:
+        now = time.time()
+        result = await asyncio.to_thread(
+            self.leases.update_one,
+            {"_id": key, "node": node, "token": token, "expires_at": {"$gt": now}},
+            {"$set": {"expires_at": now + ttl}},
+        )
+        return result.modified_count == 1
+
+    async def release(self, key: str, node: str, token: int) -> None:
+        await asyncio.to_thread(
+            self.leases.update_one,
+            {"_id": key, "node": node, "token": token},
+            {"$set": {"expires_at": 0.0}},
+        )
+
+    async def check(self, key: str, node: str, token: int) -> bool:
+        lease = await asyncio.to_thread(
+            self.leases.find_one,
+            {"_id": key, "node": node, "token": token, "expires_at": {"$gt": time.time()}},
+        )
+        return lease is not None
+
+    async def heartbeat(self, node: str) -> None:
+        await asyncio.to_thread(
+            self.nodes.update_one,
+            {"_id": node},
+            {"$set": {"seen_at": time.time()}},
+            upsert=True,
+        )
+
+    async def alive_nodes(self, node_ttl: float) -> int:
+        return await asyncio.to_thread(
+            self.nodes.count_documents, {"seen_at": {"$gt": time.time() - node_ttl}}
+        )
+
+    async def leave(self, node: str) -> None:
+        await asyncio.to_thread(self.nodes.delete_one, {"_id": node})
+
+    async def close(self) -> None:
+        self.client.close()
+
+
+def create_lease_store() -> LeaseStore:
+    """Хранилище аренд по SYSTEM_CONFIG["leases"]["backend"]"""
+    config = SYSTEM_CONFIG["leases"]
+    backend = config["backend"]
+
+    if backend == "memory":
+        return MemoryLeaseStore()
+    if backend == "sqlite":
+        return SQLiteLeaseStore(config["sqlite_path"])
+    if backend == "mongo":
+        store_config = SYSTEM_CONFIG["store"]
+        return MongoLeaseStore(store_config["mongo_uri"], store_config["mongo_db"])
+
+    raise ValueError(f"Неизвестное хранилище аренд: {backend}")
+
+
+class Lease:
+    """Аренда селлера узлом; бот проверяет ее перед бронью и записью статуса"""
+
+    def __init__(self, store: LeaseStore, key: str, node: str, token: int, ttl: float):
+        self.store = store
+        self.key = key
+        self.node = node
+        self.token = token
+        self.expires_at = time.time() + ttl
+
+    async def valid(self, margin: float = 0) -> bool:
+        """Аренда подтверждена хранилищем и по часам узла проживет еще margin
+        секунд - запас на клик или запись, которую она ограждает"""
+        if time.time() + margin >= self.expires_at:
+            return False
+        try:
+            return await self.store.check(self.key, self.node, self.token)
+        except Exception as e:
+            logger.error(f"{self.key} - Ошибка проверки аренды: {str(e)}")
+            return False
+
+
+class LeaseManager:
+    """Селлеры узла по арендам в общем хранилище
+
+    Каждые renew_interval секунд узел отмечается, продлевает свои аренды
+    и доводит их число до справедливой доли: ceil(селлеров / живых узлов),
+    не больше capacity. Лишние аренды (новый узел) отпускаются, свободные
+    и истекшие (упавший узел) захватываются. Порядок захвата - рандеву-хеш
+    селлера и узла, поэтому узлы не спорят за одних и тех же селлеров.
+    """
+
+    def __init__(self, store: LeaseStore, node_id: Optional[str] = None):
+        self.config = SYSTEM_CONFIG["leases"]
+        self.store = store
+        self.node_id = (
+            node_id or self.config["node_id"] or f"{socket.gethostname()}-{os.getpid()}"
+        )
+        self.held: Dict[str, Lease] = {}
+        self.candidates: Set[str] = set()
+
+    def holds(self, user_id: str) -> bool:
+        return user_id in self.held
+
+    def lease(self, user_id: str) -> Optional[Lease]:
+        return self.held.get(user_id)
+
+    def offer(self, user_ids: Iterable[str], replace: bool = False) -> None:
+        """Селлеры с активными поставками; replace - полный список из хранилища"""
+        if replace:
+            self.candidates = set(user_ids)
+        else:
+            self.candidates.update(user_ids)
+
+    def preference(self, user_id: str) -> bytes:
+        return hashlib.blake2b(f"{self.node_id}:{user_id}".encode(), digest_size=8).digest()
+
+    def drop_expired(self) -> bool:
+        """Аренды, истекшие по часам узла (хранилище недоступно)"""
+        expired = [key for key, lease in self.held.items() if time.time() >= lease.expires_at]
+        for key in expired:
+            logger.error(f"{key} - Аренда истекла без продления")
+            del self.held[key]
+        return bool(expired)
+
+    async def tick(self) -> bool:
+        """Продление, отпуск лишних и захват свободных аренд; True - состав изменился"""
+        ttl = self.config["ttl"]
+        changed = False
+
+        await self.store.heartbeat(self.node_id)
+        nodes = max(1, await self.store.alive_nodes(self.config["node_ttl"]))
+
+        for key, lease in list(self.held.items()):
+            if await self.store.renew(key, self.node_id, lease.token, ttl):
+                lease.expires_at = time.time() + ttl
+            else:
+                logger.warning(f"{key} - Аренда потеряна")
+                del self.held[key]
+                changed = True
+
+        for key in [key for key in self.held if key not in self.candidates]:
+            # Активных поставок у селлера больше нет
+            lease = self.held.pop(key)
+            await self.store.release(key, self.node_id, lease.token)
+            changed = True
+
+        target = min(self.config["capacity"], math.ceil(len(self.candidates) / nodes))
+        if len(self.held) > target:
+            for key in sorted(self.held, key=self.preference)[: len(self.held) - target]:
+                lease = self.held.pop(key)
+                await self.store.release(key, self.node_id, lease.token)
+                logger.info(f"{key} - Аренда отпущена другому узлу")
+            changed = True
+
+        free = sorted(
+            (key for key in self.candidates if key not in self.held),
+            key=self.preference,
+            reverse=True,
+        )
+        for key in free:
+            if len(self.held) >= target:
+                break
+            token = await self.store.acquire(key, self.node_id, ttl)
+            if token is not None:
+                self.held[key] = Lease(self.store, key, self.node_id, token, ttl)
+                logger.info(f"{key} - Аренда получена узлом {self.node_id}, токен {token}")
+                changed = True
+
+        return changed
+
+    async def run(self, on_change: Callable[[], Awaitable[None]]) -> None:
+        while True:
+            await asyncio.sleep(self.config["renew_interval"])
+            try:
+                changed = await self.tick()
+            except Exception as e:
+                logger.error(f"Ошибка продления аренд: {str(e)}")
+                changed = self.drop_expired()
+            if changed:
+                await on_change()
+
+    def stats(self) -> dict:
+        return {
+            "node": self.node_id,
+            "held": len(self.held),
+            "candidates": len(self.candidates),
+        }
+
+    async def stop(self) -> None:
+        """Аренды отпускаются сразу: селлеров подхватят без ожидания ttl"""
+        for key, lease in list(self.held.items()):
+            try:
+                await self.store.release(key, self.node_id, lease.token)
+            except Exception as e:
+                logger.error(f"{key} - Ошибка освобождения аренды: {str(e)}")
+        self.held.clear()
+        try:
+            await self.store.leave(self.node_id)
+        except Exception as e:
+            logger.error(f"Ошибка выхода узла {self.node_id}: {str(e)}")
+        await self.store.close()
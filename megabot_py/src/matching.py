@@ -0,0 +1,139 @@
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from config import BOOKING_MODES, BOOKING_PRIORITIES, COEFF_VALUES
+from slots import parse_date
+
+try:
+    import numpy as np
+except ImportError:  # без numpy - тот же расчет на битовых масках int
+    np = None
+
+# Окно календаря WB в днях от сегодня (даты дальше не сопоставляются)
+WINDOW_DAYS = 64
+
+
+@lru_cache(maxsize=4096)
+def day_index(date_text: str, today: int) -> Optional[int]:
+    """ "23 декабря" -> номер дня от today (0..WINDOW_DAYS-1) или None"""
+    value = parse_date(date_text, date.fromordinal(today))
+    if value is None:
+        return None
+    index = value.toordinal() - today
+    return index if 0 <= index < WINDOW_DAYS else None
+
+
+def coeff_threshold(target_coeff) -> float:
+    """Порог коэффициента поставки: FREE = 0, ANY = бесконечность"""
+    if target_coeff == COEFF_VALUES["COEFF_FREE"]:
+        return 0
+    if target_coeff == COEFF_VALUES["COEFF_ANY"]:
+        return float("inf")
+    return int(target_coeff)
+
+
+class SupplyMatrix:
+    """Поставки склада в виде массивов для пакетного сопоставления
+
+    Целевые даты каждой поставки разбираются один раз в маску дней окна
+    (ANY_DATE - все дни), target_coeff - в числовой порог. Снимок
+    календаря сопоставляется со всеми поставками за один проход NumPy.
+    """
+
+    def __init__(self, supplies: List[dict], today: Optional[date] = None):
+        self.supplies = supplies
+        self.today = (today or date.today()).toordinal()
+
+        masks = []
+        thresholds = []
+        by_coeff = []
+        for supply in supplies:
+            booking_settings = supply["booking_settings"]
+            if booking_settings["mode"] == BOOKING_MODES["SPECIFIC_DATES"]:
+                mask = 0
+                for date_text in booking_settings["target_dates"] or []:
+                    index = day_index(date_text, self.today)
+                    if index is not None:
+                        mask |= 1 << index
+            else:  # ANY_DATE
+                mask = (1 << WINDOW_DAYS) - 1
+            masks.append(mask)
+            thresholds.append(coeff_threshold(booking_settings["target_coeff"]))
+            by_coeff.append(
+                booking_settings["priority"] == BOOKING_PRIORITIES["BY_LOWER_COEFF"]
+            )
+
+        self.masks = masks
+        self.thresholds = thresholds
+        self.by_coeff = by_coeff
+
+        if np is not None:
+            bits = np.array(masks, dtype=np.uint64)
+            self.mask_matrix = (
+                (bits[:, None] >> np.arange(WINDOW_DAYS, dtype=np.uint64)) & 1
+            ).astype(bool)
+            self.threshold_vector = np.array(thresholds, dtype=np.float64)
+            self.by_coeff_vector = np.array(by_coeff, dtype=bool)
+            self.preorder_ids = np.array(
+                [supply["preorder_id"] for supply in supplies], dtype=object
+            )
+
+    def __len__(self) -> int:
+        return len(self.supplies)
+
+    def snapshot_columns(self, slots: List[dict]) -> Dict[int, dict]:
+        """Доступные слоты снимка по номеру дня окна"""
+        columns = {}
+        for slot in slots:
+            if slot["disabled"] or slot["coeff"] is None:
+                continue
+            index = day_index(slot["date"], self.today)
+            if index is not None:
+                columns[index] = slot
+        return columns
+
+    def match(self, slots: List[dict]) -> Dict[str, dict]:
+        """Лучший слот снимка для каждой подходящей поставки: preorder_id -> слот
+
+        Порядок как в match_slots: BY_LOWER_COEFF - минимальный коэффициент,
+        при равенстве ближайшая дата; иначе - ближайшая подходящая дата.
+        """
+        columns = self.snapshot_columns(slots)
+        if not columns or not self.supplies:
+            return {}
+        if np is None:
+            return self.match_python(columns)
+
+        # Только дни, доступные в снимке: (поставки × дни снимка)
+        days = np.array(sorted(columns))
+        coeffs = np.array([columns[day]["coeff"] for day in days], dtype=np.float64)
+        fits = self.mask_matrix[:, days] & (coeffs[None, :] <= self.threshold_vector[:, None])
+
+        # Первый подходящий день по дате и по (коэффициент, дата)
+        by_coeff_order = np.lexsort((days, coeffs))
+        first_by_date = fits.argmax(axis=1)
+        first_by_coeff = by_coeff_order[fits[:, by_coeff_order].argmax(axis=1)]
+        best = np.where(self.by_coeff_vector, first_by_coeff, first_by_date)
+        matched = np.flatnonzero(fits.any(axis=1))
+
+        snapshot = np.empty(len(days), dtype=object)
+        snapshot[:] = [columns[day] for day in days]
+        return dict(
+            zip(self.preorder_ids[matched].tolist(), snapshot[best[matched]].tolist())
+        )
+
+    def match_python(self, columns: Dict[int, dict]) -> Dict[str, dict]:
+        """Тот же расчет без NumPy: маска доступных дней & маска поставки"""
+        order = sorted(columns)
+        by_coeff_order = sorted(order, key=lambda index: (columns[index]["coeff"], index))
+
+        result = {}
+        for supply, mask, threshold, by_coeff in zip(
+            self.supplies, self.masks, self.thresholds, self.by_coeff
+        ):
+            for index in by_coeff_order if by_coeff else order:
+                if mask >> index & 1 and columns[index]["coeff"] <= threshold:
+                    result[supply["preorder_id"]] = columns[index]
+                    break
+        return result
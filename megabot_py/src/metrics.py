@@ -0,0 +1,272 @@
+import asyncio
+import json
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+
+LabelsKey = Tuple[Tuple[str, str], ...]
+
+
+def labels_key(labels: dict) -> LabelsKey:
+    return tuple(sorted(labels.items()))
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(key: LabelsKey) -> str:
+    """seller="1",stage="scan" - метки ряда в формате Prometheus без скобок"""
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in key)
+
+
+def with_braces(labels: str) -> str:
+    return "{" + labels + "}" if labels else ""
+
+
+class Histogram:
+    """Гистограмма задержек с фиксированными границами корзин (мс)
+
+    Наблюдение - один bisect и три сложения, без хранения значений.
+    Квантили оцениваются линейной интерполяцией внутри корзины.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя корзина - +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def add(self, other: "Histogram") -> None:
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def since(self, previous: "Histogram") -> "Histogram":
+        """Наблюдения после снимка previous (max - за все время)"""
+        delta = Histogram(self.bounds)
+        delta.counts = [now - before for now, before in zip(self.counts, previous.counts)]
+        delta.count = self.count - previous.count
+        delta.sum = self.sum - previous.sum
+        delta.max = self.max
+        return delta
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 1) if self.count else None,
+            "p50": round(self.quantile(0.5), 1) if self.count else None,
+            "p99": round(self.quantile(0.99), 1) if self.count else None,
+            "max": round(self.max, 1),
+        }
+
+
+class MetricsRegistry:
+    """Счетчики и гистограммы задержек бота в памяти процесса
+
+    metrics.inc("megabot_stage_total", stage="scan", result="WAIT", seller=...)
+    metrics.observe("megabot_stage_ms", 850.0, stage="scan", seller=..., warehouse=...)
+
+    Отдаются в формате Prometheus на локальном HTTP-эндпоинте (/metrics,
+    сводка p50/p99 - /metrics.json) и периодически пишутся снимками в
+    JSON Lines. Все вызовы из цикла событий, без блокировок.
+    """
+
+    def __init__(self, buckets: Optional[List[float]] = None):
+        self.buckets = sorted(buckets or SYSTEM_CONFIG["metrics"]["buckets_ms"])
+        self.counters: Dict[str, Dict[LabelsKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelsKey, Histogram]] = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.snapshot_task: Optional[asyncio.Task] = None
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        series = self.counters.setdefault(name, {})
+        key = labels_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value_ms: float, **labels) -> None:
+        series = self.histograms.setdefault(name, {})
+        key = labels_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.buckets)
+        histogram.observe(value_ms)
+
+    def merged(self, name: str) -> Histogram:
+        """Сумма всех рядов гистограммы name (по всем селлерам и складам)"""
+        merged = Histogram(self.buckets)
+        for histogram in self.histograms.get(name, {}).values():
+            merged.add(histogram)
+        return merged
+
+    def export(self) -> dict:
+        """Сырые ряды для передачи между процессами (см. load)"""
+        return {
+            "counters": {
+                name: list(series.items()) for name, series in self.counters.items()
+            },
+            "histograms": {
+                name: [
+                    (key, histogram.counts, histogram.count, histogram.sum, histogram.max)
+                    for key, histogram in series.items()
+                ]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def load(self, exported: dict) -> None:
+        """Добавление рядов из export() другого процесса к этому реестру"""
+        for name, items in exported["counters"].items():
+            series = self.counters.setdefault(name, {})
+            for key, value in items:
+                series[key] = series.get(key, 0) + value
+
+        for name, items in exported["histograms"].items():
+            series = self.histograms.setdefault(name, {})
+            for key, counts, count, total, maximum in items:
+                other = Histogram(self.buckets)
+                other.counts, other.count, other.sum, other.max = list(counts), count, total, maximum
+                series.setdefault(key, Histogram(self.buckets)).add(other)
+
+    def snapshot(self) -> dict:
+        """Счетчики и сводка гистограмм: {"counters": ..., "histograms": ...}"""
+        return {
+            "time": time.time(),
+            "counters": {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self.counters.items()
+            },
+            "histograms": {
+                name: [
+                    {"labels": dict(key), **histogram.summary()}
+                    for key, histogram in series.items()
+                ]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        lines = []
+        for name, series in self.counters.items():
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{with_braces(format_labels(key))} {value}")
+
+        for name, series in self.histograms.items():
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in series.items():
+                labels = format_labels(key)
+                prefix = f"{name}_bucket{{{labels},le=" if labels else f"{name}_bucket{{le="
+                cumulative = 0
+                for bound, count in zip(self.buckets + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}"{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{with_braces(labels)} {histogram.sum:.3f}")
+                lines.append(f"{name}_count{with_braces(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    async def handle_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = await reader.readline()
+            # Заголовки запроса не нужны - дочитываем до пустой строки
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode(errors="replace").split()
+            path = parts[1] if len(parts) > 1 else "/"
+            if path == "/metrics":
+                status, content_type = "200 OK", "text/plain; version=0.0.4"
+                body = self.render()
+            elif path == "/metrics.json":
+                status, content_type = "200 OK", "application/json"
+                body = json.dumps(self.snapshot(), ensure_ascii=False)
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", "not found\n"
+
+            data = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode()
+                + data
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Metrics - ошибка запроса: {str(e)}")
+        finally:
+            writer.close()
+
+    def write_snapshot(self, path: Path, snapshot: dict) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+
+    async def run_snapshots(self, interval: float, path: Path) -> None:
+        """Периодический снимок метрик в JSON Lines (запись в потоке)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.write_snapshot, path, self.snapshot())
+            except Exception as e:
+                logger.error(f"Metrics - ошибка записи снимка: {str(e)}")
+
+    async def start(self) -> None:
+        config = SYSTEM_CONFIG["metrics"]
+        if config["port"]:
+            self.server = await asyncio.start_server(
+                self.handle_request, config["host"], config["port"]
+            )
+            logger.info(
+                f"Metrics - эндпоинт http://{config['host']}:{config['port']}/metrics"
+            )
+        if config["snapshot_interval"]:
+            self.snapshot_task = asyncio.create_task(
+                self.run_snapshots(config["snapshot_interval"], Path(config["snapshot_path"]))
+            )
+
+    async def stop(self) -> None:
+        if self.snapshot_task:
+            self.snapshot_task.cancel()
+            await asyncio.gather(self.snapshot_task, return_exceptions=True)
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        # Последний снимок при остановке, чтобы не потерять хвост интервала
+        config = SYSTEM_CONFIG["metrics"]
+        if config["snapshot_interval"]:
+            self.write_snapshot(Path(config["snapshot_path"]), self.snapshot())
+
+
+# Общий реестр процесса
+metrics = MetricsRegistry()
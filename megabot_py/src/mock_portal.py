@@ -0,0 +1,560 @@
+import asyncio
+import json
+import random
+import secrets
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from slots import format_date
+
+# Дней в календаре склада, как на портале
+CALENDAR_DAYS = 30
+
+# API календаря и бронирования мока (календарь подходит под slot_feed.url_patterns)
+CALENDAR_API = "/ns/sm-supply/supply-manager/api/v1/supply/getAcceptanceCosts"
+BOOK_API = "/ns/sm-supply/supply-manager/api/v1/supply/book"
+# JSON-RPC метод, который API ждет в теле запроса
+API_METHODS = {"calendar_api": "getAcceptanceCosts"}
+
+# Разметка попапов: закрываются кнопками из SYSTEM_CONFIG["popups"]
+POPUP_HTML = {
+    "other_modal": '<div id="Portal-modal" data-popup class="Overlay"><p>Новости портала</p>'
+    '<button type="button"><span>Понятно</span></button></div>',
+    "cookies": '<div id="Portal-warning-cookies-modal" data-popup class="Overlay">'
+    '<button type="button"><span>Принимаю</span></button></div>',
+    "quiz": '<div id="Portal-quiz-modal" data-popup class="Overlay"><p>Оцените портал</p>'
+    '<button type="button"><span>Отменить</span></button></div>',
+    "tutorial_step": '<div data-popup class="Tooltip-hint-view__m1 Overlay"><p>Подсказка</p>'
+    '<div class="Tooltip-hint-view__close-button__m1" data-action="close" aria-label="Close">×</div></div>',
+}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head><meta charset="utf-8"><title>{title}</title>
+<style>
+.Overlay {{ position: fixed; inset: 0; z-index: 100; background: rgba(0, 0, 0, .4); }}
+#modal-root #Portal-modal {{ position: fixed; inset: 10%; z-index: 50; background: #fff; }}
+</style>
+</head>
+<body>
+{header}
+{content}
+{popups}
+<script>
+document.querySelectorAll("[data-popup] button, [data-popup] [data-action=close]").forEach(
+    (button) => button.addEventListener("click", () => button.closest("[data-popup]").remove())
+);
+</script>
+<script data-router>
+// Роутер SPA: по popstate страница маршрута запрашивается как данные
+// (route=1) и отрисовывается в том же документе, без его загрузки
+if (!window.mockRouter) {{
+    window.mockRouter = true;
+    window.addEventListener("popstate", async () => {{
+        const url = new URL(location.href);
+        url.searchParams.set("route", "1");
+        const html = await (await fetch(url)).text();
+        const body = new DOMParser().parseFromString(html, "text/html").body;
+        body.querySelectorAll("script[data-router]").forEach((script) => script.remove());
+        document.body.replaceWith(document.adoptNode(body));
+        // Скрипты из разобранной разметки не исполняются - пересоздаем в документе
+        document.body.querySelectorAll("script").forEach((script) => {{
+            const copy = document.createElement("script");
+            copy.textContent = script.textContent;
+            script.replaceWith(copy);
+        }});
+    }});
+}}
+</script>
+</body>
+</html>
+"""
+
+# Страница заказа: календарь строится из ответа API, как на портале
+SUPPLY_SCRIPT = """
+<script>
+(() => {
+const PREORDER_ID = %(preorder_id)s;
+const CALENDAR_API = %(calendar_api)s;
+const BOOK_API = %(book_api)s;
+const CALENDAR_DAYS = %(calendar_days)s;
+const MONTHS = ["января", "февраля", "марта", "апреля", "мая", "июня", "июля",
+    "августа", "сентября", "октября", "ноября", "декабря"];
+const WEEKDAYS = ["вс", "пн", "вт", "ср", "чт", "пт", "сб"];
+let selectedDate = null;
+
+function dateText(iso) {
+    const [year, month, day] = iso.slice(0, 10).split("-").map(Number);
+    const weekday = WEEKDAYS[new Date(year, month - 1, day).getDay()];
+    return `${day} ${MONTHS[month - 1]}, ${weekday}`;
+}
+
+function cellHtml(item) {
+    const disabled = item.coefficient < 0;
+    const cost = disabled ? "" : `
+        <div class="Calendar-cell__amount-cost__Qw3">
+          <div class="Coefficient-table-cell__Er4">
+            <div class="Coefficient-block__coefficient-text__Ty5"><span class="Text__Ui6 Text--body-s__Op7">${
+                item.coefficient === 0 ? "Бесплатно" : "×" + item.coefficient
+            }</span></div>
+          </div>
+        </div>`;
+    return `
+      <td class="Calendar-cell__AbCd1${disabled ? " Calendar-cell--is-disabled__Xy2" : ""}">
+        <div class="Calendar-cell__date-container__Lk8"><span class="Text__Ui6">${dateText(item.date)}</span></div>${cost}
+        <div class="Custom-popup__Mn9" hidden><button type="button" data-date="${item.date}"><span>Выбрать</span></button></div>
+      </td>`;
+}
+
+function renderCalendar(costs) {
+    document.getElementById("modal-root").innerHTML = `
+      <div id="Portal-modal">
+        <div class="Modal__close-button__Zx1"><button type="button">×</button></div>
+        <table class="Calendar-plan-table-view"><tr>${costs.map(cellHtml).join("")}</tr></table>
+        <div class="Calendar-plan-buttons__Cv2"><button type="button"><span>Запланировать</span></button></div>
+        <div class="Calendar-error"></div>
+      </div>`;
+    const modal = document.getElementById("modal-root");
+    modal.querySelectorAll("td").forEach((cell) => {
+        cell.addEventListener("mouseenter", () => cell.querySelector("[hidden]")?.removeAttribute("hidden"));
+    });
+    modal.querySelectorAll("[data-date]").forEach((button) => {
+        button.addEventListener("click", () => { selectedDate = button.dataset.date; });
+    });
+    modal.querySelector(".Modal__close-button__Zx1 button").addEventListener("click", () => {
+        modal.innerHTML = "";
+        selectedDate = null;
+    });
+    modal.querySelector(".Calendar-plan-buttons__Cv2 button").addEventListener("click", book);
+}
+
+async function openCalendar() {
+    // Запрос портала: JSON-RPC с номером заказа числом и диапазоном дат от полуночи UTC
+    const dateFrom = new Date();
+    dateFrom.setUTCHours(0, 0, 0, 0);
+    const dateTo = new Date(dateFrom.getTime() + CALENDAR_DAYS * 86400000);
+    const isoDate = (value) => value.toISOString().slice(0, 19) + "Z";
+    const response = await fetch(CALENDAR_API, {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({
+            jsonrpc: "2.0",
+            id: "json-rpc_1",
+            method: "getAcceptanceCosts",
+            params: {dateFrom: isoDate(dateFrom), dateTo: isoDate(dateTo), preorderID: Number(PREORDER_ID)},
+        }),
+    });
+    const data = await response.json();
+    renderCalendar(data.result.costs);
+}
+
+async function book() {
+    if (!selectedDate) return;
+    const response = await fetch(BOOK_API, {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({params: {preorderId: PREORDER_ID, date: selectedDate}}),
+    });
+    const data = await response.json();
+    if (response.ok) {
+        location.href = location.pathname + "?supplyId=" + data.result.supplyId;
+    } else {
+        document.querySelector(".Calendar-error").textContent = data.error;
+    }
+}
+
+document.getElementById("plan-button").addEventListener("click", openCalendar);
+})();
+</script>
+"""
+
+
+class MockPortal:
+    """Локальный сервер страниц портала продавца для прогона бота без аккаунта WB
+
+    Отдает страницы, которые открывает бот (главная с #Portal-header,
+    карточка поставщика с ИНН, заказ с календарем, поставка после
+    бронирования), API календаря, бронирования и проверки сессии, а также
+    попапы из SYSTEM_CONFIG["popups"]. Слоты складов открываются и
+    закрываются по расписанию (schedule) - время открытия и бронирования
+    каждого слота пишется для замера задержек.
+
+    portal = MockPortal()
+    await portal.start()
+    portal.patch_config()  # URL бота -> http://127.0.0.1:<port>
+    """
+
+    def __init__(self, popup_rate: float = 0.2, seed: int = 1):
+        self.popup_rate = popup_rate
+        self.random = random.Random(seed)
+        self.today = date.today()
+        # ИНН по токену сессии: token -> inn
+        self.tokens: Dict[str, str] = {}
+        # Заказы: preorder_id -> {"inn", "warehouse"}
+        self.supplies: Dict[str, dict] = {}
+        # Слоты складов: warehouse -> {day: {"coeff", "capacity"}}, нет записи - закрыт
+        self.slots: Dict[str, Dict[date, dict]] = {}
+        # Расписание: (секунды от старта, действие, склад, день, коэффициент, емкость)
+        self.timeline: List[Tuple[float, str, str, date, Optional[int], int]] = []
+        # Время открытия слота (perf_counter): (warehouse, "23 декабря") -> время
+        self.released_at: Dict[Tuple[str, str], float] = {}
+        # Брони: preorder_id -> {"supply_id", "date", "coeff", "booked_at"}
+        self.bookings: Dict[str, dict] = {}
+        self.booking_conflicts = 0
+        # Запросы по (ИНН, тип страницы/API) и показанные попапы
+        self.requests: Counter = Counter()
+        self.popups_shown: Counter = Counter()
+        # Запросы календаря: (склад, ИНН) -> число сканов склада этим селлером
+        self.calendar_scans: Counter = Counter()
+        # Трафик мока (весь трафик ботов идет через него)
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+        self.paths = {
+            name: urlparse(SYSTEM_CONFIG["urls"][name]).path
+            for name in ("seller", "supply", "supplier_card")
+        }
+        self.probe_path = urlparse(SYSTEM_CONFIG["session_probe"]["url"]).path
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.timeline_task: Optional[asyncio.Task] = None
+        self.timeline_changed = asyncio.Event()
+        self.base_url = None
+        self.started_at = None
+        self.original_urls = None
+        self.next_supply_id = 10_000_000
+
+    # Данные мока
+
+    def add_seller(self, inn: str) -> str:
+        """Селлер с действующей сессией, возвращает токен WBTokenV3"""
+        token = secrets.token_hex(16)
+        self.tokens[token] = inn
+        return token
+
+    def add_supply(self, inn: str, preorder_id: str, warehouse: str) -> None:
+        self.supplies[preorder_id] = {"inn": inn, "warehouse": warehouse}
+
+    def schedule(
+        self,
+        at: float,
+        action: str,
+        warehouse: str,
+        day: date,
+        coeff: Optional[int] = None,
+        capacity: int = 1,
+    ) -> None:
+        """Событие расписания: action "release" (открыть слот) или "remove" (закрыть)"""
+        self.timeline.append((at, action, warehouse, day, coeff, capacity))
+        self.timeline.sort(key=lambda event: event[0])
+        self.timeline_changed.set()
+
+    def release(self, warehouse: str, day: date, coeff: int, capacity: int = 1) -> None:
+        self.slots.setdefault(warehouse, {})[day] = {"coeff": coeff, "capacity": capacity}
+        self.released_at[(warehouse, format_date(day))] = time.perf_counter()
+        logger.info(f"Mock - открыт слот {warehouse} {day}: x{coeff}, мест {capacity}")
+
+    def remove(self, warehouse: str, day: date) -> None:
+        self.slots.get(warehouse, {}).pop(day, None)
+        logger.info(f"Mock - закрыт слот {warehouse} {day}")
+
+    async def run_timeline(self) -> None:
+        """События расписания по порядку, включая добавленные после start()"""
+        while True:
+            self.timeline_changed.clear()
+            delay = None
+            if self.timeline:
+                delay = self.started_at + self.timeline[0][0] - time.perf_counter()
+            if delay is None or delay > 0:
+                # Ждем срока первого события или нового события в расписании
+                try:
+                    await asyncio.wait_for(self.timeline_changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            at, action, warehouse, day, coeff, capacity = self.timeline.pop(0)
+            if action == "release":
+                self.release(warehouse, day, coeff, capacity)
+            else:
+                self.remove(warehouse, day)
+
+    def login_state(self, inn: str, token: str) -> dict:
+        """Storage state Playwright с cookies сессии селлера для хоста мока"""
+        host = urlparse(self.base_url).hostname
+        expires = time.time() + 86400
+        return {
+            "cookies": [
+                {
+                    "name": name,
+                    "value": value,
+                    "domain": host,
+                    "path": "/",
+                    "expires": expires,
+                    "httpOnly": True,
+                    "secure": False,
+                    "sameSite": "Lax",
+                }
+                for name, value in (("WBTokenV3", token), ("x-supplier-id-external", inn))
+            ],
+            "origins": [],
+        }
+
+    # Сервер
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        port = self.server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        self.started_at = time.perf_counter()
+        self.timeline_task = asyncio.create_task(self.run_timeline())
+        logger.info(f"Mock - портал запущен на {self.base_url}")
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self.timeline_task:
+            self.timeline_task.cancel()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        self.restore_config()
+
+    def patch_config(self) -> None:
+        """URL портала в SYSTEM_CONFIG -> адрес мока (до создания ботов)"""
+        self.original_urls = (
+            dict(SYSTEM_CONFIG["urls"]),
+            SYSTEM_CONFIG["session_probe"]["url"],
+        )
+        for name, url in SYSTEM_CONFIG["urls"].items():
+            SYSTEM_CONFIG["urls"][name] = self.base_url + urlparse(url).path
+        SYSTEM_CONFIG["session_probe"]["url"] = self.base_url + self.probe_path
+
+    def restore_config(self) -> None:
+        if self.original_urls:
+            urls, probe_url = self.original_urls
+            SYSTEM_CONFIG["urls"].update(urls)
+            SYSTEM_CONFIG["session_probe"]["url"] = probe_url
+            self.original_urls = None
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            raw_line = await reader.readline()
+            request_line = raw_line.decode(errors="replace").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode(errors="replace").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            body = await reader.readexactly(length) if length else b""
+            self.bytes_received += len(raw_line) + length + sum(
+                len(name) + len(value) + 4 for name, value in headers.items()
+            )
+            if len(request_line) < 2:
+                return
+
+            method, target = request_line[0], request_line[1]
+            status, content_type, payload = self.handle(
+                method, target, parse_cookies(headers.get("cookie", "")), body
+            )
+            data = payload.encode()
+            response = (
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode()
+                + data
+            )
+            self.bytes_sent += len(response)
+            writer.write(response)
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Mock - ошибка запроса: {str(e)}")
+        finally:
+            writer.close()
+
+    def handle(self, method: str, target: str, cookies: dict, body: bytes) -> Tuple[str, str, str]:
+        url = urlparse(target)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        inn = self.tokens.get(cookies.get("WBTokenV3"))
+        kind = self.request_kind(url.path, query)
+        # Страница, отрисованная роутером SPA, считается отдельно от загрузок документа
+        counted = f"{kind}_route" if query.pop("route", None) else kind
+        self.requests[(inn or "anonymous", counted)] += 1
+
+        if kind == "other":
+            return "404 Not Found", "text/plain", "not found"
+        if kind in ("probe_api", "calendar_api", "book_api"):
+            if inn is None:
+                return "401 Unauthorized", "application/json", json.dumps({"error": "unauthorized"})
+            request = json.loads(body or b"{}")
+            params = request.get("params", {}) if isinstance(request, dict) else request
+            method = request.get("method") if isinstance(request, dict) else None
+            if kind in API_METHODS and method != API_METHODS[kind]:
+                return "400 Bad Request", "application/json", json.dumps({"error": "unknown method"})
+            handler = getattr(self, kind)
+            status, data = handler(inn, params)
+            return status, "application/json", json.dumps(data, ensure_ascii=False)
+
+        # Страницы: без сессии - страница входа без шапки портала
+        if inn is None:
+            return "200 OK", "text/html", self.page("Вход", "", '<form id="login"></form>')
+        return "200 OK", "text/html", getattr(self, f"{kind}_page")(inn, query)
+
+    def request_kind(self, path: str, query: dict) -> str:
+        if path == CALENDAR_API:
+            return "calendar_api"
+        if path == BOOK_API:
+            return "book_api"
+        if path == self.probe_path:
+            return "probe_api"
+        if path == self.paths["supplier_card"]:
+            return "supplier_card"
+        if path == self.paths["supply"]:
+            return "booked_supply" if "supplyId" in query else "supply"
+        if path == self.paths["seller"]:
+            return "root"
+        return "other"
+
+    # Страницы
+
+    def page(self, title: str, header: str, content: str) -> str:
+        popups = []
+        for name, html in POPUP_HTML.items():
+            if name in SYSTEM_CONFIG["popups"] and self.random.random() < self.popup_rate:
+                popups.append(html)
+                self.popups_shown[name] += 1
+        return PAGE_TEMPLATE.format(
+            title=title, header=header, content=content, popups="\n".join(popups)
+        )
+
+    def portal_header(self, inn: str) -> str:
+        return f'<header id="Portal-header"><span>Поставщик {inn}</span></header>'
+
+    def root_page(self, inn: str, query: dict) -> str:
+        return self.page("Портал продавца", self.portal_header(inn), "<main></main>")
+
+    def supplier_card_page(self, inn: str, query: dict) -> str:
+        content = (
+            '<div class="Operating-account-form__wrapper__Ab1">'
+            f'<input id="inn" value="{inn}" readonly></div>'
+        )
+        return self.page("Карточка поставщика", self.portal_header(inn), content)
+
+    def supply_page(self, inn: str, query: dict) -> str:
+        preorder_id = query.get("preorderId", "")
+        supply = self.supplies.get(preorder_id)
+        if supply is None or supply["inn"] != inn:
+            return self.page("Заказ", self.portal_header(inn), "<p>Заказ не найден</p>")
+
+        content = (
+            '<div class="Supply-detail-options__title-main__Tm1">'
+            f'<span data-name="Text">Заказ № {preorder_id}</span></div>'
+            '<button type="button" id="plan-button"><span>Запланировать поставку</span></button>'
+            '<div id="modal-root"></div>'
+            + SUPPLY_SCRIPT
+            % {
+                "preorder_id": json.dumps(preorder_id),
+                "calendar_api": json.dumps(CALENDAR_API),
+                "book_api": json.dumps(BOOK_API),
+                "calendar_days": CALENDAR_DAYS,
+            }
+        )
+        return self.page("Заказ", self.portal_header(inn), content)
+
+    def booked_supply_page(self, inn: str, query: dict) -> str:
+        content = (
+            '<div class="Supply-detail-options__title-main__Tm1">'
+            f'<span data-name="Text">Поставка № {query["supplyId"]}</span></div>'
+            '<div class="Supply-detail-options__badge__Bg1">'
+            '<span data-name="Badge">Запланировано</span></div>'
+        )
+        return self.page("Поставка", self.portal_header(inn), content)
+
+    # API
+
+    def probe_api(self, inn: str, params: dict) -> Tuple[str, dict]:
+        return "200 OK", {"jsonrpc": "2.0", "result": {"suppliers": [{"inn": inn}]}}
+
+    def calendar_api(self, inn: str, params: dict) -> Tuple[str, dict]:
+        supply = self.supplies.get(str(params.get("preorderID", "")))
+        if supply is None:
+            return "404 Not Found", {"error": "preorder not found"}
+        try:
+            date_from = date.fromisoformat(params["dateFrom"][:10])
+            date_to = date.fromisoformat(params["dateTo"][:10])
+        except (KeyError, TypeError, ValueError):
+            return "400 Bad Request", {"error": "dateFrom and dateTo are required"}
+
+        warehouse = supply["warehouse"]
+        self.calendar_scans[(warehouse, inn)] += 1
+        slots = self.slots.get(warehouse, {})
+        costs = []
+        for offset in range(CALENDAR_DAYS):
+            day = self.today + timedelta(days=offset)
+            if not date_from <= day < date_to:
+                continue
+            slot = slots.get(day)
+            costs.append(
+                {
+                    "date": f"{day.isoformat()}T00:00:00Z",
+                    "coefficient": slot["coeff"] if slot else -1,
+                    "warehouseName": warehouse,
+                }
+            )
+        return "200 OK", {"jsonrpc": "2.0", "result": {"costs": costs}}
+
+    def book_api(self, inn: str, params: dict) -> Tuple[str, dict]:
+        preorder_id = params.get("preorderId")
+        supply = self.supplies.get(preorder_id)
+        if supply is None or supply["inn"] != inn:
+            return "404 Not Found", {"error": "Заказ не найден"}
+
+        try:
+            day = date.fromisoformat(params.get("date", "")[:10])
+        except ValueError:
+            return "400 Bad Request", {"error": "Не выбрана дата"}
+        slot = self.slots.get(supply["warehouse"], {}).get(day)
+        if slot is None:
+            # Слот закрыли или забрали между сканом и бронированием
+            self.booking_conflicts += 1
+            return "409 Conflict", {"error": "Дата недоступна"}
+
+        slot["capacity"] -= 1
+        if slot["capacity"] <= 0:
+            self.remove(supply["warehouse"], day)
+        self.next_supply_id += 1
+        self.bookings[preorder_id] = {
+            "supply_id": str(self.next_supply_id),
+            "date": format_date(day),
+            "coeff": slot["coeff"],
+            "booked_at": time.perf_counter(),
+        }
+        return "200 OK", {"jsonrpc": "2.0", "result": {"supplyId": self.next_supply_id}}
+
+    def stats(self) -> dict:
+        """Запросы по типам, брони, конфликты и показанные попапы"""
+        by_kind = Counter()
+        for (_, kind), count in self.requests.items():
+            by_kind[kind] += count
+        return {
+            "requests": dict(by_kind),
+            "bookings": len(self.bookings),
+            "conflicts": self.booking_conflicts,
+            "popups": dict(self.popups_shown),
+        }
+
+
+def parse_cookies(header: str) -> dict:
+    cookies = {}
+    for part in header.split(";"):
+        name, _, value = part.strip().partition("=")
+        if name:
+            cookies[name] = value
+    return cookies
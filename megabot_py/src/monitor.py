@@ -0,0 +1,318 @@
+import asyncio
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional, Set
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from slots import match_slots
+from calendar_standby import CalendarStandby
+from matching import SupplyMatrix
+
+
+class CalendarMonitor:
+    """Monitor Bot: один скан календаря на склад за цикл для всех поставок
+
+    Каждый склад сканируется одной вкладкой (на первой зарегистрированной
+    поставке этого склада; при ее отписке или закрытии ее бота скан
+    переходит к другому подписчику), а с http_scan - запросом к API календаря без
+    вкладки. Результат публикуется как снимок слотов, а ожидающие
+    поставки проверяются по нему в памяти.
+
+    В воркере супервизора scans(key) - склады, которые сканирует этот
+    процесс. Снимки своих сканов уходят в on_publish, снимки складов
+    другого воркера приходят в receive().
+    """
+
+    def __init__(
+        self,
+        scans: Optional[Callable[[str], bool]] = None,
+        on_publish: Optional[Callable[[str, List[dict]], None]] = None,
+    ):
+        self.scans = scans or (lambda key: True)
+        self.on_publish = on_publish
+        self.warehouses: Dict[str, dict] = {}
+        self.snapshots: Dict[str, dict] = {}
+        self.conditions: Dict[str, asyncio.Condition] = {}
+        # Последняя версия снимка, уже отданная поставке
+        self.consumed: Dict[str, int] = {}
+        # Матрица подписчиков склада для пакетного сопоставления
+        self.matrices: Dict[str, tuple] = {}
+        # Задачи пробуждения подписчиков: ссылка держится до их завершения
+        self.notify_tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def warehouse_key(supply: dict) -> str:
+        return str(supply.get("warehouse_id") or supply["warehouse_name"])
+
+    def register(self, bot, supply: dict) -> None:
+        """Подписка поставки на снимки календаря её склада"""
+        key = self.warehouse_key(supply)
+        warehouse = self.warehouses.get(key)
+
+        if warehouse and supply["preorder_id"] in warehouse["subscribers"]:
+            return
+
+        if warehouse is None:
+            warehouse = {
+                "bot": bot,
+                "supply": supply,
+                "subscribers": {},
+                # Бот каждого подписчика: к нему переходит скан при уходе владельца
+                "bots": {},
+                "task": None,
+            }
+            self.warehouses[key] = warehouse
+            self.conditions[key] = asyncio.Condition()
+            if self.scans(key):
+                self.start_scan(key)
+                logger.info(f"Monitor - запущен скан склада {key}")
+            else:
+                logger.info(f"Monitor - склад {key} сканирует другой воркер")
+
+        warehouse["subscribers"][supply["preorder_id"]] = supply
+        warehouse["bots"][supply["preorder_id"]] = bot
+        logger.info(
+            f"Monitor - поставка {supply['preorder_id']} подписана на склад {key} "
+            f"(подписчиков: {len(warehouse['subscribers'])})"
+        )
+
+    def start_scan(self, key: str) -> None:
+        warehouse = self.warehouses[key]
+        # Задача копирует контекст логов: все записи скана помечены складом
+        with logger.contextualize(
+            seller=warehouse["bot"].user_id, preorder=None, warehouse=key
+        ):
+            warehouse["task"] = asyncio.create_task(self.scan_warehouse(key))
+
+    def unregister(self, supply: dict) -> None:
+        """Отписка поставки, скан склада останавливается без подписчиков"""
+        key = self.warehouse_key(supply)
+        if key in self.warehouses:
+            self.drop(key, [supply["preorder_id"]])
+
+    def detach(self, bot) -> None:
+        """Отписка всех поставок закрытого бота или бота с потерянной сессией
+
+        Склады, которые сканировал этот бот, переходят к подписчикам других
+        ботов.
+        """
+        for key, warehouse in list(self.warehouses.items()):
+            preorder_ids = [
+                preorder_id
+                for preorder_id, owner in warehouse["bots"].items()
+                if owner is bot
+            ]
+            if preorder_ids:
+                self.drop(key, preorder_ids)
+
+    def drop(self, key: str, preorder_ids: List[str]) -> None:
+        warehouse = self.warehouses[key]
+        for preorder_id in preorder_ids:
+            warehouse["subscribers"].pop(preorder_id, None)
+            warehouse["bots"].pop(preorder_id, None)
+            self.consumed.pop(preorder_id, None)
+
+        if not warehouse["subscribers"]:
+            if warehouse["task"]:
+                warehouse["task"].cancel()
+            del self.warehouses[key]
+            self.matrices.pop(key, None)
+            # Снимок без скана устаревает: новый подписчик не должен его сопоставить
+            self.snapshots.pop(key, None)
+            self.conditions.pop(key, None)
+            logger.info(f"Monitor - скан склада {key} остановлен")
+        elif warehouse["supply"]["preorder_id"] not in warehouse["subscribers"]:
+            self.hand_over(key)
+
+    def hand_over(self, key: str) -> None:
+        """Скан склада вела ушедшая поставка: он переходит к живому подписчику
+
+        Старая задача отменяется вместе со своей вкладкой в контексте
+        прежнего бота, новая открывает календарь в контексте нового владельца.
+        """
+        warehouse = self.warehouses[key]
+        preorder_id, supply = next(iter(warehouse["subscribers"].items()))
+        warehouse["bot"] = warehouse["bots"][preorder_id]
+        warehouse["supply"] = supply
+        if warehouse["task"] is None:
+            return  # склад сканирует другой воркер
+        warehouse["task"].cancel()
+        self.start_scan(key)
+        logger.info(f"Monitor - скан склада {key} передан поставке {preorder_id}")
+
+    def reassign(self) -> None:
+        """Запуск и остановка сканов после смены scans (новое распределение складов)"""
+        for key, warehouse in self.warehouses.items():
+            if self.scans(key) and warehouse["task"] is None:
+                self.start_scan(key)
+                logger.info(f"Monitor - скан склада {key} перешел к этому воркеру")
+            elif not self.scans(key) and warehouse["task"] is not None:
+                warehouse["task"].cancel()
+                warehouse["task"] = None
+                logger.info(f"Monitor - скан склада {key} перешел к другому воркеру")
+
+    async def scan_warehouse(self, key: str) -> None:
+        """Цикл скана календаря одного склада
+
+        Владелец скана (бот и поставка) читается заново на каждом цикле:
+        если он сменился, вкладка открывается в контексте нового бота.
+        """
+        task = asyncio.current_task()
+        page = None
+        page_supply = None
+        standby = None
+
+        try:
+            while True:
+                warehouse = self.warehouses.get(key)
+                if warehouse is None or warehouse["task"] is not task:
+                    return
+                bot = warehouse["bot"]
+                supply = warehouse["supply"]
+
+                try:
+                    if bot.calendar_client is not None:
+                        # Скан без вкладки: запрос к API календаря с cookies сессии
+                        slots = await bot.fetch_calendar(supply)
+                        if slots is not None:
+                            self.publish(key, slots)
+                    else:
+                        if page is not None and page_supply is not supply:
+                            await self.close_page(page)
+                            page = None
+                        if page is None or page.is_closed():
+                            page = await bot.new_page(f"monitor:{key}")
+                            page_supply = supply
+                            await bot.governor.acquire("navigate")
+                            await page.goto(
+                                f"{SYSTEM_CONFIG['urls']['supply']}?preorderId={supply['preorder_id']}"
+                            )
+                            standby = CalendarStandby(bot, page, supply)
+
+                        # Календарь открыт с прошлого скана - только обновление данных
+                        slots = await standby.refresh()
+                        if slots is None:
+                            slots = await bot.scan_calendar(page, supply)
+                            if slots is not None and standby.enabled:
+                                standby.opened()
+                            elif slots is not None:
+                                await bot.close_calendar(page, supply)
+
+                        if slots is not None:
+                            self.publish(key, slots)
+                        else:
+                            # Вкладка в плохом состоянии - открываем заново
+                            await self.close_page(page)
+                            page = None
+
+                    await asyncio.sleep(bot.poll_delay(supply))
+
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Monitor - ошибка скана склада {key}: {str(e)}")
+                    # Пауза без poll_delay: ошибка могла быть в нем самом
+                    await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["CHECK_DATE_INTERVAL"])
+
+        finally:
+            await self.close_page(page)
+
+    @staticmethod
+    async def close_page(page) -> None:
+        if page is None or page.is_closed():
+            return
+        try:
+            await page.close()
+        except Exception:
+            # Контекст прежнего владельца уже закрыт
+            pass
+
+    def receive(self, key: str, slots: List[dict]) -> None:
+        """Снимок склада, который сканирует другой воркер"""
+        warehouse = self.warehouses.get(key)
+        # Без подписчиков снимок не нужен, а свой скан склада новее пересланного
+        if warehouse is not None and warehouse["task"] is None:
+            self.publish(key, slots, local=False)
+
+    def publish(self, key: str, slots: List[dict], local: bool = True) -> None:
+        """Публикация нового снимка и пробуждение ожидающих поставок"""
+        previous = self.snapshots.get(key)
+        matrix = self.subscriber_matrix(key)
+        self.snapshots[key] = {
+            "slots": slots,
+            "updated_at": time.time(),
+            "version": previous["version"] + 1 if previous else 1,
+            # Сопоставление со всеми подписчиками склада за один проход
+            "matches": matrix.match(slots) if matrix else {},
+            "matched_for": {supply["preorder_id"] for supply in matrix.supplies}
+            if matrix
+            else set(),
+        }
+        logger.debug(f"Monitor - склад {key}: снимок из {len(slots)} дат")
+        task = asyncio.create_task(self._notify(key))
+        self.notify_tasks.add(task)
+        task.add_done_callback(self.notify_tasks.discard)
+        if local and self.on_publish:
+            self.on_publish(key, slots)
+
+    def subscriber_matrix(self, key: str) -> Optional[SupplyMatrix]:
+        """Матрица подписчиков склада, пересобирается при смене состава,
+        настроек бронирования поставок или дня"""
+        warehouse = self.warehouses.get(key)
+        if warehouse is None:
+            return None
+
+        supplies = list(warehouse["subscribers"].values())
+        signature = (
+            date.today(),
+            tuple(
+                (supply["preorder_id"], id(supply["booking_settings"]))
+                for supply in supplies
+            ),
+        )
+        cached = self.matrices.get(key)
+        if cached is None or cached[0] != signature:
+            cached = (signature, SupplyMatrix(supplies))
+            self.matrices[key] = cached
+        return cached[1]
+
+    async def _notify(self, key: str) -> None:
+        condition = self.conditions.get(key)
+        if condition is None:
+            return  # склад остался без подписчиков
+        async with condition:
+            condition.notify_all()
+
+    def get_snapshot(self, supply: dict) -> Optional[dict]:
+        return self.snapshots.get(self.warehouse_key(supply))
+
+    async def wait_for_slot(self, supply: dict) -> List[dict]:
+        """Ожидание снимка, в котором есть подходящие для поставки слоты"""
+        key = self.warehouse_key(supply)
+        preorder_id = supply["preorder_id"]
+        condition = self.conditions[key]
+
+        async with condition:
+            while True:
+                snapshot = self.snapshots.get(key)
+                if snapshot and snapshot["version"] > self.consumed.get(preorder_id, 0):
+                    self.consumed[preorder_id] = snapshot["version"]
+                    if preorder_id in snapshot["matched_for"]:
+                        best_slot = snapshot["matches"].get(preorder_id)
+                        matched = [best_slot] if best_slot else []
+                    else:
+                        # Подписался после публикации снимка
+                        matched = match_slots(snapshot["slots"], supply)
+                    if matched:
+                        return matched
+                await condition.wait()
+
+    async def stop(self) -> None:
+        """Остановка всех сканов"""
+        tasks = [warehouse["task"] for warehouse in self.warehouses.values() if warehouse["task"]]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, *self.notify_tasks, return_exceptions=True)
+        self.warehouses.clear()
+        logger.info("Monitor остановлен")
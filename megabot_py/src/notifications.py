@@ -0,0 +1,370 @@
+import asyncio
+import json
+import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from metrics import metrics
+
+
+class RetryLater(Exception):
+    """Канал просит повторить не раньше чем через delay секунд (Telegram 429)"""
+
+    def __init__(self, delay: float):
+        super().__init__(f"повтор через {delay} с")
+        self.delay = delay
+
+
+class NotificationSink(ABC):
+    """Канал доставки уведомлений"""
+
+    name = "sink"
+
+    @abstractmethod
+    async def send(self, chat: str, text: str) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class LogSink(NotificationSink):
+    """Уведомления в лог (разработка)"""
+
+    name = "log"
+
+    async def send(self, chat: str, text: str) -> None:
+        logger.info(f"Уведомление для {chat}: {text}")
+
+
+class MemorySink(NotificationSink):
+    """Уведомления в список (тесты и бенчи); delay - имитация медленного API"""
+
+    name = "memory"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent: List[Tuple[str, str, float]] = []
+
+    async def send(self, chat: str, text: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append((chat, text, time.time()))
+
+
+class TelegramSink(NotificationSink):
+    """Bot API Telegram: sendMessage через urllib в потоке, без лишних зависимостей"""
+
+    name = "telegram"
+
+    def __init__(self, token: str):
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+
+    def _send(self, chat: str, text: str) -> None:
+        data = urllib.parse.urlencode({"chat_id": chat, "text": text}).encode()
+        try:
+            with urllib.request.urlopen(self.url, data=data, timeout=10) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                try:
+                    retry_after = json.loads(e.read())["parameters"]["retry_after"]
+                except (ValueError, KeyError, TypeError):
+                    retry_after = SYSTEM_CONFIG["notifications"]["retry_backoff"]
+                raise RetryLater(retry_after) from e
+            raise
+
+    async def send(self, chat: str, text: str) -> None:
+        await asyncio.to_thread(self._send, chat, text)
+
+
+class RedisSink(NotificationSink):
+    """Публикация в канал Redis для Monitor Bot"""
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(
+                "Для уведомлений в redis нужен пакет redis: pip install redis"
+            ) from e
+
+        self.client = redis.from_url(url)
+        self.channel = channel
+
+    async def send(self, chat: str, text: str) -> None:
+        await self.client.publish(
+            self.channel,
+            json.dumps({"chat": chat, "text": text, "time": time.time()}, ensure_ascii=False),
+        )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_sinks() -> Dict[str, NotificationSink]:
+    """Каналы по SYSTEM_CONFIG["notifications"]["sinks"]"""
+    config = SYSTEM_CONFIG["notifications"]
+    sinks: Dict[str, NotificationSink] = {}
+    for name in config["sinks"]:
+        if name == "log":
+            sinks[name] = LogSink()
+        elif name == "memory":
+            sinks[name] = MemorySink()
+        elif name == "telegram":
+            token = os.environ.get(config["telegram_token_env"])
+            if not token:
+                logger.warning(
+                    f"Уведомления в Telegram выключены: не задан {config['telegram_token_env']}"
+                )
+                continue
+            sinks[name] = TelegramSink(token)
+        elif name == "redis":
+            sinks[name] = RedisSink(config["redis_url"], config["redis_channel"])
+        else:
+            raise ValueError(f"Неизвестный канал уведомлений: {name}")
+    return sinks
+
+
+class Notification:
+    __slots__ = (
+        "chat",
+        "text",
+        "created_at",
+        "repeats",
+        "attempts",
+        "not_before",
+        "sinks",
+        "sending",
+    )
+
+    def __init__(self, chat: str, text: str, repeats: int = 0):
+        self.chat = chat
+        self.text = text
+        self.created_at = time.time()
+        self.repeats = repeats  # одинаковых уведомлений, слитых в это
+        self.attempts = 0
+        self.not_before = 0.0
+        self.sinks: Optional[List[str]] = None  # каналы, куда еще не доставлено
+        self.sending = False  # текст уже отрендерен и отправляется
+
+    def render(self) -> str:
+        if self.repeats:
+            return f"{self.text}\n(повторов: {self.repeats})"
+        return self.text
+
+
+class NotificationHub:
+    """Очередь уведомлений с фоновой доставкой
+
+    notify() только кладет уведомление в очередь чата и сразу
+    возвращается - бронирование не ждет Telegram. Фоновая задача
+    доставляет очереди чатов по кругу, разным чатам параллельно, одному
+    чату - по очереди и не чаще chat_interval.
+    Тот же текст в тот же чат, пока предыдущий ждет в очереди, сливается
+    с ним. Если предыдущий уже отправляется (или часть каналов его
+    получила) или доставлен менее coalesce_window назад, повтор не
+    отправляется - счетчик копится до следующего такого уведомления. Ошибка канала - повтор с удвоением паузы, порядок
+    сообщений чата при этом сохраняется.
+    """
+
+    def __init__(self):
+        self.config = SYSTEM_CONFIG["notifications"]
+        self.sinks: Dict[str, NotificationSink] = {}
+        # Очереди по чатам; порядок ключей - очередность обхода
+        self.chats: Dict[str, Deque[Notification]] = {}
+        self.size = 0
+        self.queued: Dict[Tuple[str, str], Notification] = {}
+        self.delivered_at: Dict[Tuple[str, str], float] = {}
+        self.suppressed: Dict[Tuple[str, str], int] = {}
+        self.next_allowed: Dict[str, float] = {}
+        self.sending: Set[str] = set()  # чаты, доставка которым идет сейчас
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def chat_for(self, user_id: str) -> str:
+        return (
+            self.config["chats"].get(user_id)
+            or os.environ.get(self.config["telegram_chat_env"])
+            or user_id
+        )
+
+    def notify(self, user_id: str, text: str) -> None:
+        """Постановка уведомления селлера в очередь, без ожидания доставки"""
+        chat = self.chat_for(user_id)
+        key = (chat, text)
+
+        queued = self.queued.get(key)
+        if queued is not None and not queued.sending and not queued.attempts:
+            queued.repeats += 1
+            metrics.inc("megabot_notifications_total", result="coalesced")
+            return
+        # Текст в полете уже не изменить: повтор учитывается как после доставки
+        if queued is not None or (
+            time.time() - self.delivered_at.get(key, 0.0) < self.config["coalesce_window"]
+        ):
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            metrics.inc("megabot_notifications_total", result="coalesced")
+            return
+        if self.size >= self.config["max_queue"]:
+            metrics.inc("megabot_notifications_total", result="dropped")
+            logger.bind(sample="notifications").warning(
+                f"Очередь уведомлений заполнена, отброшено: {text}"
+            )
+            return
+
+        notification = Notification(chat, text, repeats=self.suppressed.pop(key, 0))
+        self.chats.setdefault(chat, deque()).append(notification)
+        self.queued[key] = notification
+        self.size += 1
+        self.wakeup.set()
+
+    def next_ready(self) -> Tuple[Optional[str], Optional[float]]:
+        """Первый по кругу чат, которому можно отправить, иначе пауза до ближайшего"""
+        now = time.time()
+        earliest = None
+        for chat, queue in self.chats.items():
+            if chat in self.sending:
+                continue
+            ready_at = max(self.next_allowed.get(chat, 0.0), queue[0].not_before)
+            if ready_at <= now:
+                return chat, None
+            earliest = ready_at if earliest is None else min(earliest, ready_at)
+        return None, (earliest - now if earliest is not None else None)
+
+    async def deliver(self, chat: str) -> None:
+        queue = self.chats[chat]
+        notification = queue[0]
+        if notification.sinks is None:
+            notification.sinks = list(self.sinks)
+
+        notification.sending = True
+        text = notification.render()
+        failed = []
+        retry_after = 0.0
+        try:
+            for name in notification.sinks:
+                try:
+                    await asyncio.wait_for(
+                        self.sinks[name].send(chat, text), timeout=self.config["send_timeout"]
+                    )
+                except RetryLater as e:
+                    failed.append(name)
+                    retry_after = max(retry_after, e.delay)
+                except Exception as e:
+                    failed.append(name)
+                    logger.warning(f"Уведомление в {name} для {chat} не доставлено: {str(e)}")
+        finally:
+            notification.sending = False
+
+        now = time.time()
+        self.next_allowed[chat] = now + self.config["chat_interval"]
+        notification.attempts += 1
+        if failed and notification.attempts < self.config["max_attempts"]:
+            # Остается первым в очереди чата: порядок сообщений не меняется
+            notification.sinks = failed
+            notification.not_before = now + max(
+                retry_after,
+                min(
+                    self.config["retry_backoff"] * 2 ** (notification.attempts - 1),
+                    self.config["retry_backoff_max"],
+                ),
+            )
+            metrics.inc("megabot_notifications_total", result="retry")
+            return
+
+        queue.popleft()
+        self.size -= 1
+        key = (chat, notification.text)
+        del self.queued[key]
+        self.delivered_at[key] = now
+        metrics.inc("megabot_notifications_total", result="failed" if failed else "sent")
+        metrics.observe(
+            "megabot_notification_delivery_ms", (now - notification.created_at) * 1000
+        )
+        if failed:
+            logger.error(f"Уведомление для {chat} не доставлено в {failed}: {text}")
+
+        # Чат уходит в конец круга, пустой - удаляется
+        del self.chats[chat]
+        if queue:
+            self.chats[chat] = queue
+        if len(self.delivered_at) > self.config["max_queue"]:
+            since = now - self.config["coalesce_window"]
+            self.delivered_at = {
+                key: delivered_at
+                for key, delivered_at in self.delivered_at.items()
+                if delivered_at > since
+            }
+
+    async def deliver_safe(self, chat: str) -> None:
+        try:
+            await self.deliver(chat)
+        except Exception as e:
+            logger.error(f"Ошибка доставки уведомлений: {str(e)}")
+            self.next_allowed[chat] = time.time() + self.config["retry_backoff"]
+        finally:
+            self.sending.discard(chat)
+            self.wakeup.set()
+
+    async def run(self) -> None:
+        """Доставка разным чатам параллельно, не больше concurrency сразу"""
+        tasks: Set[asyncio.Task] = set()
+        try:
+            while True:
+                chat, wait = (
+                    self.next_ready()
+                    if len(self.sending) < self.config["concurrency"]
+                    else (None, None)
+                )
+                if chat is None:
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self.sending.add(chat)
+                task = asyncio.create_task(self.deliver_safe(chat))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {"queued": self.size, "chats": len(self.chats), "sinks": list(self.sinks)}
+
+    async def start(self, sinks: Optional[Dict[str, NotificationSink]] = None) -> None:
+        self.sinks = create_sinks() if sinks is None else sinks
+        self.task = asyncio.create_task(self.run())
+        self.wakeup.set()
+
+    async def stop(self) -> None:
+        """Досылка очереди не дольше flush_timeout, затем остановка"""
+        deadline = time.time() + self.config["flush_timeout"]
+        while self.size and self.task and not self.task.done() and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self.size:
+            logger.warning(f"Остановка: не доставлено уведомлений {self.size}")
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        for sink in self.sinks.values():
+            await sink.close()
+        # Логгер пишет через очередь (enqueue): дожидаемся записи хвоста,
+        # включая уведомления LogSink
+        await logger.complete()
+
+
+# Общая очередь уведомлений процесса
+notifications = NotificationHub()
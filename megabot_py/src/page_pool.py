@@ -0,0 +1,162 @@
+import asyncio
+from collections import Counter
+from typing import Dict, List, Optional
+
+from playwright.async_api import Page
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from metrics import metrics
+
+# Смена маршрута SPA без загрузки документа: роутер портала слушает popstate
+ROUTE_CHANGE_SCRIPT = """url => {
+    history.pushState(history.state, "", url);
+    window.dispatchEvent(new PopStateEvent("popstate", { state: history.state }));
+}"""
+
+HEAP_SCRIPT = "() => performance.memory ? performance.memory.usedJSHeapSize : 0"
+
+
+class PagePool:
+    """Прогретые вкладки контекста бота для поставок
+
+    Запасные вкладки заранее открывают корень портала и проходят загрузку
+    SPA в фоне, на токене "warm" governor - только из бюджета, который
+    сканы не тратят. Поставка получает такую вкладку (hit) и переходит на свою
+    страницу сменой маршрута SPA, без холодной загрузки; если роутер не
+    отрисовал маршрут за route_timeout - обычный goto. Вкладка в плохом
+    состоянии закрывается, ее место занимает запасная, а новая запасная
+    греется в фоне. Вкладки пересоздаются после max_uses переходов или
+    при JS heap больше heap_mb.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.config = SYSTEM_CONFIG["page_pool"]
+        self.idle: List[Page] = []
+        self.uses: Dict[Page, int] = {}
+        self.counters = Counter()
+        self.fill_task: Optional[asyncio.Task] = None
+        self.created = 0
+
+    def count(self, result: str) -> None:
+        self.counters[result] += 1
+        metrics.inc("megabot_page_pool_total", result=result, seller=self.bot.user_id)
+
+    async def acquire(self, name: str) -> Page:
+        """Прогретая вкладка из пула или новая (холодная), если запаса нет"""
+        while self.idle:
+            page = self.idle.pop()
+            if not page.is_closed():
+                self.count("hit")
+                self.schedule_fill()
+                return page
+            self.uses.pop(page, None)
+
+        page = await self.bot.new_page(name)
+        self.uses[page] = 0
+        if self.config["enabled"]:
+            self.count("miss")
+            self.schedule_fill()
+        return page
+
+    async def open(self, page: Page, url: str, ready_selector: str, ready_text: str) -> None:
+        """Переход вкладки на url: сменой маршрута SPA на прогретой вкладке или goto"""
+        self.uses[page] = self.uses.get(page, 0) + 1
+        if (
+            self.config["enabled"]
+            and self.config["route_change"]
+            and page.url.startswith(SYSTEM_CONFIG["urls"]["seller"])
+            and page.url != url
+        ):
+            try:
+                await page.evaluate(ROUTE_CHANGE_SCRIPT, url)
+                # Маршрут отрисован: элемент с ожидаемым текстом (номер заказа).
+                # Селекторы бота - селекторы Playwright, не CSS для querySelector
+                await page.locator(ready_selector).filter(has_text=ready_text).first.wait_for(
+                    timeout=self.config["route_timeout"] * 1000
+                )
+                self.count("route")
+                return
+            except Exception as e:
+                logger.debug(f"Смена маршрута не удалась, полная загрузка: {str(e)}")
+                self.count("route_failed")
+
+        await page.goto(url)
+        self.count("goto")
+
+    async def release(self, page: Optional[Page], healthy: bool) -> None:
+        """Возврат вкладки: исправная - в запас, остальные закрываются"""
+        if page is None:
+            return
+        uses = self.uses.pop(page, 0)
+        if page.is_closed():
+            return
+
+        reason = None
+        if not self.config["enabled"] or not healthy:
+            reason = "discarded"
+        elif uses >= self.config["max_uses"]:
+            reason = "recycled_uses"
+        elif len(self.idle) >= self.config["spare"]:
+            reason = "discarded"
+        elif await self.heap_mb(page) > self.config["heap_mb"]:
+            reason = "recycled_heap"
+
+        if reason is None:
+            self.uses[page] = uses
+            self.idle.append(page)
+            return
+
+        if self.config["enabled"]:
+            self.count(reason)
+        await page.close()
+        self.schedule_fill()
+
+    async def heap_mb(self, page: Page) -> float:
+        try:
+            return (await page.evaluate(HEAP_SCRIPT)) / 1024**2
+        except Exception:
+            return float("inf")  # Вкладка не отвечает - пересоздаем
+
+    def schedule_fill(self) -> None:
+        if not self.config["enabled"] or not self.bot.user_id_validated:
+            return  # Без подтвержденной сессии корень портала уведет на вход
+        if self.fill_task is None or self.fill_task.done():
+            self.fill_task = asyncio.create_task(self.fill())
+
+    async def fill(self) -> None:
+        """Прогрев запасных вкладок в фоне: новая вкладка и загрузка корня портала"""
+        while len(self.idle) < self.config["spare"]:
+            page = None
+            try:
+                self.created += 1
+                page = await self.bot.new_page(f"pool-{self.created}")
+                # Низший приоритет: прогрев не отнимает токены у сканов
+                await self.bot.governor.acquire("warm")
+                await page.goto(SYSTEM_CONFIG["urls"]["seller"])
+                self.uses[page] = 0
+                self.idle.append(page)
+                self.count("warmed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{self.bot.user_id} - Ошибка прогрева вкладки: {str(e)}")
+                if page is not None and not page.is_closed():
+                    await page.close()
+                return
+
+    def stats(self) -> dict:
+        served = self.counters["hit"] + self.counters["miss"]
+        return {
+            "idle": len(self.idle),
+            "hit_rate": round(self.counters["hit"] / served, 3) if served else None,
+            **self.counters,
+        }
+
+    def reset(self) -> None:
+        """Контекст пересоздан или закрыт: вкладки пула больше не существуют"""
+        if self.fill_task:
+            self.fill_task.cancel()
+            self.fill_task = None
+        self.idle.clear()
+        self.uses.clear()
@@ -0,0 +1,250 @@
+import math
+import time
+from array import array
+from collections import Counter, deque
+from datetime import datetime
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+
+# Изменение слота из истории: (день, было, стало), значения как в SlotHistory
+SlotChange = Tuple[int, Optional[int], int]
+
+
+def is_release(previous: Optional[int], coeff: int) -> bool:
+    """Слот стал лучше: открылся или коэффициент снизился"""
+    if previous is None or coeff < 0:
+        return False
+    return previous < 0 or coeff < previous
+
+
+def is_expiry(previous: Optional[int], coeff: int) -> bool:
+    """Слот стал хуже: закрылся или коэффициент вырос"""
+    if previous is None or previous < 0:
+        return False
+    return coeff < 0 or coeff > previous
+
+
+class ReleaseModel:
+    """Распределение появления слотов склада по времени суток и их время жизни
+
+    Появления считаются в корзинах по bin_minutes с экспоненциальным
+    затуханием (half_life_days), чтобы модель следовала за сменой
+    расписания склада. Время жизни - от появления до ухудшения слота.
+    """
+
+    def __init__(self):
+        config = SYSTEM_CONFIG["scheduler"]
+        self.bin_seconds = config["bin_minutes"] * 60
+        self.bins = array("d", [0.0] * (86400 // self.bin_seconds))
+        self.decay = math.log(2) / (config["half_life_days"] * 86400)
+        self.updated_at: Optional[float] = None
+        self.releases = 0
+        self.lifetimes: deque = deque(maxlen=config["lifetime_samples"])
+        # Слоты, открытые сейчас: день -> время появления
+        self.open_since: Dict[int, float] = {}
+
+    def bin_of(self, moment: float) -> int:
+        local = datetime.fromtimestamp(moment)
+        seconds = local.hour * 3600 + local.minute * 60 + local.second
+        return seconds // self.bin_seconds
+
+    def observe(self, changes: List[SlotChange], observed_at: float) -> None:
+        # Прошедшие даты больше не закроются - не держим их
+        today = datetime.fromtimestamp(observed_at).toordinal()
+        for day in [day for day in self.open_since if day < today]:
+            del self.open_since[day]
+
+        for day, previous, coeff in changes:
+            if is_release(previous, coeff):
+                self.add_release(observed_at)
+                self.open_since.setdefault(day, observed_at)
+            elif is_expiry(previous, coeff) and day in self.open_since:
+                self.lifetimes.append(observed_at - self.open_since.pop(day))
+
+    def add_release(self, moment: float) -> None:
+        if self.updated_at is not None and moment > self.updated_at:
+            factor = math.exp(-self.decay * (moment - self.updated_at))
+            for index in range(len(self.bins)):
+                self.bins[index] *= factor
+        self.updated_at = max(moment, self.updated_at or moment)
+        self.bins[self.bin_of(moment)] += 1
+        self.releases += 1
+
+    def share(self, moment: float) -> float:
+        """Доля появлений в корзине момента относительно равномерной (среднее 1)"""
+        total = sum(self.bins)
+        if total <= 0:
+            return 1.0
+        return self.bins[self.bin_of(moment)] / total * len(self.bins)
+
+    def lifetime(self) -> Optional[float]:
+        """Медианное время жизни слота в секундах"""
+        if not self.lifetimes:
+            return None
+        return max(median(self.lifetimes), 1.0)
+
+
+class PollScheduler:
+    """Интервалы сканов календаря по бюджету селлера и окнам появления слотов
+
+    Бюджет сканов селлера - requests_per_minute его governor. Он делится
+    между складами, которые селлер сканирует сам: склад получает долю,
+    пропорциональную весу floor + (1 - floor) * share, где share -
+    относительная частота появлений в текущей корзине времени суток.
+    Холодные склады сканируются реже, а сэкономленные токены уходят
+    складам в окне появлений - за сутки тратится тот же бюджет, что и при
+    ровном интервале. Пока у склада появлений меньше min_releases, его
+    вес 1.
+    """
+
+    def __init__(self):
+        self.config = SYSTEM_CONFIG["scheduler"]
+        self.models: Dict[str, ReleaseModel] = {}
+
+    def model(self, warehouse: str) -> ReleaseModel:
+        if warehouse not in self.models:
+            self.models[warehouse] = ReleaseModel()
+        return self.models[warehouse]
+
+    def observe(
+        self, warehouse: str, changes: List[SlotChange], observed_at: Optional[float] = None
+    ) -> None:
+        if changes:
+            self.model(warehouse).observe(changes, observed_at or time.time())
+
+    def learn(self, history) -> None:
+        """Обучение на сохраненной истории слотов (при старте)"""
+        last_values: Dict[Tuple[int, int], int] = {}
+
+        for segment in history.segments:
+            # Изменения дня в порядке времени по всем складам
+            events = sorted(
+                (segment.observed_at(row), key, segment.coeff[row])
+                for key, rows in segment.index.items()
+                for row in rows
+            )
+            for observed_at, key, coeff in events:
+                warehouse_id, day = key
+                self.observe(
+                    history.warehouse_keys[warehouse_id],
+                    [(day, last_values.get(key), coeff)],
+                    observed_at,
+                )
+                last_values[key] = coeff
+
+        logger.info(
+            f"Планировщик сканов: обучен на истории {len(self.models)} складов, "
+            f"появлений слотов: {sum(model.releases for model in self.models.values())}"
+        )
+
+    @staticmethod
+    def rate() -> float:
+        """Сканов в секунду, которые governor пропускает для одного селлера"""
+        return SYSTEM_CONFIG["governor"]["requests_per_minute"] / 60
+
+    def weight(self, warehouse: str, moment: float) -> float:
+        model = self.models.get(warehouse)
+        if model is None or model.releases < self.config["min_releases"]:
+            return 1.0
+        floor = self.config["floor_share"]
+        return floor + (1 - floor) * model.share(moment)
+
+    def intervals(self, loads: List[str], moment: Optional[float] = None) -> Dict[str, float]:
+        """Интервалы складов селлера, делящих один бюджет сканов
+
+        loads - склады, которые селлер сканирует сам, по одному на цикл
+        скана (склад повторяется, если его сканируют несколько поставок).
+        Склады, упершиеся в max_interval или в весь бюджет селлера,
+        фиксируются на границе, остаток бюджета делится между остальными.
+        """
+        moment = moment or time.time()
+        rate = self.rate()
+        counts = Counter(loads)
+        weights = {warehouse: self.weight(warehouse, moment) for warehouse in counts}
+        # Один склад не быстрее всего бюджета; ровное деление бюджета всегда допустимо
+        lower = max(self.config["min_interval"], 1 / rate)
+        upper = max(self.config["max_interval"], len(loads) / rate)
+
+        fixed: Dict[str, float] = {}
+        while True:
+            free = [warehouse for warehouse in counts if warehouse not in fixed]
+            if not free:
+                return fixed
+
+            spare = rate - sum(counts[warehouse] / fixed[warehouse] for warehouse in fixed)
+            total = sum(counts[warehouse] * weights[warehouse] for warehouse in free)
+            planned = {
+                warehouse: total / (spare * weights[warehouse]) if spare > 0 else upper
+                for warehouse in free
+            }
+
+            # Сначала холодные склады на max_interval, потом горячие на нижней границе
+            over = [warehouse for warehouse in free if planned[warehouse] > upper]
+            under = [warehouse for warehouse in free if planned[warehouse] < lower]
+            if over:
+                fixed.update({warehouse: upper for warehouse in over})
+            elif under:
+                fixed.update({warehouse: lower for warehouse in under})
+            else:
+                return {**planned, **fixed}
+
+    def interval(
+        self,
+        warehouse: str,
+        loads: Optional[List[str]] = None,
+        moment: Optional[float] = None,
+    ) -> float:
+        """Интервал до следующего скана склада в секундах
+
+        Склад, которого нет в loads (скан только запускается или список
+        сканов устарел), считается еще одной нагрузкой на бюджет селлера.
+        """
+        loads = list(loads or [])
+        if warehouse not in loads:
+            loads.append(warehouse)
+        return self.intervals(loads, moment)[warehouse]
+
+    def detection_probability(
+        self, warehouse: str, loads: Optional[List[str]] = None, flat: bool = False
+    ) -> Optional[float]:
+        """Ожидаемая доля пойманных слотов склада при текущем расписании
+
+        Слот с временем жизни L, появившийся в случайный момент интервала I,
+        попадает в скан с вероятностью min(1, L / I). Интервал считается
+        в общем бюджете селлера со всеми складами loads. Усредняется по
+        корзинам суток с весами появлений; flat - бюджет, поровну
+        поделенный между складами.
+        """
+        model = self.models.get(warehouse)
+        lifetime = model.lifetime() if model else None
+        total = sum(model.bins) if model else 0
+        if lifetime is None or total <= 0:
+            return None
+
+        loads = loads or [warehouse]
+        flat_interval = max(len(loads) / self.rate(), self.config["min_interval"])
+        day_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        probability = 0.0
+        for index, weight in enumerate(model.bins):
+            if weight <= 0:
+                continue
+            interval = (
+                flat_interval
+                if flat
+                else self.interval(warehouse, loads, day_start + index * model.bin_seconds)
+            )
+            probability += weight / total * min(1.0, lifetime / interval)
+        return round(probability, 3)
+
+    def report(self, warehouse: str, loads: Optional[List[str]] = None) -> dict:
+        model = self.models.get(warehouse)
+        return {
+            "interval": round(self.interval(warehouse, loads), 1),
+            "releases": model.releases if model else 0,
+            "lifetime": round(model.lifetime(), 1) if model and model.lifetime() else None,
+            "detection": self.detection_probability(warehouse, loads),
+            "detection_flat": self.detection_probability(warehouse, loads, flat=True),
+        }
@@ -0,0 +1,136 @@
+import json
+from typing import Dict, Set
+
+from playwright.async_api import Page, Locator
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from metrics import metrics
+
+# Наблюдатель DOM внутри страницы: о появлении контейнера попапа сообщает
+# в Python через binding. Проверка раз на пачку мутаций, сигнал только
+# при переходе "нет попапа" -> "есть попап".
+POPUP_OBSERVER_JS = """
+(() => {
+    const containers = %s;
+    const present = {};
+    let scheduled = false;
+    const check = () => {
+        scheduled = false;
+        for (const [name, selector] of Object.entries(containers)) {
+            const found = document.querySelector(selector) !== null;
+            if (found && !present[name]) window.megabotPopup(name);
+            present[name] = found;
+        }
+    };
+    new MutationObserver(() => {
+        if (!scheduled) {
+            scheduled = true;
+            setTimeout(check, 0);
+        }
+    }).observe(document, { childList: true, subtree: true });
+})();
+"""
+
+
+class PopupGuard:
+    """Закрытие попапов по событию, без опроса страницы
+
+    Для каждой кнопки закрытия из SYSTEM_CONFIG["popups"] регистрируется
+    обработчик page.add_locator_handler: Playwright проверяет попапы
+    перед своими действиями и сразу закрывает появившиеся. Попапы, которые
+    появились, пока бот ничего не делает на вкладке или только читает
+    ее через page.evaluate, ловит MutationObserver в странице по
+    контейнеру попапа. Опроса страницы нет ни в одном из случаев.
+    """
+
+    def __init__(self, seller: str = ""):
+        self.seller = seller
+        # Клик закрытия короткий: попап мог уже закрыть другой обработчик
+        self.close_timeout = SYSTEM_CONFIG["timeouts"]["WAIT_POPUP_CLOSE"] * 1000
+        # Счетчики закрытых попапов по типу (для метрик)
+        self.dismissed: Dict[str, int] = {
+            popup_name: 0 for popup_name in SYSTEM_CONFIG["popups"]
+        }
+
+    async def attach(self, page: Page, name: str) -> None:
+        """Подключение обработчиков попапов к вкладке (один раз на вкладку)"""
+        for popup_name, selectors in SYSTEM_CONFIG["popups"].items():
+            await page.add_locator_handler(
+                page.locator(selectors["close"]),
+                self._make_handler(popup_name, name),
+                no_wait_after=True,
+            )
+
+        # Закрытие попапов вне действий Playwright
+        closing: Set[str] = set()
+
+        async def on_popup(source, popup_name: str) -> None:
+            if popup_name in closing:
+                return
+            closing.add(popup_name)
+            try:
+                await self._close_idle(page, popup_name, name)
+            finally:
+                closing.discard(popup_name)
+
+        await page.expose_binding("megabotPopup", on_popup)
+        await page.add_init_script(
+            POPUP_OBSERVER_JS
+            % json.dumps(
+                {
+                    popup_name: selectors["container"]
+                    for popup_name, selectors in SYSTEM_CONFIG["popups"].items()
+                }
+            )
+        )
+
+        logger.info(f"{name} - Подключено закрытие попапов")
+
+    async def _close_idle(self, page: Page, popup_name: str, name: str) -> None:
+        close_button = page.locator(SYSTEM_CONFIG["popups"][popup_name]["close"]).first
+        try:
+            # Контейнер есть, но кнопки закрытия нет (например, модалка календаря)
+            if not await close_button.is_visible():
+                return
+            logger.info(f"{name} - Попап {popup_name} появился вне действий бота")
+            # Событие клика без проверок actionability: не запускает
+            # обработчики add_locator_handler поверх этого закрытия
+            await close_button.dispatch_event("click", timeout=self.close_timeout)
+            self._dismissed(popup_name)
+            logger.info(f"{name} - Попап {popup_name} закрыт")
+        except Exception as e:
+            if not page.is_closed():
+                await self._close_failed(close_button, popup_name, name, e)
+
+    def _make_handler(self, popup_name: str, name: str):
+        async def handler(close_button: Locator) -> None:
+            logger.info(f"{name} - Обнаружен активный попап: {popup_name}")
+            try:
+                await close_button.first.click(timeout=self.close_timeout)
+                self._dismissed(popup_name)
+                logger.info(f"{name} - Попап {popup_name} закрыт")
+            except Exception as e:
+                await self._close_failed(close_button.first, popup_name, name, e)
+
+        return handler
+
+    async def _close_failed(
+        self, close_button: Locator, popup_name: str, name: str, error: Exception
+    ) -> None:
+        """Попап мог закрыть второй обработчик (или сама страница) - это не ошибка"""
+        try:
+            gone = await close_button.count() == 0
+        except Exception:
+            gone = False
+        if gone:
+            logger.debug(f"{name} - Попап {popup_name} уже закрыт")
+        else:
+            logger.error(f"{name} - Ошибка закрытия попапа {popup_name}: {str(error)}")
+
+    def _dismissed(self, popup_name: str) -> None:
+        self.dismissed[popup_name] += 1
+        metrics.inc("megabot_popups_dismissed_total", popup=popup_name, seller=self.seller)
+
+    def metrics(self) -> Dict[str, int]:
+        """Количество закрытых попапов по типу"""
+        return dict(self.dismissed)
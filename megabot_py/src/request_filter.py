@@ -0,0 +1,129 @@
+import asyncio
+from fnmatch import fnmatch
+from typing import Dict
+
+from playwright.async_api import Error, Page
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+
+# Типы ресурсов Playwright -> CDP, где имя не сводится к capitalize()
+CDP_RESOURCE_TYPES = {
+    "xhr": "XHR",
+    "eventsource": "EventSource",
+    "texttrack": "TextTrack",
+    "websocket": "WebSocket",
+    "signedexchange": "SignedExchange",
+    "cspviolationreport": "CSPViolationReport",
+}
+
+
+def cdp_resource_type(resource_type: str) -> str:
+    return CDP_RESOURCE_TYPES.get(resource_type, resource_type.capitalize())
+
+
+class RequestFilter:
+    """Блокировка запросов вкладки: отсекаем все, что не нужно для бронирования
+
+    Правила в SYSTEM_CONFIG["network"]: allow-паттерны URL пропускаются
+    всегда, затем блокируются типы ресурсов и deny-паттерны URL.
+
+    Фильтр работает в браузере через CDP: Fetch приостанавливает только
+    запросы под правилами блокировки, остальные идут без участия Python
+    и с HTTP-кэшем браузера.
+    """
+
+    def __init__(self, rules: dict = None):
+        self.rules = rules or SYSTEM_CONFIG["network"]
+        # Счетчики по вкладкам: name -> {"allowed", "blocked", "allowed_bytes"}
+        self.stats: Dict[str, dict] = {}
+        self.pages_count = 0
+        # Счетчики уже закрытых вкладок
+        self.closed = {"allowed": 0, "blocked": 0, "allowed_bytes": 0}
+
+    def is_blocked(self, url: str, resource_type: str) -> bool:
+        if any(fnmatch(url, pattern) for pattern in self.rules["allow_url_patterns"]):
+            return False
+        if resource_type in self.rules["block_resource_types"]:
+            return True
+        return any(fnmatch(url, pattern) for pattern in self.rules["block_url_patterns"])
+
+    def fetch_patterns(self) -> list:
+        """Паттерны Fetch.enable: браузер останавливает только подходящие запросы"""
+        patterns = [
+            {"urlPattern": "*", "resourceType": cdp_resource_type(resource_type)}
+            for resource_type in self.rules["block_resource_types"]
+        ]
+        patterns += [{"urlPattern": pattern} for pattern in self.rules["block_url_patterns"]]
+        return patterns
+
+    async def attach(self, page: Page, name: str) -> None:
+        """Подключение фильтра к вкладке"""
+        if not self.rules["enabled"]:
+            return
+
+        self.pages_count += 1
+        name = f"{name}#{self.pages_count}"
+        stats = {"allowed": 0, "blocked": 0, "allowed_bytes": 0}
+        self.stats[name] = stats
+
+        cdp = await page.context.new_cdp_session(page)
+
+        async def handle_paused(event: dict) -> None:
+            # Сюда доходят только кандидаты на блокировку: allow-паттерны
+            # и точную проверку делает is_blocked
+            request_id = event["requestId"]
+            resource_type = event["resourceType"].lower()
+            try:
+                if self.is_blocked(event["request"]["url"], resource_type):
+                    stats["blocked"] += 1
+                    await cdp.send(
+                        "Fetch.failRequest",
+                        {"requestId": request_id, "errorReason": "BlockedByClient"},
+                    )
+                else:
+                    await cdp.send("Fetch.continueRequest", {"requestId": request_id})
+            except Error:
+                pass  # вкладка закрылась, пока запрос стоял на паузе
+
+        def handle_finished(event: dict) -> None:
+            # Байты, реально полученные из сети: со сжатием и chunked,
+            # ответы из кэша дают 0
+            stats["allowed"] += 1
+            stats["allowed_bytes"] += int(event["encodedDataLength"])
+
+        cdp.on("Fetch.requestPaused", handle_paused)
+        cdp.on("Network.loadingFinished", handle_finished)
+        # Тела ответов этой сессии не буферизуются: нужны только размеры
+        await cdp.send("Network.enable", {"maxTotalBufferSize": 0, "maxResourceBufferSize": 0})
+        await cdp.send("Fetch.enable", {"patterns": self.fetch_patterns()})
+        page.on("close", lambda _: self.release(name))
+
+    def release(self, name: str) -> None:
+        """Вкладка закрыта: пишем её счетчики в лог и в общий итог"""
+        stats = self.stats.pop(name, None)
+        if not stats:
+            return
+        for key in self.closed:
+            self.closed[key] += stats[key]
+        self.log_stats(name, stats)
+
+    def log_stats(self, name: str, stats: dict) -> None:
+        logger.info(
+            f"{name} - Запросы: пропущено {stats['allowed']} "
+            f"({stats['allowed_bytes'] / 1024:.1f} KB), заблокировано {stats['blocked']}"
+        )
+
+    async def report(self) -> None:
+        """Периодический лог счетчиков по открытым вкладкам"""
+        while True:
+            await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["NETWORK_STATS_INTERVAL"])
+            for name, stats in list(self.stats.items()):
+                self.log_stats(name, stats)
+
+    def totals(self) -> dict:
+        """Суммарные счетчики по всем вкладкам"""
+        totals = dict(self.closed)
+        for stats in self.stats.values():
+            for key in totals:
+                totals[key] += stats[key]
+        return totals
@@ -0,0 +1,117 @@
+import time
+from typing import Iterator, Optional
+
+from playwright.async_api import BrowserContext
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+
+# Результаты проверки сессии
+PROBE_OK = "ok"
+PROBE_AUTH_LOST = "auth_lost"  # сессия разлогинена
+PROBE_INN_MISMATCH = "inn_mismatch"  # сессия принадлежит другому поставщику
+PROBE_ERROR = "error"  # сеть/сервер, проверка не дала ответа
+
+
+def find_values(data, field: str) -> Iterator:
+    """Все значения поля field на любой глубине JSON"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == field:
+                yield value
+            yield from find_values(value, field)
+    elif isinstance(data, list):
+        for item in data:
+            yield from find_values(item, field)
+
+
+class SessionProbe:
+    """Проверка сессии и ИНН селлера без отрисовки страниц
+
+    Вместо перехода на карточку поставщика - срок жизни auth-cookies
+    контекста и один фоновый запрос к API портала через context.request
+    (с cookies сессии). Интервал адаптивный: после успешных проверок
+    растет до max_interval, но не дальше истечения auth-cookies; после
+    ошибки сети - повтор через min_interval. Запрос к API берет токен
+    скана у governor селлера, как и остальные запросы к WB.
+    """
+
+    def __init__(self, context: BrowserContext, user_id: str, governor=None):
+        self.context = context
+        self.user_id = user_id
+        self.governor = governor
+        self.config = SYSTEM_CONFIG["session_probe"]
+        self.interval = SYSTEM_CONFIG["timeouts"]["CHECK_USER_ID_INTERVAL"]
+        self.errors = 0
+        self.checks = 0
+
+    async def cookies_expire_at(self) -> Optional[float]:
+        """Время истечения auth-cookies, 0 - cookies нет, None - сессионные"""
+        cookies = {
+            cookie["name"]: cookie
+            for cookie in await self.context.cookies(SYSTEM_CONFIG["urls"]["seller"])
+        }
+        expires = []
+        for name in self.config["auth_cookies"]:
+            cookie = cookies.get(name)
+            if cookie is None:
+                return 0
+            if cookie.get("expires", -1) > 0:
+                expires.append(cookie["expires"])
+        return min(expires) if expires else None
+
+    async def check(self) -> str:
+        """Одна проверка сессии"""
+        self.checks += 1
+        expire_at = await self.cookies_expire_at()
+        if expire_at == 0 or (expire_at is not None and expire_at <= time.time()):
+            logger.warning(f"{self.user_id} - Нет действующих auth-cookies")
+            return PROBE_AUTH_LOST
+
+        if self.governor is not None:
+            await self.governor.acquire("scan")
+        try:
+            response = await self.context.request.post(
+                self.config["url"],
+                data=self.config["payload"],
+                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_NETWORK"] * 1000,
+            )
+        except Exception as e:
+            logger.warning(f"{self.user_id} - Проверка сессии не выполнена: {str(e)}")
+            return PROBE_ERROR
+
+        if response.status in (401, 403):
+            return PROBE_AUTH_LOST
+        if not response.ok:
+            logger.warning(f"{self.user_id} - Проверка сессии: HTTP {response.status}")
+            return PROBE_ERROR
+
+        try:
+            data = await response.json()
+        except Exception:
+            # Вместо JSON отдана страница входа
+            return PROBE_AUTH_LOST
+
+        inns = {str(value) for value in find_values(data, self.config["inn_field"])}
+        if self.user_id not in inns:
+            logger.error(f"{self.user_id} - ИНН сессии: {sorted(inns) or 'нет'}")
+            return PROBE_INN_MISMATCH
+        return PROBE_OK
+
+    async def next_interval(self, result: str) -> float:
+        """Пауза до следующей проверки по результату текущей"""
+        if result == PROBE_ERROR:
+            self.errors += 1
+            self.interval = self.config["min_interval"]
+            return self.interval
+
+        self.errors = 0
+        self.interval = min(
+            self.interval * self.config["backoff"], self.config["max_interval"]
+        )
+
+        # Проверяем до истечения auth-cookies, чтобы заметить это первыми
+        expire_at = await self.cookies_expire_at()
+        if expire_at:
+            until_expiry = expire_at - time.time() - self.config["expiry_margin"]
+            self.interval = max(min(self.interval, until_expiry), self.config["min_interval"])
+        return self.interval
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from utils.logger import logger
+from config import DATA_DIR, SYSTEM_CONFIG, get_user_cookies_dir
+
+
+def load_key() -> bytes:
+    """Ключ шифрования сессий: из переменной окружения или из файла ключа
+
+    Если ключа нет нигде, он создается в users_data/vault.key с правами 0600.
+    """
+    config = SYSTEM_CONFIG["session_vault"]
+    key = os.environ.get(config["key_env"])
+    if key:
+        return key.encode()
+
+    key_file = DATA_DIR / "vault.key"
+    if key_file.exists():
+        return key_file.read_bytes().strip()
+
+    key = Fernet.generate_key()
+    key_file.parent.mkdir(parents=True, exist_ok=True)
+    key_file.write_bytes(key)
+    key_file.chmod(0o600)
+    logger.warning(
+        f"Ключ хранилища сессий создан в {key_file}, задайте {config['key_env']} для продакшена"
+    )
+    return key
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Запись через временный файл и os.replace: файл всегда целый"""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class SessionVault:
+    """Зашифрованное хранилище сессии селлера
+
+    Хранит полный storage state Playwright (cookies + localStorage) и время
+    последней проверки ИНН. Пока validated_at моложе COOKIES_TTL, бот
+    создает контекст уже авторизованным и не проверяет карточку поставщика.
+    Файлы пишутся атомарно в потоке, не блокируя цикл событий.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.path = get_user_cookies_dir(user_id) / "session.bin"
+        # Старый формат: только cookies в открытом виде
+        self.legacy_cookies_file = get_user_cookies_dir(user_id) / "wb_cookies.json"
+        self.fernet = Fernet(load_key())
+
+    async def load(self) -> Optional[dict]:
+        """Запись сессии {"storage_state", "validated_at"} или None"""
+        try:
+            return await asyncio.to_thread(self._read)
+        except Exception as e:
+            logger.error(f"{self.user_id} - Ошибка чтения сессии: {str(e)}")
+            return None
+
+    def _read(self) -> Optional[dict]:
+        if self.path.exists():
+            try:
+                record = json.loads(self.fernet.decrypt(self.path.read_bytes()))
+            except InvalidToken:
+                logger.error(f"{self.user_id} - Сессия зашифрована другим ключом")
+                return None
+            if record.get("user_id") != self.user_id:
+                return None
+            return record
+
+        if self.legacy_cookies_file.exists():
+            cookies = json.loads(self.legacy_cookies_file.read_text())
+            if cookies:
+                # Cookies без времени проверки - сессия не считается свежей
+                return {
+                    "user_id": self.user_id,
+                    "storage_state": {"cookies": cookies, "origins": []},
+                    "validated_at": 0,
+                }
+        return None
+
+    async def save(self, storage_state: dict, validated_at: Optional[float] = None) -> bool:
+        record = {
+            "user_id": self.user_id,
+            "storage_state": storage_state,
+            "validated_at": validated_at or time.time(),
+        }
+        try:
+            token = self.fernet.encrypt(json.dumps(record).encode())
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(write_atomic, self.path, token)
+            if self.legacy_cookies_file.exists():
+                self.legacy_cookies_file.unlink()
+            return True
+        except Exception as e:
+            logger.error(f"{self.user_id} - Ошибка сохранения сессии: {str(e)}")
+            return False
+
+    @staticmethod
+    def is_fresh(record: Optional[dict]) -> bool:
+        """Сессия проверена не раньше COOKIES_TTL назад"""
+        if not record:
+            return False
+        age = time.time() - record["validated_at"]
+        return age < SYSTEM_CONFIG["timeouts"]["COOKIES_TTL"]
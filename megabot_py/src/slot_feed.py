@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime
+from fnmatch import fnmatch
+from typing import Callable, List, Optional
+
+from playwright.async_api import Page, Response
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from slots import format_date
+
+# Повтор запроса календаря из страницы: те же cookies и заголовки, что у SPA
+REPLAY_JS = """
+async ({ url, method, body, headers }) => {
+    const response = await fetch(url, { method, body, headers, credentials: "include" });
+    return response.ok ? await response.json() : null;
+}
+"""
+
+
+def parse_feed_item(index: int, item: dict) -> Optional[dict]:
+    """Одна запись ответа календаря -> запись слота
+
+    Коэффициент -1 в ответе WB означает, что приемка на дату закрыта.
+    """
+    fields = SYSTEM_CONFIG["slot_feed"]["fields"]
+    raw_date = item.get(fields["date"])
+    if not raw_date:
+        return None
+
+    coefficient = item.get(fields["coeff"])
+    disabled = coefficient is None or int(coefficient) < 0
+    warehouse = item.get(fields["warehouse_name"]) or item.get(fields["warehouse_id"])
+
+    return {
+        "index": index,
+        "date": format_date(datetime.fromisoformat(raw_date.replace("Z", "+00:00"))),
+        "coeff": None if disabled else int(coefficient),
+        "disabled": disabled,
+        "warehouse": str(warehouse) if warehouse is not None else None,
+    }
+
+
+def parse_feed(data) -> List[dict]:
+    """JSON ответа календаря -> записи слотов в порядке дат
+
+    Поддерживаются список записей и JSON-RPC обертка {"result": {"costs": [...]}}.
+    """
+    items = data
+    if isinstance(data, dict):
+        result = data.get("result", data)
+        items = result.get(SYSTEM_CONFIG["slot_feed"]["fields"]["items"], [])
+
+    date_field = SYSTEM_CONFIG["slot_feed"]["fields"]["date"]
+    items = sorted(
+        (item for item in items if item.get(date_field)),
+        key=lambda item: item[date_field],
+    )
+
+    slots = []
+    for item in items:
+        slot = parse_feed_item(len(slots), item)
+        if slot:
+            slots.append(slot)
+    return slots
+
+
+class SlotFeed:
+    """Слоты календаря из XHR-ответа портала, без ожидания отрисовки
+
+    Перед открытием календаря вызывается arm(), затем wait_slots() ждет
+    первый подходящий ответ после этого момента. Последний запрос
+    календаря запоминается: replay() повторяет его без кликов по модалке,
+    а on_request получает его для скана без браузера (CalendarClient.learn).
+    """
+
+    def __init__(
+        self, page: Page, name: str, on_request: Optional[Callable[[dict], None]] = None
+    ):
+        self.page = page
+        self.name = name
+        self.on_request = on_request
+        self.slots: Optional[List[dict]] = None
+        self.received = asyncio.Event()
+        self.request: Optional[dict] = None
+
+    def attach(self) -> None:
+        if SYSTEM_CONFIG["slot_feed"]["enabled"]:
+            self.page.on("response", self._on_response)
+
+    def is_calendar_response(self, url: str) -> bool:
+        return any(
+            fnmatch(url, pattern)
+            for pattern in SYSTEM_CONFIG["slot_feed"]["url_patterns"]
+        )
+
+    async def _on_response(self, response: Response) -> None:
+        if not self.is_calendar_response(response.url) or not response.ok:
+            return
+
+        try:
+            slots = parse_feed(await response.json())
+        except Exception as e:
+            logger.error(f"{self.name} - Ошибка разбора ответа календаря: {str(e)}")
+            return
+
+        request = response.request
+        self.request = {
+            "url": request.url,
+            "method": request.method,
+            "body": request.post_data,
+            # Псевдозаголовки HTTP/2 fetch не принимает
+            "headers": {
+                name: value for name, value in request.headers.items() if not name.startswith(":")
+            },
+        }
+        if self.on_request:
+            self.on_request(self.request)
+        self.slots = slots
+        self.received.set()
+        logger.debug(f"{self.name} - Календарь из ответа сети: {len(slots)} дат")
+
+    def arm(self) -> None:
+        """Сброс перед новым открытием календаря"""
+        self.slots = None
+        self.received.clear()
+
+    async def wait_slots(self) -> Optional[List[dict]]:
+        """Слоты из ответа или None, если ответ не пришел (fallback на DOM)"""
+        try:
+            await asyncio.wait_for(
+                self.received.wait(),
+                timeout=SYSTEM_CONFIG["timeouts"]["WAIT_SLOT_FEED"],
+            )
+        except asyncio.TimeoutError:
+            return None
+        return self.slots
+
+    async def replay(self) -> Optional[List[dict]]:
+        """Повтор последнего запроса календаря изнутри страницы, None - не удалось"""
+        if self.request is None:
+            return None
+        try:
+            data = await self.page.evaluate(REPLAY_JS, self.request)
+            return parse_feed(data) if data is not None else None
+        except Exception as e:
+            logger.warning(f"{self.name} - Ошибка повтора запроса календаря: {str(e)}")
+            return None
@@ -0,0 +1,432 @@
+import asyncio
+import json
+import os
+import time
+from array import array
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from slots import parse_date
+
+# Коэффициент в истории - int8: 0 - бесплатно, >0 - коэффициент
+COEFF_DISABLED = -1  # дата закрыта для приемки
+COEFF_UNKNOWN = -2  # коэффициент не прочитан
+COEFF_MAX = 127
+
+# (warehouse_id, day): индекс склада в реестре и номер дня date.toordinal()
+SlotKey = Tuple[int, int]
+
+
+def encode_coeff(slot: dict) -> int:
+    if slot["disabled"]:
+        return COEFF_DISABLED
+    if slot["coeff"] is None:
+        return COEFF_UNKNOWN
+    return min(slot["coeff"], COEFF_MAX)
+
+
+def decode_coeff(value: int) -> Optional[int]:
+    """Коэффициент из истории: None - дата закрыта или неизвестна"""
+    return value if value >= 0 else None
+
+
+class Segment:
+    """Изменения слотов за один день наблюдений, колонками array
+
+    Пока день идет, строки лежат в порядке поступления. При смене дня
+    сегмент замораживается: строки сортируются по (склад, дата, время).
+    Строка - 9 байт: склад (H), дата (H, дни от дня сегмента),
+    мс от начала дня (I), коэффициент (b). Индекс (склад, дата) -> строки
+    держит порядок времени внутри слота.
+    """
+
+    def __init__(self, day: int):
+        self.day = day
+        self.started_at = datetime.fromordinal(day).timestamp()
+        self.warehouse = array("H")
+        self.target = array("H")
+        self.offset_ms = array("I")
+        self.coeff = array("b")
+        self.index: Dict[SlotKey, List[int]] = {}
+        self.frozen = False
+
+    def __len__(self) -> int:
+        return len(self.coeff)
+
+    def key(self, row: int) -> SlotKey:
+        return self.warehouse[row], self.day + self.target[row]
+
+    def append(self, key: SlotKey, observed_at: float, coeff: int) -> None:
+        warehouse, day = key
+        self.index.setdefault(key, []).append(len(self))
+        self.warehouse.append(warehouse)
+        self.target.append(day - self.day)
+        self.offset_ms.append(int((observed_at - self.started_at) * 1000))
+        self.coeff.append(coeff)
+
+    def observed_at(self, row: int) -> float:
+        return self.started_at + self.offset_ms[row] / 1000
+
+    def freeze(self) -> None:
+        """Сортировка по (склад, дата, время): строки слота идут подряд"""
+        order = sorted(range(len(self)), key=lambda row: (self.key(row), self.offset_ms[row]))
+        self.warehouse = array("H", (self.warehouse[row] for row in order))
+        self.target = array("H", (self.target[row] for row in order))
+        self.offset_ms = array("I", (self.offset_ms[row] for row in order))
+        self.coeff = array("b", (self.coeff[row] for row in order))
+        self.reindex()
+        self.frozen = True
+
+    def reindex(self) -> None:
+        self.index = {}
+        for row in range(len(self)):
+            self.index.setdefault(self.key(row), []).append(row)
+
+    def rows(self, key: SlotKey) -> List[int]:
+        """Строки одного слота в порядке времени"""
+        return self.index.get(key, [])
+
+    def copy(self) -> "Segment":
+        """Копия колонок для записи в потоке, пока этот сегмент дописывается"""
+        segment = Segment(self.day)
+        segment.warehouse = array("H", self.warehouse)
+        segment.target = array("H", self.target)
+        segment.offset_ms = array("I", self.offset_ms)
+        segment.coeff = array("b", self.coeff)
+        segment.frozen = self.frozen
+        return segment
+
+    def nbytes(self) -> int:
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.warehouse, self.target, self.offset_ms, self.coeff)
+        )
+
+    def save(self, path: Path) -> None:
+        """Запись во временный файл и замена: на диске всегда целый сегмент"""
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, "wb") as file:
+            header = json.dumps({"day": self.day, "rows": len(self)}).encode()
+            file.write(len(header).to_bytes(4, "little") + header)
+            for column in (self.warehouse, self.target, self.offset_ms, self.coeff):
+                column.tofile(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "Segment":
+        with open(path, "rb") as file:
+            header_size = int.from_bytes(file.read(4), "little")
+            header = json.loads(file.read(header_size))
+            segment = cls(header["day"])
+            for column in (segment.warehouse, segment.target, segment.offset_ms, segment.coeff):
+                column.fromfile(file, header["rows"])
+        segment.reindex()
+        segment.frozen = True
+        return segment
+
+
+class SlotHistory:
+    """История слотов: склад × дата × время наблюдения
+
+    Пишутся только изменения: повторный скан с тем же коэффициентом
+    не добавляет строк. Текущее состояние календаря (окно window_days
+    от сегодня) хранится отдельно и смещается при смене дня. Сегменты
+    прошлых дней заморожены, лежат на диске и удаляются после
+    retention_days. Текущий день сбрасывается на диск каждые flush_rows
+    изменений или flush_interval секунд, так что падение процесса теряет
+    не больше этого.
+
+    record() и смена дня только копируют колонки сегмента в очередь
+    записи; файлы пишет фоновая задача (start) в потоке, не блокируя цикл
+    событий. Без запущенной задачи очередь пишется в close().
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        config = SYSTEM_CONFIG["slot_history"]
+        self.window_days = config["window_days"]
+        self.retention_days = config["retention_days"]
+        self.flush_rows = config["flush_rows"]
+        self.flush_interval = config["flush_interval"]
+        self.directory = Path(directory or config["dir"])
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Реестр складов: ключ склада -> номер в колонке warehouse
+        self.warehouse_ids: Dict[str, int] = {}
+        self.warehouse_keys: List[str] = []
+        # Последнее известное значение по слоту (окно календаря)
+        self.current: Dict[SlotKey, int] = {}
+        self.segments: List[Segment] = []
+        self.active: Optional[Segment] = None
+        # Разбор дат календаря ("23 декабря") кэшируется на текущий день
+        self.date_days: Dict[str, int] = {}
+        # Строк текущего сегмента в очереди записи и время последнего сброса
+        self.flushed_rows = 0
+        self.flushed_at = time.monotonic()
+        # Очередь записи: копии сегментов по дням и дни сегментов на удаление
+        self.pending: Dict[int, Segment] = {}
+        self.expired: List[int] = []
+        self.dirty = asyncio.Event()
+        self.closing = False
+        self.writer: Optional[asyncio.Task] = None
+        self.load()
+
+    def warehouse_id(self, key: str) -> int:
+        if key not in self.warehouse_ids:
+            self.warehouse_ids[key] = len(self.warehouse_keys)
+            self.warehouse_keys.append(key)
+        return self.warehouse_ids[key]
+
+    def record(
+        self, warehouse: str, slots: List[dict], observed_at: Optional[float] = None
+    ) -> List[Tuple[int, Optional[int], int]]:
+        """Снимок календаря склада, возвращает изменения [(день, было, стало)]
+
+        Значения сырые (int8), "было" - None для первого наблюдения слота.
+        """
+        observed_at = observed_at or time.time()
+        today = date.fromtimestamp(observed_at)
+        self.rollover(today.toordinal())
+
+        warehouse_id = self.warehouse_id(warehouse)
+        last_day = today.toordinal() + self.window_days
+        changes = []
+
+        for slot in slots:
+            day = self.date_days.get(slot["date"])
+            if day is None:
+                slot_date = parse_date(slot["date"], today)
+                if slot_date is None:
+                    continue
+                day = self.date_days[slot["date"]] = slot_date.toordinal()
+
+            if not today.toordinal() <= day <= last_day:
+                continue
+
+            key = (warehouse_id, day)
+            coeff = encode_coeff(slot)
+            previous = self.current.get(key)
+            if previous == coeff:
+                continue
+
+            self.current[key] = coeff
+            self.active.append(key, observed_at, coeff)
+            changes.append((day, previous, coeff))
+
+        if changes:
+            self.maybe_flush()
+        return changes
+
+    def maybe_flush(self) -> None:
+        """Сброс текущего дня на диск по числу новых строк или по времени"""
+        pending = len(self.active) - self.flushed_rows
+        if pending >= self.flush_rows or (
+            pending and time.monotonic() - self.flushed_at >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Текущий сегмент в очередь записи как есть, без заморозки"""
+        self.stage(self.active)
+        self.flushed_rows = len(self.active)
+        self.flushed_at = time.monotonic()
+
+    def stage(self, segment: Segment) -> None:
+        """Копия сегмента в очередь записи; более новая копия дня заменяет старую"""
+        self.pending[segment.day] = segment.copy()
+        self.dirty.set()
+
+    def rollover(self, today: int) -> None:
+        """Смена дня: заморозка сегмента, сдвиг окна, удаление старых сегментов"""
+        if self.active is not None and self.active.day == today:
+            return
+
+        if self.active is not None:
+            self.active.freeze()
+            self.stage(self.active)
+            logger.info(
+                f"История слотов: день {date.fromordinal(self.active.day)} - "
+                f"{len(self.active)} изменений, {self.active.nbytes()} байт"
+            )
+
+        if self.segments and self.segments[-1].day == today:
+            # Перезапуск в течение дня: дописываем сегмент, сохраненный при остановке
+            self.active = self.segments[-1]
+            self.active.frozen = False
+        else:
+            self.active = Segment(today)
+            self.segments.append(self.active)
+
+        self.flushed_rows = len(self.active)
+        self.flushed_at = time.monotonic()
+        self.date_days = {}
+        # Прошедшие даты выпадают из окна календаря
+        self.current = {key: value for key, value in self.current.items() if key[1] >= today}
+
+        while self.segments and self.segments[0].day < today - self.retention_days:
+            expired = self.segments.pop(0)
+            self.pending.pop(expired.day, None)
+            self.expired.append(expired.day)
+            self.dirty.set()
+
+    def value_at(self, key: SlotKey, moment: float) -> Optional[int]:
+        """Значение слота на момент времени (сырое, int8) или None, если не наблюдался"""
+        # Слот виден в календаре не раньше чем за window_days до своей даты
+        first_day = key[1] - self.window_days - 1
+        for segment in reversed(self.segments):
+            if segment.day < first_day:
+                break
+            if segment.started_at > moment:
+                continue
+            for row in reversed(segment.rows(key)):
+                if segment.observed_at(row) <= moment:
+                    return segment.coeff[row]
+        return None
+
+    def trace(
+        self,
+        warehouse: str,
+        slot_date: date,
+        since: float = 0,
+        until: float = float("inf"),
+    ) -> List[Tuple[float, Optional[int]]]:
+        """Изменения коэффициента одного слота: [(время, коэффициент или None)]"""
+        if warehouse not in self.warehouse_ids:
+            return []
+
+        key = (self.warehouse_ids[warehouse], slot_date.toordinal())
+        return [
+            (observed_at, decode_coeff(segment.coeff[row]))
+            for segment in self.segments_between(since, until)
+            for row in segment.rows(key)
+            if since <= (observed_at := segment.observed_at(row)) <= until
+        ]
+
+    def free_slots(
+        self, since: float, until: Optional[float] = None
+    ) -> List[Tuple[str, date, float]]:
+        """Бесплатные слоты в интервале: [(склад, дата, время появления)]
+
+        Учитываются и слоты, бесплатные уже на начало интервала
+        (время появления для них - since).
+        """
+        until = until if until is not None else time.time()
+        found: Dict[SlotKey, float] = {}
+
+        # Бесплатные на начало интервала
+        since_day = date.fromtimestamp(since).toordinal()
+        for key in self.current:
+            if key[1] >= since_day and self.value_at(key, since) == 0:
+                found[key] = since
+
+        # Ставшие бесплатными внутри интервала
+        for segment in self.segments_between(since, until):
+            for row in range(len(segment)):
+                if segment.coeff[row] != 0:
+                    continue
+                observed_at = segment.observed_at(row)
+                if since <= observed_at <= until:
+                    key = segment.key(row)
+                    found[key] = min(found.get(key, observed_at), observed_at)
+
+        return sorted(
+            (self.warehouse_keys[warehouse], date.fromordinal(day), observed_at)
+            for (warehouse, day), observed_at in found.items()
+        )
+
+    def window(self, warehouse: str) -> Dict[date, Optional[int]]:
+        """Текущее состояние календаря склада на window_days вперед"""
+        warehouse_id = self.warehouse_ids.get(warehouse)
+        return {
+            date.fromordinal(day): decode_coeff(coeff)
+            for (key_warehouse, day), coeff in sorted(self.current.items())
+            if key_warehouse == warehouse_id
+        }
+
+    def segments_between(self, since: float, until: float) -> List[Segment]:
+        """Сегменты, дни которых пересекаются с интервалом"""
+        return [
+            segment
+            for segment in self.segments
+            if segment.started_at <= until and segment.started_at + 86400 > since
+        ]
+
+    def segment_path(self, day: int) -> Path:
+        return self.directory / f"{date.fromordinal(day).isoformat()}.bin"
+
+    def write(
+        self, segments: List[Segment], expired: List[int], warehouse_keys: List[str]
+    ) -> None:
+        """Запись очереди на диск (в потоке): реестр складов, сегменты, удаление старых"""
+        registry = self.directory / "warehouses.json"
+        temp_path = registry.with_name(registry.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(warehouse_keys, file, ensure_ascii=False)
+        os.replace(temp_path, registry)
+        for segment in segments:
+            segment.save(self.segment_path(segment.day))
+        for day in expired:
+            self.segment_path(day).unlink(missing_ok=True)
+
+    async def write_pending(self) -> None:
+        segments, expired = list(self.pending.values()), self.expired
+        self.pending, self.expired = {}, []
+        if not segments and not expired:
+            return
+        try:
+            await asyncio.to_thread(self.write, segments, expired, list(self.warehouse_keys))
+        except Exception as e:
+            logger.error(f"История слотов: ошибка записи на диск: {str(e)}")
+
+    async def run_writer(self) -> None:
+        """Фоновая запись очереди; записи идут по одной, файлы не пишутся параллельно"""
+        while not self.closing:
+            await self.dirty.wait()
+            self.dirty.clear()
+            await self.write_pending()
+
+    def start(self) -> None:
+        self.writer = asyncio.create_task(self.run_writer())
+
+    def load(self) -> None:
+        """Загрузка сохраненных сегментов и восстановление окна календаря"""
+        registry = self.directory / "warehouses.json"
+        if not registry.exists():
+            return
+
+        with open(registry, encoding="utf-8") as file:
+            for key in json.load(file):
+                self.warehouse_id(key)
+
+        for path in sorted(self.directory.glob("*.bin")):
+            self.segments.append(Segment.load(path))
+
+        for segment in self.segments:
+            for row in range(len(segment)):
+                self.current[segment.key(row)] = segment.coeff[row]
+
+    async def close(self) -> None:
+        """Сохранение текущего дня и остатка очереди (вызывается при остановке бота)"""
+        if self.active is not None and len(self.active):
+            self.active.freeze()
+            self.stage(self.active)
+        if self.writer is not None:
+            # Задача дописывает текущую запись и выходит; отмена оборвала бы запись в потоке
+            self.closing = True
+            self.dirty.set()
+            await self.writer
+            self.writer = None
+        await self.write_pending()
+
+    def stats(self) -> dict:
+        return {
+            "segments": len(self.segments),
+            "rows": sum(len(segment) for segment in self.segments),
+            "bytes": sum(segment.nbytes() for segment in self.segments),
+            "slots": len(self.current),
+            "warehouses": len(self.warehouse_keys),
+        }
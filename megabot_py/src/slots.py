@@ -0,0 +1,125 @@
+from datetime import date, timedelta
+from typing import List, Optional
+
+from config import BOOKING_MODES, BOOKING_PRIORITIES, COEFF_VALUES
+
+# Текст коэффициента для бесплатной приемки в календаре WB
+COEFF_FREE_TEXT = "Бесплатно"
+
+# Месяцы в родительном падеже, как в датах календаря WB ("23 декабря")
+MONTHS_GENITIVE = [
+    "января",
+    "февраля",
+    "марта",
+    "апреля",
+    "мая",
+    "июня",
+    "июля",
+    "августа",
+    "сентября",
+    "октября",
+    "ноября",
+    "декабря",
+]
+
+
+def format_date(value: date) -> str:
+    """Дата в формате календаря WB: date(2024, 12, 23) -> "23 декабря" """
+    return f"{value.day} {MONTHS_GENITIVE[value.month - 1]}"
+
+
+def parse_date(date_text: str, today: date) -> Optional[date]:
+    """Дата календаря WB -> date: "23 декабря" -> date(год, 12, 23)
+
+    Год не указан в календаре: берется ближайший к today, календарь
+    показывает даты вперед, поэтому "3 января" в декабре - следующий год.
+    """
+    try:
+        day_text, month_text = clean_date(date_text).split()
+        month = MONTHS_GENITIVE.index(month_text) + 1
+        value = date(today.year, month, int(day_text))
+    except ValueError:
+        return None
+
+    if value < today - timedelta(days=31):
+        value = value.replace(year=today.year + 1)
+    return value
+
+
+def clean_date(date_text: str) -> str:
+    """Убираем день недели из даты календаря: "23 декабря, пн" -> "23 декабря" """
+    return date_text.split(",")[0].strip()
+
+
+def parse_coeff(coeff_text: Optional[str]) -> Optional[int]:
+    """Нормализация коэффициента: "Бесплатно" -> 0, "×5" -> 5, нет данных -> None"""
+    if coeff_text is None:
+        return None
+
+    text = coeff_text.strip()
+    if not text:
+        return None
+    if text == COEFF_FREE_TEXT:
+        return 0
+
+    try:
+        return int(text.replace("×", "").strip())
+    except ValueError:
+        return None
+
+
+def make_slot(
+    index: int,
+    date_text: str,
+    coeff_text: Optional[str],
+    disabled: bool,
+    warehouse: Optional[str] = None,
+) -> dict:
+    """Нормализованная запись слота календаря"""
+    return {
+        "index": index,
+        "date": clean_date(date_text),
+        "coeff": parse_coeff(coeff_text),
+        "disabled": disabled,
+        "warehouse": warehouse,
+    }
+
+
+def coeff_fits(coeff: Optional[int], target_coeff) -> bool:
+    """Проверка коэффициента слота по настройке поставки"""
+    if coeff is None:
+        return False
+    if target_coeff == COEFF_VALUES["COEFF_FREE"]:
+        return coeff == 0
+    if target_coeff == COEFF_VALUES["COEFF_ANY"]:
+        return True
+    return coeff <= int(target_coeff)
+
+
+def match_slots(slots: List[dict], supply: dict) -> List[dict]:
+    """Подходящие для поставки слоты, лучший - первый
+
+    Повторяет правила process_target_dates: фильтр по режиму дат,
+    пропуск недоступных дат, проверка коэффициента и сортировка по приоритету.
+    """
+    booking_settings = supply["booking_settings"]
+    target_coeff = booking_settings["target_coeff"]
+
+    if booking_settings["mode"] == BOOKING_MODES["SPECIFIC_DATES"]:
+        target_dates = set(booking_settings["target_dates"] or [])
+        candidates = [slot for slot in slots if slot["date"] in target_dates]
+    else:  # ANY_DATE
+        candidates = list(slots)
+
+    suitable = [
+        slot
+        for slot in candidates
+        if not slot["disabled"] and coeff_fits(slot["coeff"], target_coeff)
+    ]
+
+    # Сортировка только если нужен приоритет по коэффициенту,
+    # иначе оставляем порядок дат из календаря WB
+    if booking_settings["priority"] == BOOKING_PRIORITIES["BY_LOWER_COEFF"]:
+        suitable.sort(key=lambda slot: slot["coeff"])
+
+    return suitable
@@ -0,0 +1,388 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG
+from metrics import MetricsRegistry, metrics
+from supply_store import create_store
+
+
+def rendezvous(key: str, index: int) -> bytes:
+    return hashlib.blake2b(f"{index}:{key}".encode(), digest_size=8).digest()
+
+
+def pick_worker(key: str, indexes: Iterable[int]) -> int:
+    return max(indexes, key=lambda index: rendezvous(key, index))
+
+
+def assign_worker(user_id: str, workers: int) -> int:
+    """Воркер селлера: рандеву-хеширование по номеру воркера
+
+    Назначение стабильно между перезапусками, а при смене числа воркеров
+    переезжают только селлеры добавленного или удаленного воркера.
+    """
+    return pick_worker(user_id, range(workers))
+
+
+def worker_settings() -> dict:
+    """Настройки супервизора для воркера: процесс spawn заново импортирует
+    config и не видит изменений, сделанных после импорта (бенчи, тесты)"""
+    import config
+
+    return {"system": SYSTEM_CONFIG, "cookies_dir": str(config.COOKIES_DIR)}
+
+
+def worker_main(index: int, workers: int, commands, reports, settings: dict) -> None:
+    """Точка входа процесса-воркера"""
+    import config
+
+    SYSTEM_CONFIG.update(settings["system"])
+    config.COOKIES_DIR = Path(settings["cookies_dir"])
+    try:
+        asyncio.run(run_worker(index, workers, commands, reports))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_worker(index: int, workers: int, commands, reports) -> None:
+    """Боты селлеров шарда: BotFleet с фильтром assign_worker
+
+    Каждые heartbeat_interval секунд воркер отправляет супервизору
+    состояние, сырые метрики и склады своих подписчиков Monitor Bot.
+    Команды: ("rebalance", workers) - новое число воркеров,
+    ("scanners", {склад: воркер}) - кто сканирует склады,
+    ("snapshot", склад, слоты) - снимок склада другого воркера,
+    ("stop",) - остановка. Склад, которого нет в распределении, воркер
+    сканирует сам, а снимки своих сканов сразу отправляет супервизору.
+    """
+    from bot import BotFleet
+    from monitor import CalendarMonitor
+
+    # Эндпоинт и снимки метрик - у супервизора, воркеры только отчитываются
+    SYSTEM_CONFIG["metrics"]["port"] = 0
+    SYSTEM_CONFIG["metrics"]["snapshot_interval"] = 0
+
+    config = SYSTEM_CONFIG["supervisor"]
+    shard = {"workers": workers}
+    scanners: Dict[str, int] = {}
+    leases = SYSTEM_CONFIG["leases"]["enabled"]
+    monitor = None
+    if SYSTEM_CONFIG["monitor"]["enabled"] and config["shared_scans"]:
+        monitor = CalendarMonitor(
+            scans=lambda key: scanners.get(key, index) == index,
+            on_publish=lambda key, slots: reports.put(
+                {"worker": index, "snapshot": (key, slots)}
+            ),
+        )
+    fleet = BotFleet(
+        # С арендами каждый воркер - отдельный узел, селлеров делят аренды
+        owns=None if leases else lambda user_id: assign_worker(user_id, shard["workers"]) == index,
+        node_id=f"{socket.gethostname()}-worker-{index}" if leases else None,
+        # Сегменты истории слотов пишет только один процесс
+        history_dir=Path(SYSTEM_CONFIG["slot_history"]["dir"]) / f"worker-{index}",
+        monitor=monitor,
+        # Пустую базу поставок заполнил супервизор до старта воркеров
+        seed_store=False,
+    )
+    logger.info(f"Воркер {index}/{workers} запущен, pid {os.getpid()}")
+
+    try:
+        await fleet.start()
+        report_at = 0.0
+        while True:
+            try:
+                command = await asyncio.to_thread(
+                    commands.get, True, max(0.0, report_at - time.time())
+                )
+            except queue.Empty:
+                command = None
+
+            if command and command[0] == "stop":
+                break
+            if command and command[0] == "rebalance":
+                shard["workers"] = command[1]
+                await fleet.rebalance()
+                reports.put({"worker": index, "rebalanced": command[1]})
+                report_at = 0.0
+            if command and command[0] == "scanners" and fleet.monitor:
+                scanners.clear()
+                scanners.update(command[1])
+                fleet.monitor.reassign()
+            if command and command[0] == "snapshot" and fleet.monitor:
+                fleet.monitor.receive(command[1], command[2])
+
+            if time.time() >= report_at:
+                report_at = time.time() + config["heartbeat_interval"]
+                reports.put(
+                    {
+                        "worker": index,
+                        "pid": os.getpid(),
+                        "time": time.time(),
+                        "health": fleet.health(),
+                        "metrics": metrics.export(),
+                        "warehouses": list(fleet.monitor.warehouses) if fleet.monitor else [],
+                    }
+                )
+    finally:
+        await fleet.stop()
+        logger.info(f"Воркер {index} остановлен")
+        await logger.complete()
+
+
+class Supervisor:
+    """Процессы-воркеры с шардированием селлеров по ядрам
+
+    Селлеры распределяются по воркерам assign_worker. Упавший или
+    зависший (нет отчета heartbeat_timeout секунд) воркер перезапускается
+    с растущей паузой. Число воркеров меняется сигналами SIGUSR1 (+1) и
+    SIGUSR2 (-1): сначала селлеры передаются, потом запускается новый
+    воркер, чтобы поставка никогда не работала в двух процессах сразу.
+    Метрики воркеров суммируются и отдаются эндпоинтом супервизора.
+
+    Поставки одного склада бывают у селлеров разных воркеров. Склад
+    сканирует один воркер из тех, где у него есть подписчики (shared_scans),
+    его снимки супервизор сразу пересылает остальным - скан на склад
+    один, как и в одном процессе.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.config = SYSTEM_CONFIG["supervisor"]
+        self.workers_count = workers or self.config["workers"] or os.cpu_count()
+        self.context = multiprocessing.get_context("spawn")
+        self.reports = self.context.Queue()
+        # index -> {"process", "commands", "started_at", "restarts", "restart_at", "report"}
+        self.workers: Dict[int, dict] = {}
+        # Воркер, который сканирует склад: склад -> номер воркера
+        self.scanners: Dict[str, int] = {}
+        self.restarts_total = 0
+        self.scaling = asyncio.Lock()
+
+    def spawn(self, index: int, restarts: int = 0) -> None:
+        commands = self.context.Queue()
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.workers_count, commands, self.reports, worker_settings()),
+            name=f"megabot-worker-{index}",
+            daemon=False,
+        )
+        process.start()
+        self.workers[index] = {
+            "process": process,
+            "commands": commands,
+            "started_at": time.time(),
+            "restarts": restarts,
+            "restart_at": None,
+            "report": None,
+            "rebalanced": None,
+            "scanners": None,  # распределение складов, отправленное воркеру
+        }
+        logger.info(f"Супервизор: воркер {index} запущен, pid {process.pid}")
+
+    async def stop_worker(self, index: int) -> None:
+        worker = self.workers.pop(index)
+        process = worker["process"]
+        if process.is_alive():
+            worker["commands"].put(("stop",))
+            await asyncio.to_thread(process.join, self.config["heartbeat_timeout"])
+        if process.is_alive():
+            logger.warning(f"Супервизор: воркер {index} не остановился, завершаем")
+            process.kill()
+            await asyncio.to_thread(process.join)
+
+    async def receive_reports(self) -> None:
+        """Отчеты воркеров по мере прихода: снимки складов пересылаются без задержки"""
+        while True:
+            try:
+                report = await asyncio.to_thread(self.reports.get, True, 1)
+            except queue.Empty:
+                continue
+            if "snapshot" in report:
+                self.relay(report["worker"], *report["snapshot"])
+                continue
+            worker = self.workers.get(report["worker"])
+            if worker is None:
+                continue
+            if "rebalanced" in report:
+                worker["rebalanced"] = report["rebalanced"]
+            else:
+                worker["report"] = report
+
+    def relay(self, source: int, key: str, slots: list) -> None:
+        """Снимок склада от воркера-сканера - воркерам с подписчиками склада"""
+        for index, worker in self.workers.items():
+            report = worker["report"]
+            if index != source and report and key in report["warehouses"]:
+                worker["commands"].put(("snapshot", key, slots))
+
+    def assign_scans(self) -> None:
+        """Один воркер-сканер на склад среди живых воркеров с его подписчиками
+
+        Сканер остается прежним, пока у него есть подписчики склада, новый
+        выбирается рандеву-хешем. Распределение отправляется воркеру, если
+        оно изменилось или воркер перезапущен.
+        """
+        subscribed: Dict[str, list] = {}
+        for index, worker in self.workers.items():
+            if worker["report"] and worker["process"].is_alive():
+                for key in worker["report"]["warehouses"]:
+                    subscribed.setdefault(key, []).append(index)
+
+        self.scanners = {
+            key: self.scanners[key]
+            if self.scanners.get(key) in indexes
+            else pick_worker(key, indexes)
+            for key, indexes in subscribed.items()
+        }
+        for worker in self.workers.values():
+            if worker["report"] and worker["scanners"] != self.scanners:
+                worker["scanners"] = dict(self.scanners)
+                worker["commands"].put(("scanners", worker["scanners"]))
+
+    def check_workers(self) -> None:
+        """Перезапуск упавших и зависших воркеров с растущей паузой"""
+        now = time.time()
+        for index, worker in list(self.workers.items()):
+            process = worker["process"]
+            if process.is_alive():
+                last_seen = worker["report"]["time"] if worker["report"] else worker["started_at"]
+                if now - last_seen > self.config["heartbeat_timeout"]:
+                    logger.error(f"Супервизор: воркер {index} не отвечает, перезапуск")
+                    process.kill()
+                continue
+
+            if worker["restart_at"] is None:
+                uptime = now - worker["started_at"]
+                restarts = 0 if uptime > self.config["stable_uptime"] else worker["restarts"]
+                delay = min(
+                    self.config["restart_backoff"] * 2**restarts,
+                    self.config["restart_backoff_max"],
+                )
+                worker["restarts"] = restarts + 1
+                worker["restart_at"] = now + delay
+                logger.error(
+                    f"Супервизор: воркер {index} завершился (код {process.exitcode}), "
+                    f"перезапуск через {delay:.0f} с"
+                )
+            elif now >= worker["restart_at"]:
+                self.restarts_total += 1
+                self.spawn(index, restarts=worker["restarts"])
+
+    async def broadcast_rebalance(self) -> None:
+        """Новое число воркеров всем живым воркерам, ожидание передачи селлеров"""
+        for worker in self.workers.values():
+            worker["rebalanced"] = None
+            worker["commands"].put(("rebalance", self.workers_count))
+
+        deadline = time.time() + self.config["rebalance_timeout"]
+        while time.time() < deadline:
+            if all(
+                worker["rebalanced"] == self.workers_count or not worker["process"].is_alive()
+                for worker in self.workers.values()
+            ):
+                return
+            await asyncio.sleep(0.5)
+        logger.warning("Супервизор: не все воркеры подтвердили передачу селлеров")
+
+    async def scale(self, workers: int) -> None:
+        async with self.scaling:
+            workers = max(1, workers)
+            old_count = self.workers_count
+            if workers == old_count:
+                return
+            logger.info(f"Супервизор: воркеров {old_count} -> {workers}")
+
+            if workers < old_count:
+                # Сначала останавливаем лишние воркеры, затем их селлеров берут оставшиеся
+                for index in range(workers, old_count):
+                    await self.stop_worker(index)
+                self.workers_count = workers
+                await self.broadcast_rebalance()
+            else:
+                # Сначала старые воркеры отпускают селлеров, затем стартуют новые
+                self.workers_count = workers
+                await self.broadcast_rebalance()
+                for index in range(old_count, workers):
+                    self.spawn(index)
+
+    def aggregate(self) -> None:
+        """Сумма метрик воркеров в реестре эндпоинта супервизора"""
+        total = MetricsRegistry(metrics.buckets)
+        for worker in self.workers.values():
+            if worker["report"]:
+                total.load(worker["report"]["metrics"])
+        total.inc("megabot_worker_restarts_total", self.restarts_total)
+        for index, worker in self.workers.items():
+            health = worker["report"]["health"] if worker["report"] else {}
+            total.inc("megabot_worker_sellers", health.get("sellers", 0), worker=index)
+        metrics.counters, metrics.histograms = total.counters, total.histograms
+
+    def health(self) -> dict:
+        return {
+            index: {
+                "pid": worker["process"].pid,
+                "alive": worker["process"].is_alive(),
+                "restarts": worker["restarts"],
+                **(worker["report"]["health"] if worker["report"] else {}),
+            }
+            for index, worker in self.workers.items()
+        }
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for signal_number, step in ((signal.SIGUSR1, 1), (signal.SIGUSR2, -1)):
+            loop.add_signal_handler(
+                signal_number,
+                lambda step=step: asyncio.create_task(self.scale(self.workers_count + step)),
+            )
+
+        if SYSTEM_CONFIG["metrics"]["enabled"]:
+            await metrics.start()
+        if SYSTEM_CONFIG["store"]["backend"] == "sqlite":
+            # Пустая база заполняется один раз до старта воркеров, не каждым из них
+            store = await create_store()
+            await store.close()
+        for index in range(self.workers_count):
+            self.spawn(index)
+
+        receiver = asyncio.create_task(self.receive_reports())
+        last_log = time.time()
+        try:
+            while True:
+                await asyncio.sleep(1)
+                if not self.scaling.locked():
+                    self.check_workers()
+                if self.config["shared_scans"]:
+                    self.assign_scans()
+                self.aggregate()
+                if time.time() - last_log >= 60:
+                    last_log = time.time()
+                    logger.info(f"Супервизор: {self.health()}")
+        finally:
+            receiver.cancel()
+            for index in list(self.workers):
+                await self.stop_worker(index)
+            if SYSTEM_CONFIG["metrics"]["enabled"]:
+                await metrics.stop()
+
+
+async def main():
+    logger.info("СТАРТ СУПЕРВИЗОРА")
+    try:
+        await Supervisor().run()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("Получен сигнал остановки")
+    finally:
+        logger.info("ЗАВЕРШЕНИЕ РАБОТЫ СУПЕРВИЗОРА")
+        await logger.complete()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,341 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import List, Optional
+
+from playwright.async_api import Page
+from utils.logger import logger
+from config import SYSTEM_CONFIG, SUPPLY_STATES
+from metrics import metrics
+from calendar_standby import CalendarStandby
+
+FINAL_STATES = (
+    SUPPLY_STATES["DONE"],
+    SUPPLY_STATES["FAILED"],
+    SUPPLY_STATES["CANCELLED"],
+)
+
+# Этапы, время которых пишется в гистограмму megabot_stage_ms
+# (BOOK разбивается на шаги внутри MEGABOT.book_slot, WAIT - это пауза)
+TIMED_STAGES = {
+    SUPPLY_STATES["NAVIGATE"]: "navigation",
+    SUPPLY_STATES["VALIDATE"]: "validate_supply_data",
+    SUPPLY_STATES["OPEN_CALENDAR"]: "open_calendar",
+    SUPPLY_STATES["SCAN"]: "scan",
+}
+
+
+class SupplyRunner:
+    """Обработка одной поставки как конечный автомат
+
+    NAVIGATE -> VALIDATE -> OPEN_CALENDAR -> SCAN -> BOOK / WAIT -> OPEN_CALENDAR ...
+
+    Без Monitor Bot и с включенным standby календарь между сканами не
+    закрывается: OPEN_CALENDAR обновляет слоты повтором запроса, а перед
+    BOOK модалка переоткрывается, чтобы кликать по свежим ячейкам.
+
+    С http_scan вкладки нет, пока нет слота: OPEN_CALENDAR - запрос к API
+    календаря (или ожидание снимка Monitor Bot в WAIT). Найденный слот
+    переводит поставку в NAVIGATE: вкладка из пула, календарь во вкладке,
+    повторный SCAN и BOOK. Если слот ушел, вкладка возвращается в пул.
+
+    На поставку приходится ровно одна задача asyncio и не больше одной вкладки.
+    Неудачи считаются по состояниям с бюджетом из SYSTEM_CONFIG["runner"],
+    после исчерпания бюджета поставка переходит в FAILED.
+    """
+
+    def __init__(self, bot, supply: dict):
+        self.bot = bot
+        self.supply = supply
+        self.preorder_id = supply["preorder_id"]
+        self.warehouse = str(supply.get("warehouse_id") or supply["warehouse_name"])
+        # Скан календаря HTTP-запросом: вкладка берется только под бронирование
+        self.browserless = bot.calendar_client is not None
+        # Слот найден без вкладки: нужна вкладка для бронирования
+        self.needs_page = False
+        # Время, когда слот нашелся без вкладки (для задержки до брони)
+        self.found_at: Optional[float] = None
+        self.state = SUPPLY_STATES["NAVIGATE"]
+        if self.browserless:
+            self.state = SUPPLY_STATES["WAIT"] if bot.monitor else SUPPLY_STATES["OPEN_CALENDAR"]
+        self.page: Optional[Page] = None
+        self.task: Optional[asyncio.Task] = None
+        self.failures = defaultdict(int)
+        self.calendar_slots: List[dict] = []
+        self.best_block: Optional[dict] = None
+        self.detected_at: Optional[float] = None
+        # Горячий резерв календаря на вкладке поставки (без Monitor Bot)
+        self.standby: Optional[CalendarStandby] = None
+        # Слоты получены повтором запроса: ячейки в DOM от прошлого открытия
+        self.dom_stale = False
+
+        self.handlers = {
+            SUPPLY_STATES["NAVIGATE"]: self.navigate,
+            SUPPLY_STATES["VALIDATE"]: self.validate,
+            SUPPLY_STATES["OPEN_CALENDAR"]: self.open_calendar,
+            SUPPLY_STATES["SCAN"]: self.scan,
+            SUPPLY_STATES["BOOK"]: self.book,
+            SUPPLY_STATES["WAIT"]: self.wait,
+        }
+
+    def start(self) -> asyncio.Task:
+        # Задача копирует контекст логов: все записи поставки помечены
+        # селлером, заказом и складом без правки каждого сообщения
+        with logger.contextualize(
+            seller=self.bot.user_id,
+            preorder=self.preorder_id,
+            warehouse=self.warehouse,
+        ):
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def cancel(self) -> None:
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINAL_STATES
+
+    async def run(self) -> str:
+        try:
+            while not self.finished:
+                if not self.supply["status"]["active"]:
+                    logger.info(f"{self.preorder_id} - Поставка деактивирована")
+                    self.state = SUPPLY_STATES["CANCELLED"]
+                    break
+
+                started_at = time.perf_counter()
+                next_state = await self.handlers[self.state]()
+                self.observe(self.state, next_state, started_at)
+                if next_state != self.state:
+                    logger.debug(f"{self.preorder_id} - {self.state} -> {next_state}")
+                self.state = next_state
+
+        except asyncio.CancelledError:
+            self.state = SUPPLY_STATES["CANCELLED"]
+            raise
+
+        except Exception as e:
+            logger.error(f"{self.preorder_id} - Ошибка обработки поставки: {str(e)}")
+            self.state = SUPPLY_STATES["FAILED"]
+
+        finally:
+            await self.cleanup()
+
+        if self.state == SUPPLY_STATES["FAILED"]:
+            await self.bot.notification_sender(
+                f"Поставка {self.preorder_id} недоступна, обработка остановлена"
+            )
+        return self.state
+
+    def observe(self, state: str, next_state: str, started_at: float) -> None:
+        """Время этапа и переход в метрики, с метками селлера и склада"""
+        stage = TIMED_STAGES.get(state)
+        if stage is None:
+            return
+        labels = {"seller": self.bot.user_id, "warehouse": self.warehouse}
+        metrics.observe(
+            "megabot_stage_ms", (time.perf_counter() - started_at) * 1000, stage=stage, **labels
+        )
+        metrics.inc("megabot_stage_total", stage=stage, result=next_state, **labels)
+
+    def fail(self, state: str, next_state: str) -> str:
+        """Учет неудачи в бюджете состояния"""
+        self.failures[state] += 1
+        budget = SYSTEM_CONFIG["runner"]["retries"].get(state, 0)
+        if self.failures[state] > budget:
+            logger.error(
+                f"{self.preorder_id} - Исчерпан бюджет повторов {state}: {budget}"
+            )
+            return SUPPLY_STATES["FAILED"]
+
+        logger.info(
+            f"Попытка {self.failures[state]}/{budget}: повтор {state} для {self.preorder_id}"
+        )
+        return next_state
+
+    async def reset_page(self, healthy: bool = False) -> None:
+        """Вкладка в неизвестном состоянии закрывается, следующую дает пул"""
+        page, self.page = self.page, None
+        self.standby = None
+        await self.bot.pages.release(page, healthy=healthy)
+
+    async def navigate(self) -> str:
+        if self.page is None or self.page.is_closed():
+            self.page = await self.bot.pages.acquire(self.preorder_id)
+
+        if await self.bot.open_supply_by_id(supply=self.supply, page=self.page):
+            self.failures[SUPPLY_STATES["NAVIGATE"]] = 0
+            return SUPPLY_STATES["VALIDATE"]
+
+        await self.reset_page()
+        await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["WAIT_ANIMATION"])
+        return self.fail(SUPPLY_STATES["NAVIGATE"], SUPPLY_STATES["NAVIGATE"])
+
+    async def validate(self) -> str:
+        if await self.bot.validate_supply_data(self.page, self.supply):
+            self.failures[SUPPLY_STATES["VALIDATE"]] = 0
+            if self.bot.monitor and not self.browserless:
+                return SUPPLY_STATES["WAIT"]
+            return SUPPLY_STATES["OPEN_CALENDAR"]
+
+        logger.info(f"Перезапуск вкладки для {self.preorder_id}")
+        await self.reset_page()
+        return self.fail(SUPPLY_STATES["VALIDATE"], SUPPLY_STATES["NAVIGATE"])
+
+    async def open_calendar(self) -> str:
+        if self.browserless and not self.needs_page:
+            calendar_slots = await self.bot.fetch_calendar(self.supply)
+            if calendar_slots is None:
+                return self.fail(SUPPLY_STATES["OPEN_CALENDAR"], SUPPLY_STATES["WAIT"])
+            self.calendar_slots = calendar_slots
+            return SUPPLY_STATES["SCAN"]
+
+        if self.standby is not None:
+            calendar_slots = await self.standby.refresh()
+            if calendar_slots is not None:
+                self.calendar_slots = calendar_slots
+                self.dom_stale = True
+                return SUPPLY_STATES["SCAN"]
+
+        calendar_slots = await self.bot.open_calendar(self.page, self.supply)
+        if calendar_slots is not None:
+            self.calendar_slots = calendar_slots
+            self.dom_stale = False
+            if (
+                self.bot.monitor is None
+                and not self.browserless
+                and SYSTEM_CONFIG["standby"]["enabled"]
+            ):
+                self.standby = CalendarStandby(self.bot, self.page, self.supply)
+                self.standby.opened()
+            return SUPPLY_STATES["SCAN"]
+
+        # Вкладка в плохом состоянии - открываем поставку заново
+        await self.reset_page()
+        return self.fail(SUPPLY_STATES["OPEN_CALENDAR"], SUPPLY_STATES["NAVIGATE"])
+
+    async def scan(self) -> str:
+        target_slots = await self.bot.get_target_dates(
+            self.page, self.supply, self.calendar_slots
+        )
+        self.best_block = (
+            await self.bot.process_target_dates(self.page, target_slots, self.supply)
+            if target_slots
+            else None
+        )
+
+        # Полный цикл проверки прошел - сбрасываем счетчики неудач
+        self.failures.clear()
+        self.supply["status"]["attempts_count"] += 1
+        await self.bot.save_supply(self.supply)
+
+        if self.best_block:
+            if self.browserless and self.page is None:
+                # Слот найден запросом к API: ячейки для клика есть только во вкладке
+                return self.handoff()
+            # Календарь остается открытым: бронирование идет на этой же вкладке
+            self.detected_at = self.found_at or time.perf_counter()
+            if self.dom_stale:
+                return await self.reopen_for_booking()
+            return SUPPLY_STATES["BOOK"]
+
+        if self.standby is not None:
+            # Горячий резерв: модалка остается открытой до следующего скана
+            return SUPPLY_STATES["WAIT"]
+
+        if self.browserless:
+            if self.page is not None:
+                # Слот ушел, пока открывалась вкладка: дальше снова сканы без нее
+                return await self.release_page()
+            return SUPPLY_STATES["WAIT"]
+
+        if not await self.bot.close_calendar(self.page, self.supply):
+            await self.reset_page()
+            return SUPPLY_STATES["NAVIGATE"]
+        return SUPPLY_STATES["WAIT"]
+
+    def handoff(self) -> str:
+        """Слот найден без вкладки: страница поставки открывается под бронирование"""
+        self.needs_page = True
+        self.found_at = time.perf_counter()
+        return SUPPLY_STATES["NAVIGATE"]
+
+    async def release_page(self) -> str:
+        """Вкладка под бронь больше не нужна и возвращается в запас пула"""
+        self.needs_page = False
+        self.found_at = None
+        healthy = await self.bot.close_calendar(self.page, self.supply)
+        await self.reset_page(healthy=healthy)
+        return SUPPLY_STATES["WAIT"]
+
+    async def reopen_for_booking(self) -> str:
+        """Слот найден повтором запроса: переоткрытие модалки со свежими ячейками"""
+        await self.standby.close()
+        self.standby = None
+        self.dom_stale = False
+        calendar_slots = await self.bot.open_calendar(self.page, self.supply)
+        if calendar_slots is None:
+            await self.reset_page()
+            return self.fail(SUPPLY_STATES["OPEN_CALENDAR"], SUPPLY_STATES["NAVIGATE"])
+
+        target_slots = await self.bot.get_target_dates(self.page, self.supply, calendar_slots)
+        self.best_block = (
+            await self.bot.process_target_dates(self.page, target_slots, self.supply)
+            if target_slots
+            else None
+        )
+        metrics.observe(
+            "megabot_stage_ms",
+            (time.perf_counter() - self.detected_at) * 1000,
+            stage="standby_reopen",
+            seller=self.bot.user_id,
+            warehouse=self.warehouse,
+        )
+        if self.best_block is None:
+            # Слот ушел, пока модалка переоткрывалась
+            if not await self.bot.close_calendar(self.page, self.supply):
+                await self.reset_page()
+                return SUPPLY_STATES["NAVIGATE"]
+            return SUPPLY_STATES["WAIT"]
+        return SUPPLY_STATES["BOOK"]
+
+    async def book(self) -> str:
+        best_block = self.best_block
+        logger.info(
+            f"{self.preorder_id} - Запускаем бронирование: дата ({best_block['date']}), коэффициент = {best_block['coeff']}"
+        )
+
+        if not SYSTEM_CONFIG["runner"]["booking_enabled"]:
+            logger.warning(f"{self.preorder_id} - Бронирование отключено в настройках")
+            return SUPPLY_STATES["DONE"]
+
+        if await self.bot.book_slot(
+            self.page, self.supply, best_block, detected_at=self.detected_at
+        ):
+            return SUPPLY_STATES["DONE"]
+
+        await self.reset_page()
+        return self.fail(SUPPLY_STATES["BOOK"], SUPPLY_STATES["NAVIGATE"])
+
+    async def wait(self) -> str:
+        if self.bot.monitor:
+            await self.bot.wait_monitor_slot(self.supply)
+            if self.browserless:
+                return self.handoff()
+        else:
+            await asyncio.sleep(self.bot.poll_delay(self.supply))
+        return SUPPLY_STATES["OPEN_CALENDAR"]
+
+    async def cleanup(self) -> None:
+        if self.bot.monitor:
+            self.bot.monitor.unregister(self.supply)
+        await self.bot.save_supply(self.supply)
+        try:
+            # После брони вкладка исправна и возвращается в запас пула
+            await self.reset_page(healthy=self.state == SUPPLY_STATES["DONE"])
+        except Exception:
+            pass  # Контекст мог быть уже закрыт
+        logger.info(f"{self.preorder_id} - Обработка поставки завершена: {self.state}")
@@ -0,0 +1,369 @@
+import asyncio
+import copy
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.logger import logger
+from config import SYSTEM_CONFIG, USER_SUPPLIES, USER_TYPES
+
+# Запись об изменении: {"user_id": ..., "supply": {...}, "updated_at": float}
+SupplyChange = Dict
+# Поставки на границе курсора: preorder_id -> updated_at
+Boundary = Dict[str, float]
+
+
+def boundary_of(changes: List[SupplyChange], cursor: float) -> Boundary:
+    """Записи с updated_at == cursor: changes(cursor) вернет их снова"""
+    return {
+        change["supply"]["preorder_id"]: change["updated_at"]
+        for change in changes
+        if change["updated_at"] == cursor
+    }
+
+
+class SupplyStore(ABC):
+    """Хранилище поставок селлеров
+
+    Бот читает из хранилища только активные поставки при старте, а затем
+    забирает изменения по индексу updated_at (changes(since)), без полной
+    перезагрузки. Статус поставки (status) бот пишет сам через
+    save_status(), updated_at при этом не меняется - это поле двигают
+    только правки настроек со стороны сайта.
+    """
+
+    @abstractmethod
+    async def load_active(self) -> Tuple[Dict[str, List[dict]], float, Boundary]:
+        """Активные поставки по селлерам, курсор для changes() и записи на
+        границе курсора - они уже загружены и не должны применяться снова"""
+
+    @abstractmethod
+    async def changes(self, since: float) -> List[SupplyChange]:
+        """Поставки с updated_at >= since в порядке updated_at"""
+
+    @abstractmethod
+    async def save_status(self, user_id: str, supply: dict) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemorySupplyStore(SupplyStore):
+    """Хранилище в памяти (тесты и запуск на USER_SUPPLIES из конфига)"""
+
+    def __init__(self, users: Optional[List[dict]] = None):
+        self.records: Dict[str, SupplyChange] = {}
+        now = time.time()
+        for user_data in users or []:
+            for supply in user_data["supplies"]:
+                self.records[supply["preorder_id"]] = {
+                    "user_id": user_data["user_id"],
+                    "supply": copy.deepcopy(supply),
+                    "updated_at": now,
+                }
+
+    async def upsert(self, user_id: str, supply: dict) -> None:
+        """Правка поставки со стороны сайта: двигает updated_at"""
+        self.records[supply["preorder_id"]] = {
+            "user_id": user_id,
+            "supply": copy.deepcopy(supply),
+            "updated_at": time.time(),
+        }
+
+    async def load_active(self) -> Tuple[Dict[str, List[dict]], float, Boundary]:
+        users: Dict[str, List[dict]] = {}
+        cursor = 0.0
+        for record in self.records.values():
+            cursor = max(cursor, record["updated_at"])
+            if record["supply"]["status"]["active"]:
+                users.setdefault(record["user_id"], []).append(
+                    copy.deepcopy(record["supply"])
+                )
+        return users, cursor, boundary_of(list(self.records.values()), cursor)
+
+    async def changes(self, since: float) -> List[SupplyChange]:
+        changed = [
+            copy.deepcopy(record)
+            for record in self.records.values()
+            if record["updated_at"] >= since
+        ]
+        return sorted(changed, key=lambda record: record["updated_at"])
+
+    async def save_status(self, user_id: str, supply: dict) -> None:
+        record = self.records.get(supply["preorder_id"])
+        if record:
+            record["supply"]["status"] = copy.deepcopy(supply["status"])
+
+
+class SQLiteSupplyStore(SupplyStore):
+    """Хранилище в SQLite: поставка - строка, настройки и статус в JSON"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS supplies (
+            preorder_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            status TEXT NOT NULL,
+            active INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS supplies_updated_at ON supplies (updated_at);
+        CREATE INDEX IF NOT EXISTS supplies_active ON supplies (active);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(self.SCHEMA)
+        # Одно соединение на процесс, запросы идут в потоке по очереди
+        self.lock = asyncio.Lock()
+
+    async def _execute(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
+        def run() -> List[sqlite3.Row]:
+            with self.connection:
+                return self.connection.execute(query, params).fetchall()
+
+        async with self.lock:
+            return await asyncio.to_thread(run)
+
+    @staticmethod
+    def _row_to_change(row: sqlite3.Row) -> SupplyChange:
+        supply = json.loads(row["data"])
+        supply["status"] = json.loads(row["status"])
+        return {
+            "user_id": row["user_id"],
+            "supply": supply,
+            "updated_at": row["updated_at"],
+        }
+
+    def is_empty(self) -> bool:
+        return self.connection.execute("SELECT 1 FROM supplies LIMIT 1").fetchone() is None
+
+    async def upsert(self, user_id: str, supply: dict) -> None:
+        """Правка поставки со стороны сайта: двигает updated_at"""
+        data = {key: value for key, value in supply.items() if key != "status"}
+        await self._execute(
+            """
+            INSERT INTO supplies (preorder_id, user_id, data, status, active, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (preorder_id) DO UPDATE SET
+                user_id = excluded.user_id,
+                data = excluded.data,
+                status = excluded.status,
+                active = excluded.active,
+                updated_at = excluded.updated_at
+            """,
+            (
+                supply["preorder_id"],
+                user_id,
+                json.dumps(data, ensure_ascii=False),
+                json.dumps(supply["status"], ensure_ascii=False),
+                int(supply["status"]["active"]),
+                time.time(),
+            ),
+        )
+
+    async def load_active(self) -> Tuple[Dict[str, List[dict]], float, Boundary]:
+        users: Dict[str, List[dict]] = {}
+        for row in await self._execute("SELECT * FROM supplies WHERE active = 1"):
+            change = self._row_to_change(row)
+            users.setdefault(change["user_id"], []).append(change["supply"])
+
+        boundary_rows = await self._execute(
+            """
+            SELECT preorder_id, updated_at FROM supplies
+            WHERE updated_at = (SELECT MAX(updated_at) FROM supplies)
+            """
+        )
+        cursor = boundary_rows[0]["updated_at"] if boundary_rows else 0.0
+        return users, cursor, {row["preorder_id"]: row["updated_at"] for row in boundary_rows}
+
+    async def changes(self, since: float) -> List[SupplyChange]:
+        rows = await self._execute(
+            "SELECT * FROM supplies WHERE updated_at >= ? ORDER BY updated_at",
+            (since,),
+        )
+        return [self._row_to_change(row) for row in rows]
+
+    async def save_status(self, user_id: str, supply: dict) -> None:
+        await self._execute(
+            "UPDATE supplies SET status = ?, active = ? WHERE preorder_id = ?",
+            (
+                json.dumps(supply["status"], ensure_ascii=False),
+                int(supply["status"]["active"]),
+                supply["preorder_id"],
+            ),
+        )
+
+    async def close(self) -> None:
+        self.connection.close()
+
+
+class MongoSupplyStore(SupplyStore):
+    """Поставки из MongoDB сайта: User.sellers[].supplies[]
+
+    updatedAt поставки ставит mongoose (timestamps) при правке на сайте.
+    Статус бот пишет напрямую через pymongo, updatedAt при этом не меняется.
+    Тариф (User.user_type) хранится на пользователе и переносится в каждую
+    его поставку, как user_type поставок из конфига и SQLite.
+    """
+
+    def __init__(self, uri: str, db_name: str):
+        try:
+            from pymongo import MongoClient
+        except ImportError as e:
+            raise RuntimeError(
+                "Для хранилища mongo нужен пакет pymongo: pip install pymongo"
+            ) from e
+
+        self.client = MongoClient(uri, tz_aware=True)
+        self.users = self.client[db_name]["users"]
+        self.users.create_index("sellers.supplies.updatedAt")
+
+    @staticmethod
+    def _to_change(doc: dict) -> SupplyChange:
+        supply = doc["supply"]
+        updated_at = supply.pop("updatedAt", None)
+        supply.pop("createdAt", None)
+        supply["user_type"] = doc.get("user_type") or USER_TYPES["USER_FREE"]
+        return {
+            "user_id": doc["user_id"],
+            "supply": supply,
+            "updated_at": updated_at.timestamp() if updated_at else 0.0,
+        }
+
+    def _aggregate(self, match: dict) -> List[SupplyChange]:
+        pipeline = [
+            {"$match": match},
+            {"$unwind": "$sellers"},
+            {"$unwind": "$sellers.supplies"},
+            {"$match": match},
+            {
+                "$project": {
+                    "_id": 0,
+                    "user_id": "$sellers.seller_id",
+                    "user_type": "$user_type",
+                    "supply": "$sellers.supplies",
+                }
+            },
+            {"$sort": {"supply.updatedAt": 1}},
+        ]
+        return [self._to_change(doc) for doc in self.users.aggregate(pipeline)]
+
+    async def load_active(self) -> Tuple[Dict[str, List[dict]], float, Boundary]:
+        changes = await asyncio.to_thread(
+            self._aggregate, {"sellers.supplies.status.active": True}
+        )
+        users: Dict[str, List[dict]] = {}
+        for change in changes:
+            users.setdefault(change["user_id"], []).append(change["supply"])
+
+        cursor = max((change["updated_at"] for change in changes), default=0.0)
+        return users, cursor, boundary_of(changes, cursor)
+
+    async def changes(self, since: float) -> List[SupplyChange]:
+        since_dt = datetime.fromtimestamp(since, tz=timezone.utc)
+        return await asyncio.to_thread(
+            self._aggregate, {"sellers.supplies.updatedAt": {"$gte": since_dt}}
+        )
+
+    async def save_status(self, user_id: str, supply: dict) -> None:
+        await asyncio.to_thread(
+            self.users.update_one,
+            {"sellers.seller_id": user_id},
+            {"$set": {"sellers.$[seller].supplies.$[supply].status": supply["status"]}},
+            array_filters=[
+                {"seller.seller_id": user_id},
+                {"supply._id": supply["_id"]},
+            ],
+        )
+
+    async def close(self) -> None:
+        self.client.close()
+
+
+async def create_store(seed: bool = True) -> SupplyStore:
+    """Хранилище по SYSTEM_CONFIG["store"]["backend"]
+
+    seed - перенос тестовых поставок в пустую SQLite. Воркеры супервизора
+    открывают хранилище без него: базу заполняет супервизор до их старта.
+    """
+    config = SYSTEM_CONFIG["store"]
+    backend = config["backend"]
+
+    if backend == "memory":
+        return MemorySupplyStore(USER_SUPPLIES)
+
+    if backend == "sqlite":
+        store = SQLiteSupplyStore(config["sqlite_path"])
+        if seed and store.is_empty():
+            # Первый запуск: переносим тестовые поставки из конфига
+            for user_data in USER_SUPPLIES:
+                for supply in user_data["supplies"]:
+                    await store.upsert(user_data["user_id"], supply)
+            logger.info(f"Хранилище поставок создано: {config['sqlite_path']}")
+        return store
+
+    if backend == "mongo":
+        return MongoSupplyStore(config["mongo_uri"], config["mongo_db"])
+
+    raise ValueError(f"Неизвестное хранилище поставок: {backend}")
+
+
+class SupplySync:
+    """Применение изменений поставок из хранилища без полной перезагрузки
+
+    Раз в SUPPLY_SYNC_INTERVAL забирает поставки с updated_at >= курсора.
+    Записи на границе курсора, уже примененные в прошлый раз или
+    загруженные load_active() (boundary), пропускаются.
+    """
+
+    def __init__(self, store: SupplyStore, cursor: float, boundary: Optional[Boundary] = None):
+        self.store = store
+        self.cursor = cursor
+        self.seen: Boundary = dict(boundary or {})
+
+    async def poll(self) -> List[SupplyChange]:
+        fresh = [
+            change
+            for change in await self.store.changes(self.cursor)
+            if self.seen.get(change["supply"]["preorder_id"]) != change["updated_at"]
+        ]
+        if not fresh:
+            return []
+
+        cursor = fresh[-1]["updated_at"]
+        if cursor != self.cursor:
+            # Курсор сдвинулся: записи на старой границе больше не вернутся
+            self.seen = {}
+            self.cursor = cursor
+        self.seen.update(
+            {
+                change["supply"]["preorder_id"]: change["updated_at"]
+                for change in fresh
+                if change["updated_at"] == cursor
+            }
+        )
+        return fresh
+
+    async def run(self, apply: Callable[[SupplyChange], Awaitable[None]]) -> None:
+        while True:
+            await asyncio.sleep(SYSTEM_CONFIG["timeouts"]["SUPPLY_SYNC_INTERVAL"])
+            try:
+                changes = await self.poll()
+            except Exception as e:
+                logger.error(f"Ошибка чтения изменений поставок: {str(e)}")
+                continue
+
+            for change in changes:
+                try:
+                    await apply(change)
+                except Exception as e:
+                    logger.error(
+                        f"Ошибка применения изменения поставки {change['supply']['preorder_id']}: {str(e)}"
+                    )
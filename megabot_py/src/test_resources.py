@@ -1,94 +1,266 @@
 import asyncio
+import csv
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict, List
+
 import psutil
-import time
-from bot import MEGABOT
+
 from utils.logger import logger
-import os
-from datetime import datetime
-import logging
-
-# Создаем отдельный логгер для метрик
-metrics_logger = logging.getLogger("metrics")
-metrics_logger.setLevel(logging.INFO)
-
-# Создаем директорию для логов метрик если её нет
-metrics_dir = Path("metrics_logs")
-metrics_dir.mkdir(exist_ok=True)
-
-# Создаем файл лога с текущей датой
-metrics_file = (
-    metrics_dir / f"metrics_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log"
-)
-file_handler = logging.FileHandler(metrics_file, encoding="utf-8")
-file_handler.setFormatter(logging.Formatter("%(asctime)s | %(message)s"))
-metrics_logger.addHandler(file_handler)
-
-
-async def monitor_resources(duration_minutes: int = 15):
-    metrics_logger.info("Начинаем мониторинг ресурсов")
-    process = psutil.Process(os.getpid())
-    start_time = time.time()
-
-    # Начальные значения счетчиков
-    start_io = process.io_counters()
-    start_cpu_time = process.cpu_times()
-    start_net = psutil.net_io_counters()
-
-    # Запускаем бота
-    logger.info("Запускаем бота...")
-    bot = MEGABOT(user_id="30822")
-    await bot.init_browser()
-    bot_task = asyncio.create_task(bot.create_supply(user_id="30822"))
+from config import SYSTEM_CONFIG
+from bench_e2e import make_supply, register_seller, use_temp_sessions
+from bot import MEGABOT
+from browser_pool import BrowserPool
+from metrics import metrics
+from mock_portal import MockPortal
+from monitor import CalendarMonitor
+from slots import format_date
+
+# Нагрузка растет ступенями: всего поставок на ступени
+STEPS = [5, 10, 20, 40, 80, 160]
+SUPPLIES_PER_SELLER = 5
+WAREHOUSES = [f"Склад {number}" for number in range(1, 11)]
+STEP_WARMUP = 60  # секунды: новые селлеры входят и открывают поставки
+STEP_DURATION = 120  # секунды замера на ступени
+SAMPLE_INTERVAL = 5  # секунды между замерами процессов
+# Колено: p99 снимка календаря выросло во столько раз от первой ступени
+KNEE_FACTOR = 2.0
+# ...или занято больше этой доли ядер машины
+KNEE_CPU_SHARE = 0.9
+
+RESULTS_DIR = Path("metrics_logs")
 
+
+def process_group(process: psutil.Process) -> str:
+    """Группа процесса для учета ресурсов: python, playwright или тип процесса Chromium"""
     try:
-        while (time.time() - start_time) < (duration_minutes * 60):
-            # Текущие метрики
-            current_io = process.io_counters()
-            current_cpu = process.cpu_percent()
-            current_net = psutil.net_io_counters()
-            memory = process.memory_info()
-
-            metrics_logger.info(
-                f"=== Текущие метрики ===\n"
-                f"CPU: {current_cpu}%\n"
-                f"RAM: {memory.rss / 1024 / 1024:.1f} MB\n"
-                f"Диск чтение: {(current_io.read_bytes - start_io.read_bytes) / 1024 / 1024:.1f} MB\n"
-                f"Диск запись: {(current_io.write_bytes - start_io.write_bytes) / 1024 / 1024:.1f} MB\n"
-                f"Сеть входящий: {(current_net.bytes_recv - start_net.bytes_recv) / 1024 / 1024:.1f} MB\n"
-                f"Сеть исходящий: {(current_net.bytes_sent - start_net.bytes_sent) / 1024 / 1024:.1f} MB\n"
-                f"Потоки: {process.num_threads()}\n"
-                f"Время работы: {(time.time() - start_time) / 60:.1f} мин"
+        name = process.name().lower()
+        if "python" in name:
+            return "python"
+        if "node" in name:
+            return "playwright"
+        cmdline = " ".join(process.cmdline())
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return "other"
+
+    if "--type=renderer" in cmdline:
+        return "chromium_renderer"
+    if "--type=" in cmdline:
+        return "chromium_service"  # gpu, network, utility, zygote
+    if "chrom" in name or "headless_shell" in name:
+        return "chromium_browser"
+    return "other"
+
+
+class ResourceSampler:
+    """CPU и память процесса бота и всех дочерних процессов по группам
+
+    CPU считается по разнице cpu_times каждого pid между замерами,
+    память - PSS (доля общих страниц Chromium не считается дважды),
+    если ОС его отдает, иначе RSS.
+    """
+
+    def __init__(self):
+        self.process = psutil.Process(os.getpid())
+        self.groups: Dict[int, str] = {}
+
+    def processes(self) -> List[psutil.Process]:
+        return [self.process] + self.process.children(recursive=True)
+
+    def cpu_seconds(self) -> Dict[int, float]:
+        """Процессорное время по pid (user + system)"""
+        result = {}
+        for process in self.processes():
+            try:
+                times = process.cpu_times()
+                result[process.pid] = times.user + times.system
+                if process.pid not in self.groups:
+                    self.groups[process.pid] = process_group(process)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return result
+
+    def memory(self) -> Dict[str, dict]:
+        """Память по группам: {"python": {"rss", "pss", "processes"}, ...}"""
+        result = defaultdict(lambda: {"rss": 0, "pss": 0, "processes": 0})
+        for process in self.processes():
+            try:
+                group = self.groups.get(process.pid) or process_group(process)
+                try:
+                    info = process.memory_full_info()
+                    pss = getattr(info, "pss", info.rss)
+                except psutil.AccessDenied:
+                    info = process.memory_info()
+                    pss = info.rss
+            except psutil.NoSuchProcess:
+                continue
+            result[group]["rss"] += info.rss
+            result[group]["pss"] += pss
+            result[group]["processes"] += 1
+        return dict(result)
+
+    def cpu_by_group(self, start: Dict[int, float], end: Dict[int, float]) -> Dict[str, float]:
+        result = defaultdict(float)
+        for pid, seconds in end.items():
+            result[self.groups.get(pid, "other")] += seconds - start.get(pid, 0.0)
+        return dict(result)
+
+
+class FleetLoadTest:
+    """Ступенчатая нагрузка: N селлеров × M поставок на моке портала"""
+
+    def __init__(self):
+        self.portal = MockPortal()
+        self.pool = BrowserPool()
+        self.monitor = CalendarMonitor() if SYSTEM_CONFIG["monitor"]["enabled"] else None
+        self.sampler = ResourceSampler()
+        self.bots: List[MEGABOT] = []
+        self.results: List[dict] = []
+        self.day = None
+
+    async def start(self) -> None:
+        await self.portal.start()
+        self.portal.patch_config()
+        await self.pool.start()
+        # Платные слоты на всех складах: календарь заполнен, но бесплатных дат нет,
+        # поставки сканируют без бронирования до конца теста
+        self.day = self.portal.today + timedelta(days=7)
+        for warehouse in WAREHOUSES:
+            for offset in range(0, 14, 2):
+                self.portal.release(warehouse, self.portal.today + timedelta(days=offset), coeff=20)
+
+    async def add_sellers(self, supplies_total: int) -> None:
+        """Новые селлеры до supplies_total поставок в сумме"""
+        while len(self.bots) * SUPPLIES_PER_SELLER < supplies_total:
+            seller_number = len(self.bots)
+            inn = f"78{seller_number:010d}"
+            await register_seller(self.portal, inn)
+
+            supplies = []
+            for supply_number in range(SUPPLIES_PER_SELLER):
+                preorder_id = f"{seller_number + 1}{supply_number:05d}"
+                warehouse = WAREHOUSES[(seller_number + supply_number) % len(WAREHOUSES)]
+                self.portal.add_supply(inn, preorder_id, warehouse)
+                supplies.append(make_supply(preorder_id, warehouse, format_date(self.day)))
+
+            bot = MEGABOT(inn, monitor=self.monitor)
+            if not await bot.init_browser(self.pool):
+                raise RuntimeError(f"{inn} - бот не запустился")
+            self.bots.append(bot)
+            await bot.create_supply(inn, supplies)
+
+    async def measure_step(self, supplies_total: int) -> dict:
+        await self.add_sellers(supplies_total)
+        await asyncio.sleep(STEP_WARMUP)
+
+        cpu_start = self.sampler.cpu_seconds()
+        snapshots_start = metrics.merged("megabot_calendar_snapshot_ms")
+        bytes_start = (self.portal.bytes_received, self.portal.bytes_sent)
+        started_at = time.perf_counter()
+
+        peak = {}
+        while time.perf_counter() - started_at < STEP_DURATION:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            memory = self.sampler.memory()
+            if sum(group["pss"] for group in memory.values()) > sum(
+                group["pss"] for group in peak.values()
+            ):
+                peak = memory
+
+        elapsed = time.perf_counter() - started_at
+        cpu = self.sampler.cpu_by_group(cpu_start, self.sampler.cpu_seconds())
+        snapshots = metrics.merged("megabot_calendar_snapshot_ms").since(snapshots_start)
+        cores = sum(cpu.values()) / elapsed
+        pss_gb = sum(group["pss"] for group in peak.values()) / 1024**3
+
+        result = {
+            "supplies": supplies_total,
+            "sellers": len(self.bots),
+            "cores": round(cores, 2),
+            "pss_mb": round(pss_gb * 1024),
+            "rss_mb": round(sum(group["rss"] for group in peak.values()) / 1024**2),
+            "supplies_per_core": round(supplies_total / cores, 1) if cores else None,
+            "supplies_per_gb": round(supplies_total / pss_gb, 1) if pss_gb else None,
+            "snapshots": snapshots.count,
+            "snapshot_p50_ms": snapshots.summary()["p50"],
+            "snapshot_p99_ms": snapshots.summary()["p99"],
+            "net_in_kbps": round((self.portal.bytes_received - bytes_start[0]) / elapsed / 1024, 1),
+            "net_out_kbps": round((self.portal.bytes_sent - bytes_start[1]) / elapsed / 1024, 1),
+        }
+        for group, seconds in sorted(cpu.items()):
+            result[f"cpu_{group}"] = round(seconds / elapsed, 3)
+        for group, values in sorted(peak.items()):
+            result[f"pss_{group}_mb"] = round(values["pss"] / 1024**2)
+
+        logger.info(f"Ступень {supplies_total} поставок: {result}")
+        return result
+
+    def find_knee(self) -> dict:
+        """Первая ступень, где снимок календаря заметно замедлился или кончился CPU"""
+        cpu_limit = psutil.cpu_count() * KNEE_CPU_SHARE
+        baseline = self.results[0]["snapshot_p99_ms"] if self.results else None
+        for result in self.results:
+            if result["cores"] >= cpu_limit:
+                return {"supplies": result["supplies"], "reason": "cpu"}
+            if baseline and result["snapshot_p99_ms"] and (
+                result["snapshot_p99_ms"] > baseline * KNEE_FACTOR
+            ):
+                return {"supplies": result["supplies"], "reason": "snapshot_p99"}
+        return {"supplies": None, "reason": "не достигнуто"}
+
+    def write_results(self) -> Path:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"fleet_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
+        fields = []
+        for result in self.results:
+            fields.extend(field for field in result if field not in fields)
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.results)
+        return path
+
+    async def run(self) -> None:
+        await self.start()
+        try:
+            for supplies_total in STEPS:
+                if supplies_total / SUPPLIES_PER_SELLER > (
+                    self.pool.browsers_count * self.pool.max_contexts_per_browser
+                ):
+                    logger.warning(f"Ступень {supplies_total}: пул браузеров заполнен, стоп")
+                    break
+                self.results.append(await self.measure_step(supplies_total))
+        finally:
+            for bot in self.bots:
+                await bot.close()
+            if self.monitor:
+                await self.monitor.stop()
+            await self.pool.stop()
+            await self.portal.stop()
+
+        logger.info("Поставок | ядер | PSS МБ | поставок/ядро | поставок/ГБ | снимок p99 мс")
+        for result in self.results:
+            logger.info(
+                f"{result['supplies']:8} | {result['cores']:5} | {result['pss_mb']:6} | "
+                f"{result['supplies_per_core']} | {result['supplies_per_gb']} | "
+                f"{result['snapshot_p99_ms']}"
             )
-            await asyncio.sleep(10)
+        logger.info(f"Колено нагрузки: {self.find_knee()}")
+        logger.info(f"Результаты: {self.write_results()}")
 
-    except KeyboardInterrupt:
-        metrics_logger.info("Тест остановлен пользователем")
+
+async def main():
+    """Нагрузочный тест флота для оценки мощности сервера (desc/server_res.md)"""
+    tmp_dir = use_temp_sessions()
+    SYSTEM_CONFIG["browser"]["headless"] = True
+    try:
+        await FleetLoadTest().run()
     finally:
-        # Получаем конечные значения
-        end_io = process.io_counters()
-        end_cpu_time = process.cpu_times()
-        end_net = psutil.net_io_counters()
-        total_time = (time.time() - start_time) / 3600  # в часах
-
-        metrics_logger.info(
-            "\n=== ИТОГОВОЕ ПОТРЕБЛЕНИЕ РЕСУРСОВ ===\n"
-            f"Время работы: {total_time:.2f} часов\n"
-            f"CPU время: {sum(end_cpu_time) - sum(start_cpu_time):.1f} сек\n"
-            f"Пиковая RAM: {memory.rss / 1024 / 1024:.1f} MB\n"
-            f"Диск чтение: {(end_io.read_bytes - start_io.read_bytes) / 1024 / 1024:.1f} MB\n"
-            f"Диск запись: {(end_io.write_bytes - start_io.write_bytes) / 1024 / 1024:.1f} MB\n"
-            f"Сеть входящий: {(end_net.bytes_recv - start_net.bytes_recv) / 1024 / 1024:.1f} MB\n"
-            f"Сеть исходящий: {(end_net.bytes_sent - start_net.bytes_sent) / 1024 / 1024:.1f} MB\n"
-            f"Финальное число потоков: {process.num_threads()}"
-        )
-
-        # Останавливаем бота
-        bot_task.cancel()
-        await bot.close()
-        metrics_logger.info("Тест завершен")
+        tmp_dir.cleanup()
 
 
 if __name__ == "__main__":
-    metrics_logger.info("Запускаем тест потребления ресурсов")
-    asyncio.run(monitor_resources(10))  # Тест на 15 минут
+    asyncio.run(main())
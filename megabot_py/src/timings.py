@@ -0,0 +1,55 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class StepTimer:
+    """Отметки времени шагов в миллисекундах от стартовой отметки
+
+    timer = StepTimer("detected", started_at=...)
+    timer.mark("selected")
+    timer.summary() -> "detected→selected 85 ms, всего 85 ms"
+    """
+
+    def __init__(self, first_step: str, started_at: Optional[float] = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.marks: List[Tuple[str, float]] = [(first_step, self.started_at)]
+
+    def mark(self, step: str) -> float:
+        """Отметка шага, возвращает мс с предыдущего шага"""
+        now = time.perf_counter()
+        elapsed = (now - self.marks[-1][1]) * 1000
+        self.marks.append((step, now))
+        return elapsed
+
+    @property
+    def last_step(self) -> str:
+        return self.marks[-1][0]
+
+    def total_ms(self) -> float:
+        return (self.marks[-1][1] - self.started_at) * 1000
+
+    def elapsed_ms(self, step: str) -> Optional[float]:
+        """Мс от стартовой отметки до шага step, None - шага не было"""
+        for name, at in self.marks:
+            if name == step:
+                return (at - self.started_at) * 1000
+        return None
+
+    def durations(self) -> Dict[str, float]:
+        """Мс каждого шага по имени его отметки: {"selected": 85.2, ...}"""
+        return {
+            step: (at - prev_at) * 1000
+            for (_, prev_at), (step, at) in zip(self.marks, self.marks[1:])
+        }
+
+    def steps(self) -> Dict[str, float]:
+        """Длительность каждого шага: {"detected→selected": 85.2, ...}"""
+        return {
+            f"{prev_step}→{step}": round((at - prev_at) * 1000, 1)
+            for (prev_step, prev_at), (step, at) in zip(self.marks, self.marks[1:])
+        }
+
+    def summary(self) -> str:
+        parts = [f"{name} {ms:.0f} ms" for name, ms in self.steps().items()]
+        parts.append(f"всего {self.total_ms():.0f} ms")
+        return ", ".join(parts)
@@ -1,16 +1,92 @@
 from loguru import logger
+import json
 import sys
+import time
+import traceback
+
+from config import SYSTEM_CONFIG
+
+LOG_CONFIG = SYSTEM_CONFIG["logging"]
+
+# Поля контекста в каждой записи (logger.contextualize / logger.bind)
+CONTEXT_FIELDS = ("seller", "preorder", "warehouse")
+
+
+class LogSampler:
+    """Ограничение частоты повторяющихся сообщений скана
+
+    Сообщения с logger.bind(sample="<тип>") пропускаются не чаще limit раз
+    за window секунд на пару (тип, поставка). Первая запись нового окна
+    получает extra["suppressed"] - сколько записей было отброшено.
+    Остальные записи проходят без ограничений.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.windows = {}
+
+    def __call__(self, record) -> bool:
+        sample = record["extra"].get("sample")
+        if sample is None:
+            return True
+
+        key = (sample, record["extra"].get("preorder"))
+        now = time.monotonic()
+        started_at, count, suppressed = self.windows.get(key, (now, 0, 0))
+        if now - started_at >= self.window:
+            if suppressed:
+                record["extra"]["suppressed"] = suppressed
+            started_at, count, suppressed = now, 0, 0
+
+        if count >= self.limit:
+            self.windows[key] = (started_at, count, suppressed + 1)
+            return False
+
+        self.windows[key] = (started_at, count + 1, suppressed)
+        return True
+
+
+def json_format(record) -> str:
+    """Компактная JSON-строка записи для файлового sink"""
+    extra = record["extra"]
+    data = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "function": record["function"],
+        "line": record["line"],
+    }
+    for field, value in extra.items():
+        if field != "json" and value is not None:
+            data[field] = value
+    if record["exception"]:
+        type_, value, tb = record["exception"]
+        data["exception"] = str(value)
+        # Полный стек одной строкой JSON: функция format не добавляет его сама
+        data["traceback"] = "".join(traceback.format_exception(type_, value, tb))
+
+    extra["json"] = json.dumps(data, ensure_ascii=False, default=str)
+    return "{extra[json]}\n"
+
 
 # Настройка логгера
 logger.remove()  # Удаляем стандартный handler
+logger.configure(extra={field: None for field in CONTEXT_FIELDS})
+# enqueue: запись в sink идет в отдельном потоке, цикл событий не ждет диск
 logger.add(
     sys.stdout,
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO"
+    level=LOG_CONFIG["console_level"],
+    filter=LogSampler(LOG_CONFIG["sample_limit"], LOG_CONFIG["sample_window"]),
+    enqueue=LOG_CONFIG["enqueue"],
 )
 logger.add(
-    "logs/mega_bot_{time}.log",
+    "logs/mega_bot_{time}.jsonl" if LOG_CONFIG["json"] else "logs/mega_bot_{time}.log",
     rotation="1 day",
     retention="7 days",
-    level="DEBUG"
+    level=LOG_CONFIG["file_level"],
+    filter=LogSampler(LOG_CONFIG["sample_limit"], LOG_CONFIG["sample_window"]),
+    enqueue=LOG_CONFIG["enqueue"],
+    **({"format": json_format} if LOG_CONFIG["json"] else {}),
 )
@@ -0,0 +1,35 @@
+import pytest
+
+from config import BOOKING_MODES, BOOKING_PRIORITIES, COEFF_VALUES, USER_TYPES
+
+
+@pytest.fixture
+def make_supply():
+    """Поставка с настройками бронирования, как в USER_SUPPLIES"""
+
+    def make(
+        preorder_id: str = "1000001",
+        warehouse: str = "Коледино",
+        target_dates=None,
+        target_coeff=COEFF_VALUES["COEFF_FREE"],
+        priority=BOOKING_PRIORITIES["BY_LOWER_COEFF"],
+        active: bool = True,
+    ) -> dict:
+        return {
+            "supply_id": None,
+            "user_type": USER_TYPES["USER_PAID"],
+            "preorder_id": preorder_id,
+            "warehouse_name": warehouse,
+            "warehouse_id": "",
+            "booking_settings": {
+                "mode": BOOKING_MODES["SPECIFIC_DATES"]
+                if target_dates is not None
+                else BOOKING_MODES["ANY_DATE"],
+                "target_dates": target_dates,
+                "priority": priority,
+                "target_coeff": target_coeff,
+            },
+            "status": {"active": active, "booked": False, "attempts_count": 0},
+        }
+
+    return make
@@ -0,0 +1,86 @@
+"""Бот на моке портала: вход по сохраненной сессии, скан, обнаружение, бронь"""
+
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from cryptography.fernet import Fernet
+
+pytest.importorskip("playwright")
+
+import config
+from config import COEFF_VALUES, SUPPLY_STATES, SYSTEM_CONFIG
+from bot import MEGABOT
+from browser_pool import BrowserPool
+from mock_portal import MockPortal
+from monitor import CalendarMonitor
+from session_vault import SessionVault
+from slots import format_date
+
+RELEASE_AT = 3  # секунды от старта мока
+TIMEOUT = 90  # секунды до брони
+
+
+@pytest.fixture
+def e2e_config(tmp_path, monkeypatch):
+    """Сессии и история во временной папке, быстрый лимит запросов, headless"""
+    monkeypatch.setattr(config, "COOKIES_DIR", tmp_path / "cookies")
+    monkeypatch.setenv(SYSTEM_CONFIG["session_vault"]["key_env"], Fernet.generate_key().decode())
+    monkeypatch.setitem(SYSTEM_CONFIG["slot_history"], "dir", str(tmp_path / "slot_history"))
+    monkeypatch.setitem(SYSTEM_CONFIG["governor"], "requests_per_minute", 120)
+    monkeypatch.setitem(SYSTEM_CONFIG["browser"], "headless", True)
+    monkeypatch.setitem(SYSTEM_CONFIG["runner"], "booking_enabled", True)
+
+
+async def book_on_mock(make_supply) -> tuple:
+    portal = MockPortal()
+    await portal.start()
+    portal.patch_config()
+    inn = "770000000001"
+    token = portal.add_seller(inn)
+    # Свежая сессия: бот не проверяет ИНН на карточке поставщика
+    await SessionVault(inn).save(portal.login_state(inn, token))
+
+    day = portal.today + timedelta(days=7)
+    portal.add_supply(inn, "1000001", "Коледино")
+    # Платная дата раньше бесплатной: поставка ее пропускает
+    portal.schedule(RELEASE_AT - 1, "release", "Коледино", day - timedelta(days=1), coeff=5)
+    portal.schedule(RELEASE_AT, "release", "Коледино", day, coeff=0)
+    supply = make_supply(
+        "1000001", target_dates=[format_date(day)], target_coeff=COEFF_VALUES["COEFF_FREE"]
+    )
+
+    monitor = CalendarMonitor()
+    pool = BrowserPool()
+    await pool.start()
+    bot = MEGABOT(inn, monitor=monitor)
+    try:
+        assert await bot.init_browser(pool)
+        await bot.create_supply(inn, [supply])
+        [runner] = bot.runners.values()
+        deadline = time.perf_counter() + TIMEOUT
+        while not runner.finished and time.perf_counter() < deadline:
+            await asyncio.sleep(0.5)
+        state = runner.state
+    finally:
+        await bot.close()
+        await monitor.stop()
+        await pool.stop()
+        await portal.stop()
+    return portal, day, supply, state
+
+
+def test_bot_books_released_slot(e2e_config, make_supply):
+    portal, day, supply, state = asyncio.run(book_on_mock(make_supply))
+
+    booking = portal.bookings.get("1000001")
+    assert booking is not None, portal.stats()
+    assert booking["date"] == format_date(day)
+    assert booking["coeff"] == 0
+    assert booking["booked_at"] >= portal.released_at[("Коледино", format_date(day))]
+    assert portal.booking_conflicts == 0
+    # Бот дождался страницы поставки и записал ее номер
+    assert state == SUPPLY_STATES["DONE"]
+    assert supply["status"]["booked"]
+    assert supply["status"]["supply_id"] == booking["supply_id"]
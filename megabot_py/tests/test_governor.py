@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from governor import RequestGovernor, TokenBucket
+
+
+def governor(rate_per_minute: float, capacity: float = 2, tokens: float = None) -> RequestGovernor:
+    bucket = TokenBucket(rate_per_minute, capacity)
+    if tokens is not None:
+        bucket.tokens = tokens
+    return RequestGovernor("test", [bucket])
+
+
+def test_bucket_wait_time():
+    bucket = TokenBucket(60, 2)
+    bucket.tokens = 0.5
+    assert bucket.wait_time(0.5) == 0
+    assert bucket.wait_time(1.5) == pytest.approx(1.0, abs=0.05)
+
+
+def test_scans_leave_booking_reserve():
+    """Скан не берет последний токен корзины, бронирование берет его сразу"""
+
+    async def run():
+        gov = governor(0.6)  # токен раз в 100 секунд
+        assert await gov.acquire("scan") < 0.1
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(gov.acquire("scan"), timeout=0.2)
+        assert await gov.acquire("book") < 0.1
+        assert gov.waiters == []
+
+    asyncio.run(run())
+
+
+def test_priority_order():
+    """Порядок выдачи при пустой корзине: book, navigate, scan, warm"""
+
+    async def run():
+        gov = governor(600, tokens=0)  # 10 токенов в секунду
+        order = []
+
+        async def take(kind: str) -> None:
+            await gov.acquire(kind)
+            order.append(kind)
+
+        await asyncio.gather(*(take(kind) for kind in ("warm", "scan", "navigate", "book")))
+        return order, gov.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["book", "navigate", "scan", "warm"]
+    assert stats["spent"] == {"book": 1, "navigate": 1, "scan": 1, "warm": 1}
+
+
+def test_warm_waits_for_full_bucket():
+    """Прогрев берет токен только из полной корзины"""
+
+    async def run():
+        gov = governor(60, capacity=2, tokens=1.5)  # токен в секунду
+        waited = await gov.acquire("warm")
+        return waited
+
+    assert asyncio.run(run()) == pytest.approx(0.5, abs=0.15)
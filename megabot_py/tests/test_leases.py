@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from leases import Lease, LeaseManager, MemoryLeaseStore, SQLiteLeaseStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def open_store(request, tmp_path):
+    def make():
+        if request.param == "memory":
+            return MemoryLeaseStore()
+        return SQLiteLeaseStore(str(tmp_path / "leases.db"))
+
+    return make
+
+
+def test_lease_lifecycle(open_store):
+    async def run():
+        store = open_store()
+        token = await store.acquire("seller", "a", ttl=10)
+        assert token == 1
+        assert await store.acquire("seller", "b", ttl=10) is None
+        assert await store.check("seller", "a", token)
+        assert not await store.check("seller", "b", token)
+        assert await store.renew("seller", "a", token, ttl=10)
+
+        await store.release("seller", "a", token)
+        assert not await store.check("seller", "a", token)
+        # Новый владелец получает следующий токен: старый узел отсечен
+        assert await store.acquire("seller", "b", ttl=10) == token + 1
+        assert not await store.renew("seller", "a", token, ttl=10)
+        await store.close()
+
+    asyncio.run(run())
+
+
+def test_expired_lease_is_taken_over(open_store):
+    async def run():
+        store = open_store()
+        token = await store.acquire("seller", "a", ttl=0.05)
+        await asyncio.sleep(0.1)
+        assert not await store.check("seller", "a", token)
+        assert await store.acquire("seller", "b", ttl=10) == token + 1
+        await store.close()
+
+    asyncio.run(run())
+
+
+def test_lease_valid_margin():
+    async def run():
+        store = MemoryLeaseStore()
+        token = await store.acquire("seller", "a", ttl=5)
+        lease = Lease(store, "seller", "a", token, ttl=5)
+        return await lease.valid(), await lease.valid(margin=10)
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_nodes_split_sellers():
+    """Второй узел забирает половину селлеров, первый отпускает лишние"""
+
+    async def run():
+        store = MemoryLeaseStore()
+        sellers = [f"seller-{index}" for index in range(10)]
+        first = LeaseManager(store, "a")
+        second = LeaseManager(store, "b")
+        for manager in (first, second):
+            manager.offer(sellers, replace=True)
+
+        assert await first.tick()
+        assert len(first.held) == 10
+        await second.tick()  # видит два узла, но все аренды заняты
+        assert not second.held
+        await first.tick()  # отпускает лишние
+        await second.tick()
+
+        held = set(first.held), set(second.held)
+        await first.stop()
+        assert not first.held
+        return held
+
+    held_a, held_b = asyncio.run(run())
+    assert len(held_a) == len(held_b) == 5
+    assert not held_a & held_b
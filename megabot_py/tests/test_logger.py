@@ -0,0 +1,23 @@
+import json
+
+from utils.logger import json_format, logger
+
+
+def test_json_format_keeps_traceback():
+    lines = []
+    sink = logger.add(lines.append, format=json_format, level="ERROR")
+    try:
+        try:
+            {}["missing"]
+        except KeyError:
+            logger.bind(seller="1").exception("Ошибка скана")
+    finally:
+        logger.remove(sink)
+
+    [data] = [json.loads(line) for line in lines]
+    assert data["message"] == "Ошибка скана"
+    assert data["seller"] == "1"
+    assert data["exception"] == "'missing'"
+    assert data["traceback"].startswith("Traceback (most recent call last)")
+    assert "test_json_format_keeps_traceback" in data["traceback"]
+    assert data["traceback"].rstrip().endswith("KeyError: 'missing'")
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+import pytest
+
+import matching
+from config import BOOKING_PRIORITIES, COEFF_VALUES
+from matching import SupplyMatrix
+from slots import format_date, match_slots
+
+TODAY = date(2024, 12, 20)
+
+
+def day(offset: int) -> str:
+    return format_date(TODAY + timedelta(days=offset))
+
+
+def snapshot():
+    coeffs = [None, 5, 0, 3, None, 0, 10, 1]
+    return [
+        {
+            "index": index,
+            "date": day(index),
+            "coeff": coeff,
+            "disabled": coeff is None,
+            "warehouse": "Коледино",
+        }
+        for index, coeff in enumerate(coeffs)
+    ]
+
+
+def supplies(make_supply):
+    return [
+        make_supply("1", target_dates=[day(1), day(2)]),
+        make_supply("2", target_dates=[day(0), day(4)]),  # даты закрыты
+        make_supply("3", target_coeff=COEFF_VALUES["COEFF_ANY"]),
+        make_supply(
+            "4", target_coeff=5, priority=BOOKING_PRIORITIES["BY_CLOSEST_DATE"]
+        ),
+        make_supply("5", target_dates=[day(6), day(7)], target_coeff=5),
+    ]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_matrix_matches_match_slots(make_supply, monkeypatch, use_numpy):
+    """Пакетное сопоставление дает тот же лучший слот, что match_slots"""
+    if not use_numpy:
+        monkeypatch.setattr(matching, "np", None)
+    elif matching.np is None:
+        pytest.skip("numpy не установлен")
+
+    batch = supplies(make_supply)
+    slots = snapshot()
+    result = SupplyMatrix(batch, today=TODAY).match(slots)
+
+    expected = {}
+    for supply in batch:
+        matched = match_slots(slots, supply)
+        if matched:
+            expected[supply["preorder_id"]] = matched[0]
+    assert result == expected
+    assert "2" not in result
+
+
+def test_matrix_without_available_slots(make_supply):
+    closed = [dict(slot, disabled=True, coeff=None) for slot in snapshot()]
+    assert SupplyMatrix(supplies(make_supply), today=TODAY).match(closed) == {}
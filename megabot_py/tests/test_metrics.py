@@ -0,0 +1,54 @@
+import pytest
+
+from metrics import Histogram, MetricsRegistry
+
+
+def test_histogram_quantiles():
+    histogram = Histogram([10, 100, 1000])
+    assert histogram.quantile(0.5) is None
+    for value in [5] * 50 + [50] * 49 + [500]:
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == pytest.approx(10)
+    assert 10 < histogram.quantile(0.99) <= 100
+    assert histogram.quantile(1.0) == 500
+    assert histogram.summary()["count"] == 100
+
+
+def test_histogram_since_snapshot():
+    histogram = Histogram([10, 100])
+    histogram.observe(5)
+    previous = Histogram([10, 100])
+    previous.add(histogram)
+    histogram.observe(50)
+
+    delta = histogram.since(previous)
+    assert delta.count == 1
+    assert delta.counts == [0, 1, 0]
+
+
+def test_render_prometheus():
+    registry = MetricsRegistry([10, 100])
+    registry.inc("megabot_stage_total", stage="scan", result="WAIT")
+    registry.observe("megabot_stage_ms", 42, stage="scan")
+
+    lines = registry.render().splitlines()
+    assert 'megabot_stage_total{result="WAIT",stage="scan"} 1' in lines
+    assert 'megabot_stage_ms_bucket{stage="scan",le="10"} 0' in lines
+    assert 'megabot_stage_ms_bucket{stage="scan",le="100"} 1' in lines
+    assert 'megabot_stage_ms_bucket{stage="scan",le="+Inf"} 1' in lines
+    assert 'megabot_stage_ms_count{stage="scan"} 1' in lines
+
+
+def test_export_load_merges_processes():
+    worker = MetricsRegistry([10, 100])
+    worker.inc("megabot_bookings_total", seller="1")
+    worker.observe("megabot_stage_ms", 5, stage="book")
+
+    supervisor = MetricsRegistry([10, 100])
+    supervisor.inc("megabot_bookings_total", seller="1")
+    supervisor.load(worker.export())
+    supervisor.load(worker.export())
+
+    assert supervisor.counters["megabot_bookings_total"][(("seller", "1"),)] == 3
+    assert supervisor.merged("megabot_stage_ms").count == 2
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from config import SYSTEM_CONFIG
+from notifications import MemorySink, NotificationHub, NotificationSink, RetryLater
+
+
+@pytest.fixture(autouse=True)
+def fast_delivery(monkeypatch):
+    config = SYSTEM_CONFIG["notifications"]
+    monkeypatch.setitem(config, "chat_interval", 0)
+    monkeypatch.setitem(config, "retry_backoff", 0.01)
+    monkeypatch.setitem(config, "chats", {})
+    monkeypatch.delenv(config["telegram_chat_env"], raising=False)
+
+
+class FlakySink(NotificationSink):
+    """Первые failures отправок - ошибка канала"""
+
+    name = "flaky"
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, chat: str, text: str) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise RetryLater(0.01)
+        self.sent.append((chat, text))
+
+
+async def deliver(hub: NotificationHub, sinks: dict, notify) -> None:
+    notify()  # до старта: очередь копится, доставки нет
+    await hub.start(sinks)
+    await hub.stop()
+
+
+def test_repeats_are_coalesced():
+    async def run():
+        hub = NotificationHub()
+        sink = MemorySink()
+
+        def notify():
+            for _ in range(2):
+                hub.notify("1", "Слот забронирован")
+            hub.notify("2", "Слот забронирован")
+
+        await deliver(hub, {"memory": sink}, notify)
+        return sink.sent, hub.stats()
+
+    sent, stats = asyncio.run(run())
+    assert sorted((chat, text) for chat, text, _ in sent) == [
+        ("1", "Слот забронирован\n(повторов: 1)"),
+        ("2", "Слот забронирован"),
+    ]
+    assert stats["queued"] == 0
+
+
+def test_recent_repeat_is_counted_in_next_message():
+    async def run():
+        hub = NotificationHub()
+        sink = MemorySink()
+        await deliver(hub, {"memory": sink}, lambda: hub.notify("1", "Нет слотов"))
+        hub.notify("1", "Нет слотов")  # в coalesce_window - только счетчик
+        assert hub.suppressed == {("1", "Нет слотов"): 1}
+        return sink.sent
+
+    assert [text for _, text, _ in asyncio.run(run())] == ["Нет слотов"]
+
+
+def test_failed_channel_is_retried_in_order():
+    async def run():
+        hub = NotificationHub()
+        flaky, memory = FlakySink(failures=2), MemorySink()
+
+        def notify():
+            hub.notify("1", "первое")
+            hub.notify("1", "второе")
+
+        await deliver(hub, {"flaky": flaky, "memory": memory}, notify)
+        return flaky.sent, memory.sent
+
+    flaky_sent, memory_sent = asyncio.run(run())
+    assert [text for _, text in flaky_sent] == ["первое", "второе"]
+    # Канал, принявший сообщение, не получает его повторно
+    assert [text for _, text, _ in memory_sent] == ["первое", "второе"]
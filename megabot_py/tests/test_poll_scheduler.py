@@ -0,0 +1,78 @@
+import time
+from datetime import date
+
+import pytest
+
+from config import SYSTEM_CONFIG
+from poll_scheduler import PollScheduler, is_expiry, is_release
+
+
+def test_release_and_expiry():
+    assert is_release(-1, 0)
+    assert is_release(5, 1)
+    assert not is_release(None, 0)
+    assert not is_release(0, -1)
+    assert is_expiry(0, -1)
+    assert is_expiry(1, 5)
+    assert not is_expiry(-1, 0)
+
+
+def train(scheduler: PollScheduler, warehouse: str, moment: float, releases: int) -> None:
+    """releases появлений слота в корзине moment, у каждого время жизни 30 секунд"""
+    today = date.today().toordinal()
+    for day in range(today, today + releases):
+        scheduler.observe(warehouse, [(day, -1, 0)], moment)
+        scheduler.observe(warehouse, [(day, 0, -1)], moment + 30)
+
+
+def spent(intervals: dict, loads: list) -> float:
+    """Сканов в секунду при этих интервалах"""
+    return sum(loads.count(warehouse) / interval for warehouse, interval in intervals.items())
+
+
+def test_untrained_warehouses_share_budget_evenly():
+    scheduler = PollScheduler()
+    loads = ["a", "b"]
+    intervals = scheduler.intervals(loads)
+    rate = SYSTEM_CONFIG["governor"]["requests_per_minute"] / 60
+
+    assert intervals["a"] == pytest.approx(intervals["b"])
+    assert intervals["a"] == pytest.approx(len(loads) / rate)
+    assert spent(intervals, loads) == pytest.approx(rate)
+
+
+def test_interval_of_warehouse_missing_from_loads():
+    """Склад, которого еще нет в списке сканов, делит бюджет с остальными"""
+    scheduler = PollScheduler()
+    expected = scheduler.intervals(["a", "b", "c"])["c"]
+    assert scheduler.interval("c", ["a", "b"]) == pytest.approx(expected)
+
+
+def test_hot_window_gets_savings_of_cold_warehouses(monkeypatch):
+    """Склад в окне появлений сканируется чаще ровного интервала, бюджет не растет"""
+    monkeypatch.setitem(SYSTEM_CONFIG["governor"], "requests_per_minute", 30)
+    scheduler = PollScheduler()
+    now = time.time()
+    releases = SYSTEM_CONFIG["scheduler"]["min_releases"]
+    train(scheduler, "hot", now, releases)
+    train(scheduler, "cold", now - 6 * 3600, releases)
+
+    loads = ["hot", "cold", "new"]
+    intervals = scheduler.intervals(loads, now)
+    flat = len(loads) / scheduler.rate()
+
+    assert intervals["hot"] < flat < intervals["cold"]
+    assert spent(intervals, loads) <= scheduler.rate() + 1e-9
+
+
+def test_detection_probability(monkeypatch):
+    monkeypatch.setitem(SYSTEM_CONFIG["governor"], "requests_per_minute", 30)
+    scheduler = PollScheduler()
+    assert scheduler.detection_probability("hot") is None
+
+    now = time.time()
+    train(scheduler, "hot", now, SYSTEM_CONFIG["scheduler"]["min_releases"])
+    loads = ["hot"] * 4
+    planned = scheduler.detection_probability("hot", loads)
+    flat = scheduler.detection_probability("hot", loads, flat=True)
+    assert 0 < flat <= planned <= 1
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from playwright.async_api import async_playwright
+
+from config import SYSTEM_CONFIG
+from mock_portal import POPUP_HTML
+
+
+def test_container_is_popup_wrapper():
+    """Контейнер попапа - его обертка в разметке мока, кнопка закрытия внутри"""
+
+    async def run():
+        found = {}
+        async with async_playwright() as playwright:
+            browser = await playwright.chromium.launch(headless=True)
+            page = await browser.new_page()
+            for name, html in POPUP_HTML.items():
+                selectors = SYSTEM_CONFIG["popups"][name]
+                await page.set_content(html)
+                # Контейнер ищет MutationObserver через document.querySelector
+                wrappers = await page.evaluate(
+                    """(container) => [...document.querySelectorAll(container)]
+                        .map((element) => element.hasAttribute("data-popup"))""",
+                    selectors["container"],
+                )
+                found[name] = wrappers == [True] and await page.locator(
+                    selectors["close"]
+                ).count() == 1
+            await browser.close()
+        return found
+
+    assert all(asyncio.run(run()).values())
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from playwright.async_api import async_playwright
+
+from request_filter import RequestFilter, cdp_resource_type
+
+RULES = {
+    "enabled": True,
+    "block_resource_types": ["image"],
+    "allow_url_patterns": ["*/ns/*"],
+    "block_url_patterns": ["*tutorial*"],
+}
+
+
+class Handler(SimpleHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    """Страница со скриптом, картинкой, картинкой под allow-паттерном и туториалом"""
+    for path in ["app.js", "logo.png", "ns/icon.png", "tutorial/step.js"]:
+        (tmp_path / path).parent.mkdir(exist_ok=True)
+        (tmp_path / path).write_text("1;")
+    (tmp_path / "index.html").write_text(
+        '<script src="/app.js"></script><img src="/logo.png"><img src="/ns/icon.png">'
+        '<script src="/tutorial/step.js"></script>'
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=str(tmp_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_fetch_patterns():
+    patterns = RequestFilter(RULES).fetch_patterns()
+    assert patterns == [
+        {"urlPattern": "*", "resourceType": "Image"},
+        {"urlPattern": "*tutorial*"},
+    ]
+    assert cdp_resource_type("xhr") == "XHR"
+
+
+def test_blocks_in_browser(site):
+    async def run():
+        request_filter = RequestFilter(RULES)
+        failed = []
+        async with async_playwright() as playwright:
+            browser = await playwright.chromium.launch(headless=True)
+            page = await browser.new_page()
+            await request_filter.attach(page, "test")
+            page.on("requestfailed", lambda request: failed.append(request.url))
+            await page.goto(f"{site}/index.html", wait_until="load")
+            totals = request_filter.totals()
+            await browser.close()
+        return failed, totals
+
+    failed, totals = asyncio.run(run())
+    assert sorted(url.removeprefix(site) for url in failed) == ["/logo.png", "/tutorial/step.js"]
+    assert totals["blocked"] == 2
+    # Документ, скрипт и картинка под allow-паттерном
+    assert totals["allowed"] == 3
+    assert totals["allowed_bytes"] > 0
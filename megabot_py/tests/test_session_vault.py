@@ -0,0 +1,63 @@
+import asyncio
+import json
+import time
+
+import pytest
+from cryptography.fernet import Fernet
+
+import config
+from config import SYSTEM_CONFIG
+from session_vault import SessionVault
+
+STATE = {"cookies": [{"name": "WBTokenV3", "value": "secret"}], "origins": []}
+
+
+@pytest.fixture(autouse=True)
+def vault_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "COOKIES_DIR", tmp_path)
+    monkeypatch.setenv(SYSTEM_CONFIG["session_vault"]["key_env"], Fernet.generate_key().decode())
+    return tmp_path
+
+
+def test_round_trip_is_encrypted(vault_dir):
+    async def run():
+        vault = SessionVault("1")
+        assert await vault.load() is None
+        assert await vault.save(STATE)
+        return vault, await vault.load()
+
+    vault, record = asyncio.run(run())
+    assert record["storage_state"] == STATE
+    assert SessionVault.is_fresh(record)
+    assert vault.path.parent == vault_dir / "1"
+    assert b"secret" not in vault.path.read_bytes()
+    assert not list(vault_dir.rglob("*.tmp"))
+
+
+def test_wrong_key_is_rejected(monkeypatch):
+    asyncio.run(SessionVault("1").save(STATE))
+    monkeypatch.setenv(SYSTEM_CONFIG["session_vault"]["key_env"], Fernet.generate_key().decode())
+    assert asyncio.run(SessionVault("1").load()) is None
+
+
+def test_legacy_cookies_are_not_fresh(vault_dir):
+    legacy = vault_dir / "1" / "wb_cookies.json"
+    legacy.parent.mkdir()
+    legacy.write_text(json.dumps(STATE["cookies"]))
+
+    async def run():
+        vault = SessionVault("1")
+        record = await vault.load()
+        await vault.save(record["storage_state"])
+        return record
+
+    record = asyncio.run(run())
+    assert record["storage_state"]["cookies"] == STATE["cookies"]
+    assert not SessionVault.is_fresh(record)
+    assert not legacy.exists()
+
+
+def test_is_fresh_expires():
+    ttl = SYSTEM_CONFIG["timeouts"]["COOKIES_TTL"]
+    assert not SessionVault.is_fresh(None)
+    assert not SessionVault.is_fresh({"validated_at": time.time() - ttl - 1})
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from config import SYSTEM_CONFIG
+from slot_history import SlotHistory
+from slots import format_date
+
+
+def calendar(day: date, coeff):
+    return [
+        {
+            "index": 0,
+            "date": format_date(day),
+            "coeff": coeff,
+            "disabled": coeff is None,
+            "warehouse": "Коледино",
+        }
+    ]
+
+
+def test_record_stores_only_changes(tmp_path):
+    history = SlotHistory(tmp_path)
+    day = date.today() + timedelta(days=3)
+    now = time.time()
+
+    assert history.record("Коледино", calendar(day, None), now) == [(day.toordinal(), None, -1)]
+    assert history.record("Коледино", calendar(day, None), now + 1) == []
+    assert history.record("Коледино", calendar(day, 0), now + 2) == [(day.toordinal(), -1, 0)]
+
+    assert history.window("Коледино") == {day: 0}
+    assert [coeff for _, coeff in history.trace("Коледино", day)] == [None, 0]
+    [(warehouse, free_day, released_at)] = history.free_slots(now, now + 10)
+    assert (warehouse, free_day) == ("Коледино", day)
+    assert released_at == pytest.approx(now + 2, abs=0.01)
+
+
+def test_current_day_is_flushed_and_restored(tmp_path, monkeypatch):
+    """Текущий день на диске каждые flush_rows изменений: падение без close() его не теряет"""
+    monkeypatch.setitem(SYSTEM_CONFIG["slot_history"], "flush_rows", 2)
+    day = date.today() + timedelta(days=5)
+    now = time.time()
+
+    async def run():
+        history = SlotHistory(tmp_path)
+        history.start()
+        history.record("Коледино", calendar(day, None), now)
+        history.record("Коледино", calendar(day, 3), now + 1)
+        # record только ставит копию сегмента в очередь, файл пишет фоновая задача
+        assert not list(tmp_path.glob("*.bin"))
+        for _ in range(100):
+            if list(tmp_path.glob("*.bin")):
+                break
+            await asyncio.sleep(0.01)
+        history.writer.cancel()  # падение процесса: close() не вызывается
+
+    asyncio.run(run())
+    assert list(tmp_path.glob("*.bin"))
+    assert not list(tmp_path.glob("*.tmp"))
+
+    restored = SlotHistory(tmp_path)
+    assert restored.window("Коледино") == {day: 3}
+    assert len(restored.trace("Коледино", day)) == 2
+    # Перезапуск в тот же день дописывает сохраненный сегмент
+    assert restored.record("Коледино", calendar(day, 3), now + 2) == []
+    assert restored.record("Коледино", calendar(day, 0), now + 3) == [(day.toordinal(), 3, 0)]
+    assert restored.stats()["segments"] == 1
+
+    asyncio.run(restored.close())
+    assert len(SlotHistory(tmp_path).trace("Коледино", day)) == 3
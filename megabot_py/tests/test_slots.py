@@ -0,0 +1,56 @@
+from datetime import date
+
+from config import BOOKING_PRIORITIES, COEFF_VALUES
+from slots import clean_date, format_date, make_slot, match_slots, parse_coeff, parse_date
+
+
+def test_format_and_parse_date_roundtrip():
+    today = date(2024, 12, 20)
+    assert format_date(date(2024, 12, 23)) == "23 декабря"
+    assert parse_date("23 декабря, пн", today) == date(2024, 12, 23)
+
+
+def test_parse_date_rolls_over_to_next_year():
+    assert parse_date("3 января", date(2024, 12, 20)) == date(2025, 1, 3)
+
+
+def test_parse_date_rejects_garbage():
+    assert parse_date("завтра", date(2024, 12, 20)) is None
+
+
+def test_parse_coeff():
+    assert parse_coeff("Бесплатно") == 0
+    assert parse_coeff("×5") == 5
+    assert parse_coeff(" ") is None
+    assert parse_coeff(None) is None
+    assert parse_coeff("нет") is None
+
+
+def test_clean_date_drops_weekday():
+    assert clean_date("23 декабря, пн") == "23 декабря"
+
+
+def calendar():
+    return [
+        make_slot(0, "23 декабря, пн", "×5", False),
+        make_slot(1, "24 декабря, вт", "Бесплатно", False),
+        make_slot(2, "25 декабря, ср", "Бесплатно", True),
+        make_slot(3, "26 декабря, чт", "×1", False),
+    ]
+
+
+def test_match_specific_dates_free(make_supply):
+    supply = make_supply(target_dates=["23 декабря", "24 декабря", "25 декабря"])
+    assert [slot["date"] for slot in match_slots(calendar(), supply)] == ["24 декабря"]
+
+
+def test_match_any_date_by_lower_coeff(make_supply):
+    supply = make_supply(target_coeff=COEFF_VALUES["COEFF_ANY"])
+    assert [slot["coeff"] for slot in match_slots(calendar(), supply)] == [0, 1, 5]
+
+
+def test_match_any_date_by_closest_date_keeps_calendar_order(make_supply):
+    supply = make_supply(
+        target_coeff=5, priority=BOOKING_PRIORITIES["BY_CLOSEST_DATE"]
+    )
+    assert [slot["index"] for slot in match_slots(calendar(), supply)] == [0, 1, 3]
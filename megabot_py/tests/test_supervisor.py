@@ -0,0 +1,118 @@
+import asyncio
+from datetime import date, timedelta
+
+from monitor import CalendarMonitor
+from slots import format_date
+from supervisor import Supervisor, assign_worker
+
+
+class Process:
+    def __init__(self, alive: bool = True):
+        self.alive = alive
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+
+class Commands(list):
+    put = list.append
+
+
+def worker(warehouses, alive: bool = True) -> dict:
+    return {
+        "process": Process(alive),
+        "commands": Commands(),
+        "report": {"warehouses": warehouses},
+        "scanners": None,
+    }
+
+
+def test_assign_worker_is_stable():
+    sellers = [str(seller) for seller in range(200)]
+    before = {seller: assign_worker(seller, 3) for seller in sellers}
+    after = {seller: assign_worker(seller, 4) for seller in sellers}
+    moved = [seller for seller in sellers if before[seller] != after[seller]]
+    # Переезжают только селлеры, доставшиеся новому воркеру
+    assert moved and all(after[seller] == 3 for seller in moved)
+
+
+def test_one_scanner_per_warehouse():
+    supervisor = Supervisor(workers=2)
+    supervisor.workers = {0: worker(["A", "B"]), 1: worker(["B", "C"])}
+    supervisor.assign_scans()
+
+    assert supervisor.scanners["A"] == 0
+    assert supervisor.scanners["C"] == 1
+    assert supervisor.scanners["B"] in (0, 1)
+    for item in supervisor.workers.values():
+        assert item["commands"] == [("scanners", supervisor.scanners)]
+
+    # Без изменений распределение не рассылается повторно
+    supervisor.assign_scans()
+    assert all(len(item["commands"]) == 1 for item in supervisor.workers.values())
+
+    # Сканер склада B упал: скан переходит к оставшемуся подписчику
+    scanner = supervisor.scanners["B"]
+    supervisor.workers[scanner]["process"].alive = False
+    supervisor.assign_scans()
+    assert supervisor.scanners["B"] == 1 - scanner
+
+
+def test_snapshot_relayed_to_subscribers_only():
+    supervisor = Supervisor(workers=3)
+    supervisor.workers = {0: worker(["A"]), 1: worker(["A"]), 2: worker(["B"])}
+    supervisor.relay(0, "A", [{"date": "1 января"}])
+
+    assert supervisor.workers[0]["commands"] == []
+    assert supervisor.workers[1]["commands"] == [("snapshot", "A", [{"date": "1 января"}])]
+    assert supervisor.workers[2]["commands"] == []
+
+
+def test_monitor_uses_snapshots_of_other_worker(make_supply):
+    """Склад другого воркера не сканируется, поставки ждут пересланный снимок"""
+    day = format_date(date.today() + timedelta(days=3))
+    supply = make_supply("1", target_dates=[day])
+    slots = [{"index": 0, "date": day, "coeff": 0, "disabled": False, "warehouse": "Коледино"}]
+    published = []
+
+    async def run():
+        scanners = {"Коледино": 1}
+        monitor = CalendarMonitor(
+            scans=lambda key: scanners.get(key, 0) == 0,
+            on_publish=lambda key, slots: published.append(key),
+        )
+        monitor.register(object(), supply)
+        assert monitor.warehouses["Коледино"]["task"] is None
+
+        waiter = asyncio.create_task(monitor.wait_for_slot(supply))
+        await asyncio.sleep(0)
+        monitor.receive("Коледино", slots)
+        matched = await asyncio.wait_for(waiter, timeout=1)
+
+        monitor.unregister(supply)
+        return matched
+
+    assert asyncio.run(run()) == slots
+    # Пересланный снимок не уходит обратно супервизору
+    assert published == []
+
+
+def test_last_unsubscribe_drops_snapshot(make_supply):
+    """Снимок склада без подписчиков не достается следующей поставке"""
+    day = format_date(date.today() + timedelta(days=3))
+    supply = make_supply("1", target_dates=[day])
+    slots = [{"index": 0, "date": day, "coeff": 0, "disabled": False, "warehouse": "Коледино"}]
+
+    async def run():
+        monitor = CalendarMonitor(scans=lambda key: False)
+        monitor.register(object(), supply)
+        monitor.receive("Коледино", slots)
+        assert monitor.notify_tasks
+        monitor.unregister(supply)
+        await asyncio.sleep(0)
+        return monitor
+
+    monitor = asyncio.run(run())
+    assert "Коледино" not in monitor.snapshots
+    assert "Коледино" not in monitor.conditions
+    assert not monitor.notify_tasks
@@ -0,0 +1,120 @@
+import asyncio
+import copy
+
+import pytest
+
+from config import USER_SUPPLIES
+from supply_store import MemorySupplyStore, SQLiteSupplyStore, SupplyStore, SupplySync
+
+
+async def seeded_sqlite(path) -> SQLiteSupplyStore:
+    store = SQLiteSupplyStore(str(path))
+    for user_data in USER_SUPPLIES:
+        for supply in user_data["supplies"]:
+            await store.upsert(user_data["user_id"], supply)
+    return store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def open_store(request, tmp_path):
+    async def make() -> SupplyStore:
+        if request.param == "memory":
+            return MemorySupplyStore(USER_SUPPLIES)
+        return await seeded_sqlite(tmp_path / "supplies.db")
+
+    return make
+
+
+def test_store_requires_all_methods():
+    class Partial(SupplyStore):
+        async def changes(self, since):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_first_poll_skips_loaded_records(open_store):
+    """Записи на границе курсора уже загружены load_active и не применяются снова"""
+
+    async def run():
+        store = await open_store()
+        users, cursor, boundary = await store.load_active()
+        sync = SupplySync(store, cursor, boundary)
+        first = await sync.poll()
+        await store.close()
+        return users, first
+
+    users, first = asyncio.run(run())
+    assert sum(len(supplies) for supplies in users.values()) > 0
+    assert first == []
+
+
+def test_edit_is_applied_once(open_store):
+    async def run():
+        store = await open_store()
+        _, cursor, boundary = await store.load_active()
+        sync = SupplySync(store, cursor, boundary)
+
+        user_data = USER_SUPPLIES[0]
+        supply = copy.deepcopy(user_data["supplies"][0])
+        supply["booking_settings"]["target_coeff"] = "COEFF_ANY"
+        await asyncio.sleep(0.01)  # updated_at правки больше курсора
+        await store.upsert(user_data["user_id"], supply)
+
+        first = await sync.poll()
+        second = await sync.poll()
+        await store.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [change["supply"]["booking_settings"]["target_coeff"] for change in first] == [
+        "COEFF_ANY"
+    ]
+    assert second == []
+
+
+def test_save_status_does_not_move_cursor(open_store):
+    async def run():
+        store = await open_store()
+        users, cursor, boundary = await store.load_active()
+        sync = SupplySync(store, cursor, boundary)
+        user_id, supplies = next(iter(users.items()))
+        supply = supplies[0]
+        supply["status"]["active"] = False
+        await store.save_status(user_id, supply)
+
+        polled = await sync.poll()
+        active, _, _ = await store.load_active()
+        await store.close()
+        return polled, supply["preorder_id"], active
+
+    polled, preorder_id, active = asyncio.run(run())
+    assert polled == []
+    assert preorder_id not in {
+        supply["preorder_id"] for supplies in active.values() for supply in supplies
+    }
+
+
+def test_record_on_cursor_keeps_boundary(open_store, monkeypatch):
+    """Новая запись с updated_at курсора дополняет границу, а не заменяет ее"""
+
+    async def run():
+        store = await open_store()
+        _, cursor, boundary = await store.load_active()
+        sync = SupplySync(store, cursor, boundary)
+
+        user_data = USER_SUPPLIES[0]
+        supply = copy.deepcopy(user_data["supplies"][0])
+        supply["preorder_id"] = "boundary-new"
+        monkeypatch.setattr("supply_store.time.time", lambda: cursor)
+        await store.upsert(user_data["user_id"], supply)
+
+        first = await sync.poll()
+        second = await sync.poll()
+        await store.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [change["supply"]["preorder_id"] for change in first] == ["boundary-new"]
+    assert second == []